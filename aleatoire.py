@@ -0,0 +1,62 @@
+"""
+Flux aléatoires indépendants par instrument
+Chaque symbole a son propre numpy.random.Generator dérivé de son hash,
+sans jamais toucher à l'état global du module random.
+"""
+import hashlib
+import numpy as np
+
+# Nombre de ticks tirés d'avance par instrument
+TAILLE_BLOC = 64
+
+
+def graine_symbole(symbole, flux=""):
+    """Graine stable (128 bits) dérivée du symbole et du nom du flux"""
+    return int(hashlib.md5(f"{symbole}:{flux}".encode()).hexdigest(), 16)
+
+
+def generateur(symbole, flux=""):
+    """Nouveau générateur reproductible pour un symbole et un flux donnés"""
+    return np.random.Generator(np.random.PCG64(graine_symbole(symbole, flux)))
+
+
+class FluxAleatoires:
+    """Tirages uniformes par ligne, préchargés par blocs et consommés de façon vectorisée"""
+
+    def __init__(self, largeur, capacite=128, taille_bloc=TAILLE_BLOC):
+        self.largeur = largeur
+        self.taille_bloc = taille_bloc
+        self.generateurs = []
+        self.blocs = np.zeros((capacite, taille_bloc, largeur))
+        self.curseurs = np.zeros(capacite, dtype=np.intp)
+
+    def redimensionner(self, capacite):
+        blocs = np.zeros((capacite, self.taille_bloc, self.largeur))
+        blocs[:len(self.blocs)] = self.blocs
+        self.blocs = blocs
+        curseurs = np.zeros(capacite, dtype=np.intp)
+        curseurs[:len(self.curseurs)] = self.curseurs
+        self.curseurs = curseurs
+
+    def ajouter(self, symbole):
+        """Crée le flux d'une nouvelle ligne et retourne son générateur"""
+        ligne = len(self.generateurs)
+        gen = generateur(symbole, "ticks")
+        self.generateurs.append(gen)
+        self.blocs[ligne] = gen.random((self.taille_bloc, self.largeur))
+        self.curseurs[ligne] = 0
+        return gen
+
+    def tirer(self, lignes):
+        """Un vecteur de `largeur` uniformes [0, 1) par ligne, forme (len(lignes), largeur)"""
+        curseurs = self.curseurs[lignes]
+        tirages = self.blocs[lignes, curseurs]
+        curseurs = curseurs + 1
+        self.curseurs[lignes] = curseurs
+
+        # Recharge uniquement les lignes dont le bloc est épuisé
+        epuisees = np.arange(len(self.curseurs))[lignes][curseurs >= self.taille_bloc]
+        for ligne in epuisees.tolist():
+            self.blocs[ligne] = self.generateurs[ligne].random((self.taille_bloc, self.largeur))
+            self.curseurs[ligne] = 0
+        return tirages
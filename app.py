@@ -1,138 +1,179 @@
+import hmac
+import logging
 import os
+import time
 from dotenv import load_dotenv
 
 # Chargement des variables d'environnement AVANT tout
 load_dotenv()
 
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, g, jsonify, render_template, request, stream_with_context
 from flask_cors import CORS
 import data_process as dp
+from catalogue import CATALOGUE, MATIERES_PREMIERES
+from correlations import CORRELATION_CLUSTERS_MAX, CORRELATION_SELECTION_MAX
+from cache_reponses import CacheReponses, mise_en_cache
+from flux_prix import FLUX_PING, DiffuseurPrix
+from formats_reponse import compresser, format_demande, repondre
+from metriques import REGISTRE, TYPE_CONTENU, memoire_processus
+from pagination import demande_champ, entetes_page, lire_parametres, paginer, projeter
+from profileur import PROFIL_DUREE_MAX, PROFIL_INTERVALLE, PROFILEUR
+from stockage_barres import RESOLUTIONS
 from datetime import datetime
 import pytz
 
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 CORS(app)
 
-# Liste complète des matières premières
-MATIERES_PREMIERES = [
-    {"id": 1, "nom": "Pétrole brut (Brent)", "unite": "Baril (bbl)", "symbole": "BZ=F", "categorie": "énergie"},
-    {"id": 2, "nom": "Gaz naturel", "unite": "MMBtu", "symbole": "NG=F", "categorie": "énergie"},
-    {"id": 3, "nom": "Or", "unite": "Once troy", "symbole": "GC=F", "categorie": "métal"},
-    {"id": 4, "nom": "Argent", "unite": "Once troy", "symbole": "SI=F", "categorie": "métal"},
-    {"id": 5, "nom": "Cuivre", "unite": "Livre", "symbole": "HG=F", "categorie": "métal"},
-    {"id": 6, "nom": "Blé", "unite": "Boisseau", "symbole": "ZW=F", "categorie": "agricole"},
-    {"id": 7, "nom": "Maïs", "unite": "Boisseau", "symbole": "ZC=F", "categorie": "agricole"},
-    {"id": 8, "nom": "Soja", "unite": "Boisseau", "symbole": "ZS=F", "categorie": "agricole"},
-    {"id": 9, "nom": "Café", "unite": "Livre", "symbole": "KC=F", "categorie": "agricole"},
-    {"id": 10, "nom": "Cacao", "unite": "Tonne", "symbole": "CC=F", "categorie": "agricole"},
-    {"id": 11, "nom": "Sucre", "unite": "Livre", "symbole": "SB=F", "categorie": "agricole"},
-    {"id": 12, "nom": "Coton", "unite": "Livre", "symbole": "CT=F", "categorie": "agricole"},
-    {"id": 13, "nom": "Aluminium", "unite": "Tonne", "symbole": "ALI=F", "categorie": "métal"},
-    {"id": 14, "nom": "Nickel", "unite": "Tonne", "symbole": "NICKEL", "categorie": "métal"},
-    {"id": 15, "nom": "Platine", "unite": "Once troy", "symbole": "PL=F", "categorie": "métal"},
-    {"id": 16, "nom": "Palladium", "unite": "Once troy", "symbole": "PA=F", "categorie": "métal"},
-    {"id": 17, "nom": "Soie", "unite": "Kg", "symbole": "SILK", "categorie": "textile"},
-    {"id": 18, "nom": "Cachemire", "unite": "Kg", "symbole": "CASHMERE", "categorie": "textile"},
-    {"id": 19, "nom": "Charbon", "unite": "Tonne", "symbole": "COAL", "categorie": "énergie"},
-    {"id": 20, "nom": "Uranium", "unite": "Livre", "symbole": "URANIUM", "categorie": "énergie"},
-    {"id": 21, "nom": "Essence (RBOB)", "unite": "Gallons", "symbole": "RB=F", "categorie": "énergie"},
-    {"id": 22, "nom": "Fioul domestique", "unite": "Gallons", "symbole": "HO=F", "categorie": "énergie"},
-    {"id": 23, "nom": "Plomb", "unite": "Tonne", "symbole": "LEAD", "categorie": "métal"},
-    {"id": 24, "nom": "Zinc", "unite": "Tonne", "symbole": "ZNC=F", "categorie": "métal"},
-    {"id": 25, "nom": "Étain", "unite": "Tonne", "symbole": "TIN", "categorie": "métal"},
-    {"id": 26, "nom": "Fer", "unite": "Tonne", "symbole": "FE=F", "categorie": "métal"},
-    {"id": 27, "nom": "Acier", "unite": "Tonne", "symbole": "STL=F", "categorie": "métal"},
-    {"id": 28, "nom": "Riz", "unite": "Cwt", "symbole": "ZR=F", "categorie": "agricole"},
-    {"id": 29, "nom": "Avoine", "unite": "Boisseau", "symbole": "ZO=F", "categorie": "agricole"},
-    {"id": 30, "nom": "Huile de palme", "unite": "Tonne", "symbole": "PALMOIL", "categorie": "agricole"},
-    {"id": 31, "nom": "Caoutchouc", "unite": "Kg", "symbole": "RUBBER", "categorie": "agricole"},
-    {"id": 32, "nom": "Bois d'œuvre", "unite": "Pieds-planche", "symbole": "LBS=F", "categorie": "agricole"},
-    {"id": 33, "nom": "Jus d'orange", "unite": "Livre", "symbole": "OJ=F", "categorie": "agricole"},
-    {"id": 34, "nom": "Porc maigre", "unite": "Livre", "symbole": "HE=F", "categorie": "agricole"},
-    {"id": 35, "nom": "Bœuf vivant", "unite": "Livre", "symbole": "LE=F", "categorie": "agricole"},
-    {"id": 36, "nom": "Bétail engraissé", "unite": "Livre", "symbole": "GF=F", "categorie": "agricole"},
-    {"id": 37, "nom": "Lait", "unite": "Cwt", "symbole": "DA=F", "categorie": "agricole"},
-    {"id": 38, "nom": "Wool (laine)", "unite": "Kg", "symbole": "WOOL", "categorie": "textile"},
-    {"id": 39, "nom": "Éthanol", "unite": "Gallons", "symbole": "ETHANOL", "categorie": "énergie"},
-    {"id": 40, "nom": "Lithium", "unite": "Tonne", "symbole": "LITHIUM", "categorie": "métal"},
-    {"id": 41, "nom": "Terres rares", "unite": "Tonne", "symbole": "RARE", "categorie": "métal"},
-    {"id": 42, "nom": "Potasse", "unite": "Tonne", "symbole": "POTASH", "categorie": "agricole"},
-    {"id": 43, "nom": "Phosphate", "unite": "Tonne", "symbole": "PHOSPHATE", "categorie": "agricole"},
-    {"id": 44, "nom": "Tourteau de soja", "unite": "Tonne", "symbole": "SM=F", "categorie": "agricole"},
-    {"id": 45, "nom": "Huile de soja", "unite": "Livre", "symbole": "BO=F", "categorie": "agricole"},
-    {"id": 46, "nom": "Gazole", "unite": "Litre", "symbole": "DIESEL", "categorie": "énergie"},
-    {"id": 47, "nom": "Plastique (polyéthylène)", "unite": "Tonne", "symbole": "PE=F", "categorie": "chimie"},
-    {"id": 48, "nom": "Plastique (polypropylène)", "unite": "Tonne", "symbole": "PP=F", "categorie": "chimie"},
-    {"id": 49, "nom": "GNL (Gaz naturel liquéfié)", "unite": "Tonne", "symbole": "LNG=F", "categorie": "énergie"},
-    {"id": 50, "nom": "Propane", "unite": "Gallon", "symbole": "LPG=F", "categorie": "énergie"},
-    {"id": 51, "nom": "Uranium U3O8 (spot)", "unite": "Livre", "symbole": "UX=F", "categorie": "énergie"},
-    {"id": 52, "nom": "Bitume", "unite": "Tonne", "symbole": "BITUMEN", "categorie": "énergie"},
-    {"id": 53, "nom": "Bois (pâte à papier)", "unite": "Tonne", "symbole": "PULP=F", "categorie": "agricole"},
-    {"id": 54, "nom": "Huile de tournesol", "unite": "Tonne", "symbole": "SUNOIL", "categorie": "agricole"},
-    {"id": 55, "nom": "Huile de colza", "unite": "Tonne", "symbole": "RAPESEEDOIL", "categorie": "agricole"},
-    {"id": 56, "nom": "Pois", "unite": "Tonne", "symbole": "PEAS", "categorie": "agricole"},
-    {"id": 57, "nom": "Lentilles", "unite": "Tonne", "symbole": "LENTILS", "categorie": "agricole"},
-    {"id": 58, "nom": "Arachide", "unite": "Tonne", "symbole": "PEANUTS", "categorie": "agricole"},
-    {"id": 59, "nom": "Tomate industrielle", "unite": "Tonne", "symbole": "TOMATO", "categorie": "agricole"},
-    {"id": 60, "nom": "Banane", "unite": "Tonne", "symbole": "BANANA", "categorie": "agricole"},
-    {"id": 61, "nom": "Pomme de terre", "unite": "Tonne", "symbole": "POTATO", "categorie": "agricole"},
-    {"id": 62, "nom": "Oignon", "unite": "Tonne", "symbole": "ONION", "categorie": "agricole"},
-    {"id": 63, "nom": "Sel", "unite": "Tonne", "symbole": "SALT", "categorie": "industriel"},
-    {"id": 64, "nom": "Graphite", "unite": "Tonne", "symbole": "GRAPHITE", "categorie": "métal"},
-    {"id": 65, "nom": "Cobalt", "unite": "Tonne", "symbole": "COBALT", "categorie": "métal"},
-    {"id": 66, "nom": "Manganèse", "unite": "Tonne", "symbole": "MANGANESE", "categorie": "métal"},
-    {"id": 67, "nom": "Vanadium", "unite": "Tonne", "symbole": "VANADIUM", "categorie": "métal"},
-    {"id": 68, "nom": "Sable de silice", "unite": "Tonne", "symbole": "SILICASAND", "categorie": "industriel"},
-    {"id": 69, "nom": "Hélium", "unite": "m3", "symbole": "HELIUM", "categorie": "gaz industriel"},
-    {"id": 70, "nom": "Hydrogène", "unite": "kg", "symbole": "HYDROGEN", "categorie": "gaz industriel"}
-]
-
-# Mapping des liens d'actualités
-NEWS_BASES = {
-    'yahoo': 'https://finance.yahoo.com/quote/',
-    'investing': 'https://www.investing.com/commodities/',
-    'google': 'https://news.google.com/search?q='
-}
+# Durée et statut de chaque requête, par route (gabarit d'URL, pas le chemin)
+_durees_requetes = REGISTRE.histogramme(
+    "matieres_requete_duree_secondes", "Durée des requêtes HTTP par route", ("route", "methode")
+)
+_requetes = REGISTRE.compteur("matieres_requetes_total", "Requêtes HTTP par route et statut", ("route", "methode", "statut"))
+_erreurs = REGISTRE.compteur("matieres_erreurs_total", "Réponses 5xx par route", ("route",))
+
+@app.before_request
+def _debut_requete():
+    g.debut_requete = time.perf_counter()
+
+@app.after_request
+def _mesurer_requete(reponse):
+    # Enregistré avant la compression : after_request s'exécute à rebours, la compression est mesurée
+    debut = g.pop('debut_requete', None)
+    if debut is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "<inconnue>"
+        _durees_requetes.observer(time.perf_counter() - debut, route, request.method)
+        _requetes.inc(route, request.method, str(reponse.status_code))
+        if reponse.status_code >= 500:
+            _erreurs.inc(route)
+    return reponse
+
+app.after_request(compresser)
 
-def get_news_url(matiere):
-    symb = matiere.get('symbole', '').replace('=F','').replace(' ','-').lower()
-    cat = matiere.get('categorie','').lower()
-    nom = matiere.get('nom','').replace(' ','+').replace("'",'')
+# Profilage à la demande (voir /api/admin/profil et PROFIL_SIGNAL)
+@app.before_request
+def _debut_profil():
+    if PROFILEUR.session is not None and request.endpoint != 'profil':
+        route = request.url_rule.rule if request.url_rule is not None else None
+        jeton = PROFILEUR.debut_requete(route, request.endpoint)
+        if jeton is not None:
+            g.profil = jeton
+
+@app.teardown_request
+def _fin_profil(exception):
+    jeton = g.pop('profil', None)
+    if jeton is not None:
+        PROFILEUR.fin_requete(jeton)
+
+def demarrer_taches_de_fond():
+    """Threads de fond du worker : ticks, historique réel, cotations et signal de profilage
+
+    Appelé à l'import, sauf en démarrage différé (DEMARRAGE_DIFFERE=1) : avec gunicorn
+    --preload, les threads ne survivraient pas au fork et gunicorn.conf.py l'appelle
+    dans chaque worker.
+    """
+    PROFILEUR.installer_signal()
     
-    if matiere['symbole'] and matiere['symbole'].endswith('=F'):
-        return f"{NEWS_BASES['yahoo']}{matiere['symbole']}?p={matiere['symbole']}"
+    # Les prix avancent sur l'horloge, pas au rythme des requêtes
+    if os.getenv('TICK_PLANIFICATEUR', '1') != '0':
+        dp.demarrer_planificateur()
     
-    if cat in ['énergie','métal','agricole','chimie','industriel']:
-        return f"{NEWS_BASES['investing']}{symb}-news"
+    # Historique réel téléchargé en arrière-plan ; les symboles sans flux restent simulés
+    if os.getenv('REMPLISSAGE_DONNEES', '1') != '0':
+        dp.demarrer_remplissage()
     
-    return f"{NEWS_BASES['google']}{nom}+actualites"
+    # Mode direct : cotations réelles à la place des prix simulés pour les symboles couverts
+    if os.getenv('COTATIONS_EN_DIRECT', '0') == '1':
+        dp.demarrer_cotations()
+
+if os.getenv('DEMARRAGE_DIFFERE', '0') != '1':
+    demarrer_taches_de_fond()
 
-# Ajout des URLs d'actualités
-for m in MATIERES_PREMIERES:
-    m['news_url'] = get_news_url(m)
+# Réponses des endpoints de lecture, valables tant que l'instantané de prix ne change pas
+# (sous dp.contexte_calcul(), la version de la clé est celle de l'instantané utilisé)
+cache = CacheReponses()
+en_cache = mise_en_cache(cache, lambda: dp.instantane().version)
+
+# Ticks poussés aux clients de /api/stream
+diffuseur = DiffuseurPrix()
+dp.abonner_ticks(diffuseur.publier)
+
+# Métriques lues à la collecte : cache, flux, taille et mémoire de l'état
+REGISTRE.jauge("matieres_cache_succes_total", "Réponses servies par le cache", lambda: cache.succes, type_metrique="counter")
+REGISTRE.jauge("matieres_cache_echecs_total", "Réponses absentes du cache ou expirées", lambda: cache.echecs, type_metrique="counter")
+REGISTRE.jauge("matieres_cache_taux_succes", "Part des lectures du cache servies depuis le cache",
+               lambda: cache.succes / (cache.succes + cache.echecs) if cache.succes + cache.echecs else None)
+REGISTRE.jauge("matieres_cache_entrees", "Entrées du cache de réponses", lambda: len(cache))
+REGISTRE.jauge("matieres_cache_octets", "Octets des corps en cache", lambda: cache.octets)
+REGISTRE.jauge("matieres_flux_abonnes", "Clients connectés à /api/stream", lambda: len(diffuseur))
+REGISTRE.jauge("matieres_instantane_version", "Version de l'instantané de prix publié", lambda: dp.instantane().version)
+REGISTRE.jauge("matieres_instantane_age_secondes", "Âge de l'instantané de prix publié",
+               lambda: time.time() - dp.instantane().horodatage)
+REGISTRE.jauge("matieres_stockage_instruments", "Instruments du moteur de prix", lambda: dp.statistiques_stockage()["instruments"])
+REGISTRE.jauge("matieres_stockage_octets", "Empreinte mémoire de l'état par composant",
+               lambda: dp.statistiques_stockage()["octets"], ("composant",))
+REGISTRE.jauge("matieres_barres_fichiers", "Fichiers de barres ouverts en memmap",
+               lambda: dp.statistiques_stockage()["fichiers_barres"])
+REGISTRE.jauge("matieres_barres_octets", "Octets de barres projetés en mémoire",
+               lambda: dp.statistiques_stockage()["octets_barres"])
+REGISTRE.jauge("matieres_processus_rss_octets", "Mémoire résidente du processus", memoire_processus)
 
 # ==================== ROUTES API ====================
 
-@app.route('/api/matieres', methods=['GET'])
-def get_matieres():
-    """Retourne la liste des matières premières avec filtrage"""
-    query = request.args.get('q', '').lower()
+# Nombre maximal de résultats d'une recherche (?q=)
+RECHERCHE_LIMITE = int(os.getenv('RECHERCHE_LIMITE', '50')) or None
+# Clés de tri des listes (?sort=) : champs du catalogue et champs de prix de l'instantané
+TRIS_LISTES = CATALOGUE.CHAMPS_TRI + dp.CLES_TRI_PRIX
+
+def page_liste(matieres, liste):
+    """Matières de la page demandée (sort, limit, cursor) et curseur de la page suivante"""
+    return paginer(matieres, liste, dp.cles_tri, lambda m: dp.cles_tri(m, 'id'))
+
+def selection_matieres():
+    """Matières désignées par les paramètres ids, q et categorie (ValueError si ids est invalide)
+
+    q passe par l'index de recherche (sans accents ni casse, nom, symbole et catégorie) :
+    toutes les listes cherchent de la même façon, les plus pertinentes d'abord.
+    """
+    ids = request.args.get('ids', '')
+    query = request.args.get('q', '').strip()
     categorie = request.args.get('categorie', '').lower()
     
-    filtered_matieres = MATIERES_PREMIERES
+    if ids:
+        ids_demandes = [int(i) for i in ids.split(',') if i.strip()]
+        matieres = [CATALOGUE.par_id(i) for i in dict.fromkeys(ids_demandes)]
+        matieres = [m for m in matieres if m and (not categorie or m['categorie'].lower() == categorie)]
+        if query:
+            trouvees = {m['id'] for m in CATALOGUE.rechercher(query, categorie or None)}
+            matieres = [m for m in matieres if m['id'] in trouvees]
+        return matieres
     
     if query:
-        filtered_matieres = [m for m in filtered_matieres if query in m['nom'].lower()]
-    
-    if categorie:
-        filtered_matieres = [m for m in filtered_matieres if categorie == m['categorie'].lower()]
+        return CATALOGUE.rechercher(query, categorie or None, RECHERCHE_LIMITE)
+    return CATALOGUE.par_categorie(categorie) if categorie else MATIERES_PREMIERES
+
+@app.route('/api/matieres', methods=['GET'])
+@dp.contexte_calcul()
+def get_matieres():
+    """Retourne la liste des matières premières (ids, q, categorie) triée, paginée et projetée"""
+    try:
+        filtered_matieres = selection_matieres()
+    except ValueError:
+        return jsonify({"error": "Paramètre ids invalide"}), 400
+    try:
+        liste = lire_parametres(TRIS_LISTES)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    return jsonify(filtered_matieres)
+    page, curseur = page_liste(filtered_matieres, liste)
+    return entetes_page(jsonify(projeter(page, liste.champs)), curseur, len(filtered_matieres))
 
 @app.route('/api/prix/<int:matiere_id>', methods=['GET'])
 def get_prix(matiere_id):
     """Retourne les données de prix + prédictions"""
-    matiere = next((m for m in MATIERES_PREMIERES if m['id'] == matiere_id), None)
+    matiere = CATALOGUE.par_id(matiere_id)
     
     if not matiere:
         return jsonify({"error": "Matière première non trouvée"}), 404
@@ -149,90 +190,233 @@ def get_prix(matiere_id):
             }
         })
     except Exception as e:
+        logger.exception("Erreur sur %s", request.path)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/prix', methods=['GET'])
+@dp.contexte_calcul()
+def get_prix_lot():
+    """Retourne les données de prix de plusieurs matières en une seule réponse (triée, paginée, projetée)"""
+    try:
+        matieres = selection_matieres()
+    except ValueError:
+        return jsonify({"error": "Paramètre ids invalide"}), 400
+    try:
+        liste = lire_parametres(TRIS_LISTES)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        page, curseur = page_liste(matieres, liste)
+        prix = dp.get_prix_matieres(page)
+        return entetes_page(repondre(projeter([
+            {
+                **data,
+                "matiere": {
+                    "id": matiere['id'],
+                    "nom": matiere['nom'],
+                    "unite": matiere['unite'],
+                    "categorie": matiere['categorie']
+                }
+            }
+            for matiere, data in zip(page, prix)
+        ], liste.champs)), curseur, len(matieres))
+    except Exception as e:
+        logger.exception("Erreur sur %s", request.path)
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/stream', methods=['GET'])
+def stream_prix():
+    """Flux Server-Sent Events des prix (ids, q, categorie ; indicateurs=1 pour les inclure)"""
+    try:
+        matieres = selection_matieres()
+    except ValueError:
+        return jsonify({"error": "Paramètre ids invalide"}), 400
+    indicateurs = request.args.get('indicateurs') == '1'
+    
+    abonnement = diffuseur.abonner()
+    if abonnement is None:
+        return jsonify({"error": "Trop de flux ouverts, réessayez plus tard"}), 503
+    
+    # Les clients qui demandent la même sélection partagent le même message à chaque tick
+    cle = (tuple(m['id'] for m in matieres), indicateurs)
+    
+    def evenements():
+        try:
+            yield "retry: 5000\n\n"
+            etat = dp.instantane()
+            while True:
+                if etat is None:
+                    yield ": ping\n\n"
+                else:
+                    yield diffuseur.message(etat, cle, lambda: dp.get_prix_instantane(etat, matieres, indicateurs))
+                etat = abonnement.attendre(FLUX_PING)
+        finally:
+            diffuseur.desabonner(abonnement)
+    
+    return Response(stream_with_context(evenements()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/predictions/<int:matiere_id>', methods=['GET'])
+@dp.contexte_calcul()
+@en_cache
 def get_predictions(matiere_id):
     """Retourne les prédictions détaillées"""
-    matiere = next((m for m in MATIERES_PREMIERES if m['id'] == matiere_id), None)
+    matiere = CATALOGUE.par_id(matiere_id)
     
     if not matiere:
         return jsonify({"error": "Matière première non trouvée"}), 404
     
     try:
         horizon = request.args.get('horizon', '7j')
-        predictions = dp.get_predictions_detail(matiere['symbole'], horizon)
+        chemins = request.args.get('chemins', type=int)
+        predictions = dp.get_predictions_detail(matiere['symbole'], horizon, chemins)
+        if 'error' in predictions:
+            return jsonify(predictions), 404
         return jsonify(predictions)
     except Exception as e:
+        logger.exception("Erreur sur %s", request.path)
         return jsonify({"error": str(e)}), 500
 
+def tendances_completes(matieres, prix):
+    return [
+        {
+            "id": matiere['id'],
+            "nom": matiere['nom'],
+            "unite": matiere['unite'],
+            "categorie": matiere['categorie'],
+            "data": data
+        }
+        for matiere, data in zip(matieres, prix)
+    ]
+
 @app.route('/api/tendances', methods=['GET'])
+@dp.contexte_calcul()
 def get_tendances():
-    """Retourne les tendances pour toutes les matières premières"""
-    tendances = []
-    for matiere in MATIERES_PREMIERES:
+    """Retourne les tendances pour toutes les matières premières
+
+    Avec ?since=<version>, seules les matières et champs modifiés depuis cette version
+    sont renvoyés (204 si rien n'a changé) ; la version courante est dans l'en-tête X-Version,
+    la date de l'instantané (derniere_maj) une seule fois dans l'enveloppe.
+    Sinon la liste se trie, se pagine et se projette (sort, limit, cursor, fields).
+    """
+    try:
+        liste = lire_parametres(TRIS_LISTES)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    depuis = request.args.get('since')
+    if depuis is not None:
         try:
-            data = dp.get_prix_matiere(matiere['symbole'])
-            tendances.append({
-                "id": matiere['id'],
-                "nom": matiere['nom'],
-                "unite": matiere['unite'],
-                "categorie": matiere['categorie'],
-                "data": data
-            })
-        except Exception as e:
-            print(f"Erreur pour {matiere['nom']}: {str(e)}")
+            depuis = int(depuis)
+        except ValueError:
+            return jsonify({"error": "Paramètre since invalide"}), 400
+        etat, modifications = dp.get_modifications_prix(MATIERES_PREMIERES, depuis)
+        if modifications == []:
+            reponse = Response(status=204)
+        elif modifications is None:
+            # Version inconnue ou trop ancienne : tout renvoyer
+            prix = dp.get_prix_instantane(etat, MATIERES_PREMIERES)
+            reponse = jsonify({"version": etat.version, "derniere_maj": dp.date_instantane(etat), "complet": True,
+                               "tendances": projeter(tendances_completes(MATIERES_PREMIERES, prix), liste.champs)})
+        else:
+            reponse = jsonify({"version": etat.version, "derniere_maj": dp.date_instantane(etat), "complet": False,
+                               "tendances": projeter(modifications, liste.champs)})
+        reponse.headers['X-Version'] = str(etat.version)
+        return reponse
+    
+    page, curseur = page_liste(MATIERES_PREMIERES, liste)
+    # Prix construits pour les seules lignes de la page, et seulement si la projection les garde ;
+    # une erreur donne un 500 (journalisé) plutôt qu'une liste vide passée pour valide
+    prix = dp.get_prix_matieres(page) if demande_champ(liste.champs, 'data') else [None] * len(page)
+    version = dp.instantane().version
     
-    return jsonify(tendances)
+    reponse = repondre(projeter(tendances_completes(page, prix), liste.champs))
+    reponse.headers['X-Version'] = str(version)
+    return entetes_page(reponse, curseur, len(MATIERES_PREMIERES))
+
+# Périodes du graphe (paramètre ?periode=) vers les périodes de data_process
+PERIODES_HISTORIQUE = {
+    'jour': '1d',
+    'semaine': '7d',
+    'mois': '1mo',
+    'annee': '1y',
+    '5ans': '5y',
+    'max': 'max'
+}
+GRANULARITES = {'minute': 'Minute', 'heure': 'Heure', 'jour': 'Jour'}
+# Nombre de points renvoyés au graphe par défaut (sous-échantillonnage LTTB)
+POINTS_GRAPHE_DEFAUT = 500
 
 @app.route('/api/historique/<int:matiere_id>', methods=['GET'])
+@dp.contexte_calcul()
+@en_cache
 def historique_prix(matiere_id):
     """Retourne l'historique des prix"""
-    matiere = next((m for m in MATIERES_PREMIERES if m['id'] == matiere_id), None)
+    matiere = CATALOGUE.par_id(matiere_id)
     if not matiere:
         return jsonify({"error": "Matière première non trouvée"}), 404
     
     periode = request.args.get('periode', 'mois')
+    resolution = request.args.get('resolution')
+    points = request.args.get('points', POINTS_GRAPHE_DEFAUT, type=int)
+    if not 1 <= points <= dp.POINTS_GRAPHE_MAX:
+        return jsonify({"error": f"Paramètre points invalide (1 à {dp.POINTS_GRAPHE_MAX})"}), 400
     symbole = matiere['symbole']
     
     try:
-        if periode == 'jour':
-            data = dp.get_historique(symbole, '1d')
-            granularite = 'Heure'
-        elif periode == 'semaine':
-            data = dp.get_historique(symbole, '7d')
-            granularite = 'Jour'
-        else:
-            data = dp.get_historique(symbole, '1mo')
-            granularite = 'Jour'
+        if format_demande() == 'npz':
+            # Binaire : horodatages en secondes plutôt que des labels formatés
+            data = dp.get_historique(symbole, PERIODES_HISTORIQUE.get(periode, '1mo'), resolution, points, brut=True)
+            return repondre({
+                'horodatages': data['horodatages'],
+                'prix': data['prix'],
+                'granularite': GRANULARITES[data['resolution']],
+                'points_total': data['points_total']
+            })
         
-        return jsonify({
+        data = dp.get_historique(symbole, PERIODES_HISTORIQUE.get(periode, '1mo'), resolution, points)
+        
+        return repondre({
             'labels': data['labels'],
             'prix': data['prix'],
-            'granularite': granularite
+            'granularite': GRANULARITES[data['resolution']],
+            'points_total': data['points_total']
         })
     except Exception as e:
-        return jsonify({'error': str(e)})
+        logger.exception("Erreur sur %s", request.path)
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/indicateurs/<int:matiere_id>', methods=['GET'])
+@dp.contexte_calcul()
+@en_cache
 def indicateurs_matiere(matiere_id):
     """Retourne les indicateurs techniques"""
-    matiere = next((m for m in MATIERES_PREMIERES if m['id'] == matiere_id), None)
+    matiere = CATALOGUE.par_id(matiere_id)
     if not matiere:
         return jsonify({"error": "Matière première non trouvée"}), 404
     
     periode = request.args.get('periode', '1mo')
+    resolution = request.args.get('resolution')
+    if resolution and resolution not in RESOLUTIONS:
+        return jsonify({"error": f"Paramètre resolution invalide ({', '.join(RESOLUTIONS)})"}), 400
     
     try:
-        indicateurs = dp.get_indicateurs(matiere['symbole'], periode)
-        return jsonify(indicateurs)
+        indicateurs = dp.get_indicateurs(matiere['symbole'], periode, resolution)
+        if 'error' in indicateurs:
+            return jsonify(indicateurs), 404
+        return repondre(indicateurs)
     except Exception as e:
-        return jsonify({'error': str(e)})
+        logger.exception("Erreur sur %s", request.path)
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/analyse/<int:matiere_id>', methods=['GET'])
+@dp.contexte_calcul()
+@en_cache
 def analyse_matiere(matiere_id):
     """Retourne une analyse complète (prix + prédictions + indicateurs)"""
-    matiere = next((m for m in MATIERES_PREMIERES if m['id'] == matiere_id), None)
+    matiere = CATALOGUE.par_id(matiere_id)
     if not matiere:
         return jsonify({"error": "Matière première non trouvée"}), 404
     
@@ -258,6 +442,34 @@ def analyse_matiere(matiere_id):
             "predictions": predictions
         })
     except Exception as e:
+        logger.exception("Erreur sur %s", request.path)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/correlations', methods=['GET'])
+@dp.contexte_calcul()
+@en_cache
+def correlations_matieres():
+    """Matrice de corrélation ou de covariance des rendements (ids, q, categorie, fenetre, mesure, ordre)"""
+    try:
+        matieres = selection_matieres()
+    except ValueError:
+        return jsonify({"error": "Paramètre ids invalide"}), 400
+    
+    fenetre = request.args.get('fenetre', type=int)
+    mesure = request.args.get('mesure', 'correlation')
+    clusters = request.args.get('ordre') == 'cluster'
+    if len(matieres) > CORRELATION_SELECTION_MAX:
+        return jsonify({"error": f"Au plus {CORRELATION_SELECTION_MAX} matières par matrice (ids, q ou categorie)"}), 400
+    if clusters and len(matieres) > CORRELATION_CLUSTERS_MAX:
+        return jsonify({"error": f"ordre=cluster : au plus {CORRELATION_CLUSTERS_MAX} matières"}), 400
+    
+    try:
+        resultat = dp.get_correlations(tuple(m['id'] for m in matieres), fenetre, mesure, clusters)
+        if 'error' in resultat:
+            return jsonify(resultat), 404
+        return repondre(resultat)
+    except Exception as e:
+        logger.exception("Erreur sur %s", request.path)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/health', methods=['GET'])
@@ -270,6 +482,75 @@ def health_check():
         "version": "1.0.0"
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Métriques au format Prometheus : latences par route, compteurs, cache, calculs et mémoire"""
+    return Response(REGISTRE.exposer(), content_type=TYPE_CONTENU)
+
+# Jeton des endpoints d'administration (vide : endpoints désactivés)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+def admin_autorise():
+    """Vrai si la requête porte le jeton d'administration (X-Admin-Token ou Authorization: Bearer)"""
+    fourni = request.headers.get('X-Admin-Token') or request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(fourni.encode(), ADMIN_TOKEN.encode())
+
+@app.route('/api/admin/profil', methods=['POST'])
+def profil():
+    """Profile ce worker et renvoie les piles repliées (flamegraph) et les statistiques cProfile
+
+    ?duree=N : tout le processus pendant N secondes ; ?route=<gabarit ou endpoint>&requetes=K :
+    les K prochaines requêtes de la route (attente au plus ?delai= secondes).
+    ?sortie=json (défaut), collapsed ou pstats.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Endpoint non trouvé"}), 404
+    if not admin_autorise():
+        return jsonify({"error": "Accès refusé"}), 403
+    route = request.args.get('route')
+    try:
+        duree = min(float(request.args.get('duree', 10)), PROFIL_DUREE_MAX)
+        requetes = int(request.args.get('requetes', 10))
+        delai = min(float(request.args.get('delai', PROFIL_DUREE_MAX)), PROFIL_DUREE_MAX)
+        intervalle = max(float(request.args.get('intervalle', PROFIL_INTERVALLE)), 0.001)
+    except ValueError:
+        return jsonify({"error": "Paramètres invalides"}), 400
+    
+    if route:
+        session = PROFILEUR.lancer(route=route, requetes=requetes, intervalle=intervalle)
+    else:
+        session = PROFILEUR.lancer(duree=duree, intervalle=intervalle)
+    if session is None:
+        return jsonify({"error": "Profilage déjà en cours dans ce processus"}), 409
+    session.attendre(delai if route else duree + 1)
+    session.arreter()
+    
+    sortie = request.args.get('sortie', 'json')
+    if sortie == 'collapsed':
+        return Response(session.piles_repliees(), content_type='text/plain; charset=utf-8')
+    if sortie == 'pstats':
+        return Response(session.pstats_binaire(), content_type='application/octet-stream')
+    return jsonify({
+        **session.resume(),
+        "pid": os.getpid(),
+        "piles_repliees": session.piles_repliees(),
+        "cprofile": session.statistiques()
+    })
+
+def prechauffer():
+    """Parcourt une fois les chemins chauds (gabarit compilé, imports différés, premiers calculs)
+
+    Appelé dans le maître gunicorn avant le fork : les workers héritent du résultat.
+    """
+    matiere = MATIERES_PREMIERES[0]
+    dp.get_prix_matieres(MATIERES_PREMIERES)
+    dp.get_historique(matiere['symbole'], PERIODES_HISTORIQUE['mois'], points=POINTS_GRAPHE_DEFAUT)
+    dp.get_indicateurs(matiere['symbole'])
+    dp.get_predictions_detail(matiere['symbole'], chemins=1000)
+    with app.test_request_context('/'):
+        render_template('dashboard.html')
+        repondre({"prechauffage": True})
+
 @app.route('/', methods=['GET'])
 def index():
     """Page d'accueil avec l'interface web"""
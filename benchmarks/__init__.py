@@ -0,0 +1,12 @@
+"""
+Benchmarks : micro-benchmarks du moteur (benchmarks.micro) et test de charge des
+endpoints (benchmarks.charge). Lancer depuis la racine du dépôt :
+
+    python -m benchmarks.micro --tailles 70,1000,10000
+    python -m benchmarks.charge --mode client --clients 16 --duree 30
+    python -m benchmarks.charge --mode gunicorn --workers 2 --threads 8
+    python -m benchmarks.demarrage --repetitions 5
+    python -m benchmarks.comparer benchmarks/resultats/micro-A.json benchmarks/resultats/micro-B.json
+
+Les résultats sont écrits en JSON dans benchmarks/resultats/.
+"""
@@ -0,0 +1,18 @@
+"""
+Application servie pendant les tests de charge : le catalogue est complété à
+BENCHMARK_TAILLE instruments avant l'import de app (gunicorn benchmarks.application:app)
+"""
+import argparse
+import os
+
+from benchmarks.commun import etendre_catalogue
+
+etendre_catalogue(int(os.getenv('BENCHMARK_TAILLE', 0)))
+
+from app import app  # noqa: E402
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur de développement Werkzeug (multithread)")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    app.run(host="127.0.0.1", port=args.port, threaded=True)
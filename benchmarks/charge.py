@@ -0,0 +1,234 @@
+"""
+Test de charge des endpoints avec des clients concurrents qui rejouent le parcours du dashboard
+
+Chaque client enchaîne des visites : page d'accueil, liste des matières (parfois suivie
+des variations de toute la liste), puis quelques consultations d'une matière (prix,
+graphe, prédictions, indicateurs), les matières populaires étant plus demandées.
+Modes : client de test Flask dans le processus, ou serveur réel (gunicorn, ou
+Werkzeug multithread à défaut) interrogé en HTTP. Le flux SSE n'est pas mesuré.
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from benchmarks.commun import RACINE, centiles, descendants, ecrire_resultats, environnement, memoire
+
+PERIODES_GRAPHE = ("jour", "semaine", "mois", "annee", "5ans", "max")
+POINTS_GRAPHE = 550  # largeur du canvas du dashboard
+
+
+def _parcours(alea, ids, poids):
+    """Requêtes (route, chemin) d'une visite du dashboard"""
+    requetes = [("/", "/"), ("/api/matieres", "/api/matieres?q=&categorie=")]
+    if alea.random() < 0.3:
+        # Filtre par variation : les prix de toute la liste affichée
+        requetes.append(("/api/prix?ids=", "/api/prix?ids=" + ",".join(map(str, ids))))
+    for _ in range(alea.randint(1, 4)):
+        matiere = alea.choices(ids, weights=poids)[0]
+        action = alea.choices(("prix", "graphe", "predictions", "indicateurs"), weights=(4, 3, 2, 1))[0]
+        if action == "prix":
+            requetes.append(("/api/prix/<id>", f"/api/prix/{matiere}"))
+        elif action == "graphe":
+            requetes.append(("/api/historique/<id>", f"/api/historique/{matiere}?periode=mois&points={POINTS_GRAPHE}"))
+            if alea.random() < 0.5:
+                periode = alea.choice(PERIODES_GRAPHE)
+                requetes.append(("/api/historique/<id>", f"/api/historique/{matiere}?periode={periode}&points={POINTS_GRAPHE}"))
+        elif action == "predictions":
+            requetes.append(("/api/predictions/<id>", f"/api/predictions/{matiere}"))
+        else:
+            requetes.append(("/api/indicateurs/<id>", f"/api/indicateurs/{matiere}"))
+    return requetes
+
+
+class Transport:
+    """Envoie une requête GET et retourne le code de statut"""
+
+    def session(self):
+        raise NotImplementedError
+
+    def pids(self):
+        return []
+
+
+class TransportClientTest(Transport):
+    """Client de test Flask : l'application tourne dans ce processus (sans réseau)"""
+
+    def __init__(self, taille):
+        os.environ.update(environnement(BENCHMARK_TAILLE=taille))
+        from benchmarks.application import app
+        self.app = app
+
+    def session(self):
+        client = self.app.test_client()
+        return lambda chemin: client.get(chemin, headers={"Accept-Encoding": "gzip"}).status_code
+
+    def pids(self):
+        return [os.getpid()]
+
+
+class TransportHTTP(Transport):
+    """Serveur lancé dans un processus à part (gunicorn ou Werkzeug), interrogé en HTTP"""
+
+    def __init__(self, taille, serveur, workers, threads, attente=120):
+        import requests
+        self.requests = requests
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        if serveur == "gunicorn":
+            commande = [sys.executable, "-m", "gunicorn", "benchmarks.application:app", "-b", f"127.0.0.1:{port}",
+                        "-w", str(workers), "-k", "gthread", "--threads", str(threads)]
+        else:
+            commande = [sys.executable, "-m", "benchmarks.application", "--port", str(port)]
+        self.processus = subprocess.Popen(commande, cwd=RACINE, env=environnement(BENCHMARK_TAILLE=taille),
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        limite = time.monotonic() + attente
+        while time.monotonic() < limite:
+            if self.processus.poll() is not None:
+                raise RuntimeError(f"Le serveur {serveur} s'est arrêté (code {self.processus.returncode})")
+            try:
+                if requests.get(self.url + "/api/health", timeout=1).ok:
+                    return
+            except requests.RequestException:
+                time.sleep(0.2)
+        self.arreter()
+        raise RuntimeError(f"Le serveur {serveur} ne répond pas après {attente} s")
+
+    def session(self):
+        session = self.requests.Session()
+        return lambda chemin: session.get(self.url + chemin, timeout=30).status_code
+
+    def pids(self):
+        return descendants(self.processus.pid)
+
+    def arreter(self):
+        self.processus.terminate()
+        try:
+            self.processus.wait(10)
+        except subprocess.TimeoutExpired:
+            self.processus.kill()
+
+
+def _client(transport, graine, ids, poids, debut_mesure, fin, pause, mesures):
+    """Boucle d'un client : visites successives jusqu'à `fin` ; mesures après `debut_mesure`"""
+    alea = random.Random(graine)
+    requete = transport.session()
+    while time.monotonic() < fin:
+        for route, chemin in _parcours(alea, ids, poids):
+            debut = time.monotonic()
+            if debut >= fin:
+                return
+            try:
+                statut = requete(chemin)
+            except Exception:
+                statut = None
+            if debut >= debut_mesure:
+                mesures.append((route, time.monotonic() - debut, statut))
+            if pause:
+                time.sleep(alea.expovariate(1 / pause))
+
+
+def _memoire_totale(pids):
+    rss = [memoire(pid) for pid in pids]
+    return sum(m["rss_mo"] or 0 for m in rss), sum(m["rss_max_mo"] or 0 for m in rss)
+
+
+def executer(transport, clients, duree, echauffement, pause, graine):
+    """Lance les clients et retourne les statistiques globales et par route"""
+    from catalogue import CATALOGUE
+    ids = [m['id'] for m in CATALOGUE] if isinstance(transport, TransportClientTest) else \
+        [m['id'] for m in transport.requests.get(transport.url + "/api/matieres", timeout=30).json()]
+    # Popularité en loi de Zipf : quelques matières concentrent la plupart des consultations
+    poids = [1 / (rang + 1) for rang in range(len(ids))]
+
+    debut_mesure = time.monotonic() + echauffement
+    fin = debut_mesure + duree
+    par_client = [[] for _ in range(clients)]
+    threads = [
+        threading.Thread(target=_client, args=(transport, graine + k, ids, poids, debut_mesure, fin, pause, par_client[k]),
+                         daemon=True)
+        for k in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+
+    # RSS échantillonnée chaque seconde (somme des processus du serveur)
+    rss = []
+    while any(thread.is_alive() for thread in threads):
+        if time.monotonic() >= debut_mesure:
+            rss.append(_memoire_totale(transport.pids())[0])
+        time.sleep(1)
+    for thread in threads:
+        thread.join()
+
+    mesures = [m for liste in par_client for m in liste]
+    par_route = defaultdict(list)
+    erreurs = defaultdict(int)
+    for route, duree_requete, statut in mesures:
+        par_route[route].append(duree_requete)
+        if statut is None or statut >= 500:
+            erreurs[route] += 1
+    routes = {
+        route: {**centiles(durees), "erreurs": erreurs[route], "debit_rps": round(len(durees) / duree, 2)}
+        for route, durees in sorted(par_route.items())
+    }
+    return {
+        "global": {
+            **centiles([d for _, d, _ in mesures]),
+            "erreurs": sum(erreurs.values()),
+            "debit_rps": round(len(mesures) / duree, 2),
+        },
+        "routes": routes,
+        "memoire": {
+            "rss_moyenne_mo": round(float(np.mean(rss)), 1) if rss else None,
+            "rss_fin_mo": round(rss[-1], 1) if rss else None,
+            "rss_max_mo": round(_memoire_totale(transport.pids())[1], 1),
+            "processus": len(transport.pids()),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=("client", "gunicorn", "werkzeug"), default="client")
+    parser.add_argument("--clients", type=int, default=16, help="clients concurrents")
+    parser.add_argument("--duree", type=float, default=30, help="durée de la mesure (s)")
+    parser.add_argument("--echauffement", type=float, default=5, help="durée non mesurée au début (s)")
+    parser.add_argument("--pause", type=float, default=0.0, help="temps de réflexion moyen entre requêtes (s)")
+    parser.add_argument("--taille", type=int, default=70, help="taille du catalogue")
+    parser.add_argument("--workers", type=int, default=2, help="workers gunicorn")
+    parser.add_argument("--threads", type=int, default=8, help="threads par worker gunicorn")
+    parser.add_argument("--graine", type=int, default=0)
+    parser.add_argument("--sortie", help="fichier JSON de résultats (défaut : benchmarks/resultats/charge-<mode>-<date>.json)")
+    args = parser.parse_args()
+
+    if args.mode == "client":
+        transport = TransportClientTest(args.taille)
+    else:
+        transport = TransportHTTP(args.taille, args.mode, args.workers, args.threads)
+    try:
+        resultats = executer(transport, args.clients, args.duree, args.echauffement, args.pause, args.graine)
+    finally:
+        if isinstance(transport, TransportHTTP):
+            transport.arreter()
+
+    configuration = {cle: valeur for cle, valeur in vars(args).items() if cle != "sortie"}
+    if args.mode != "gunicorn":
+        configuration.pop("workers"), configuration.pop("threads")
+    g = resultats["global"]
+    print(f"{g['n']} requêtes, {g['debit_rps']} req/s, p50 {g.get('p50_ms')} ms, p95 {g.get('p95_ms')} ms, "
+          f"p99 {g.get('p99_ms')} ms, {g['erreurs']} erreurs", file=sys.stderr)
+    print(ecrire_resultats(f"charge-{args.mode}", configuration, resultats, args.sortie))
+
+
+if __name__ == "__main__":
+    main()
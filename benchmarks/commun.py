@@ -0,0 +1,131 @@
+"""
+Outils communs aux benchmarks : catalogue synthétique, mesure de la mémoire,
+centiles et écriture des résultats
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPERTOIRE_RESULTATS = os.path.join(RACINE, "benchmarks", "resultats")
+
+# Pas de réseau ni d'écriture de barres pendant les mesures ; le reste garde sa configuration
+ENVIRONNEMENT = {
+    "REMPLISSAGE_DONNEES": "0",
+    "COTATIONS_EN_DIRECT": "0",
+    "BARRES_PERSISTANTES": "0",
+}
+
+
+def environnement(**valeurs):
+    """Environnement d'un processus mesuré (variables du benchmark, puis `valeurs`)"""
+    env = dict(os.environ, **ENVIRONNEMENT)
+    env.setdefault("HISTORIQUE_REPERTOIRE", os.path.join(tempfile.gettempdir(), "benchmarks-historique"))
+    env.update({cle: str(valeur) for cle, valeur in valeurs.items()})
+    return env
+
+
+def etendre_catalogue(taille):
+    """Complète le catalogue jusqu'à `taille` instruments synthétiques (avant d'importer data_process)"""
+    from catalogue import CATALOGUE, url_actualites
+
+    modeles = list(CATALOGUE)
+    prochain_id = max(m['id'] for m in modeles) + 1
+    for k in range(len(CATALOGUE), taille):
+        modele = modeles[k % len(modeles)]
+        matiere = {
+            "id": prochain_id,
+            "nom": f"{modele['nom']} (synthétique {k})",
+            "unite": modele['unite'],
+            "symbole": f"SYN{k:05d}",
+            "categorie": modele['categorie'],
+        }
+        CATALOGUE.ajouter(dict(matiere, news_url=url_actualites(matiere)))
+        prochain_id += 1
+    return CATALOGUE
+
+
+def memoire(pid="self"):
+    """RSS courante et maximale (Mo) d'un processus, lues dans /proc"""
+    valeurs = {}
+    try:
+        with open(f"/proc/{pid}/status") as fichier:
+            for ligne in fichier:
+                if ligne.startswith(("VmRSS:", "VmHWM:")):
+                    valeurs[ligne[:5]] = int(ligne.split()[1]) / 1024
+    except FileNotFoundError:
+        return {"rss_mo": None, "rss_max_mo": None}
+    return {"rss_mo": round(valeurs.get("VmRSS", 0), 1), "rss_max_mo": round(valeurs.get("VmHWM", 0), 1)}
+
+
+def descendants(pid):
+    """pid et ceux de tous ses descendants (workers gunicorn)"""
+    pids, a_voir = [], [pid]
+    while a_voir:
+        courant = a_voir.pop()
+        pids.append(courant)
+        try:
+            for tache in os.listdir(f"/proc/{courant}/task"):
+                with open(f"/proc/{courant}/task/{tache}/children") as fichier:
+                    a_voir.extend(int(p) for p in fichier.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return pids
+
+
+def centiles(durees):
+    """Statistiques (ms) d'une liste de durées en secondes"""
+    if not len(durees):
+        return {"n": 0}
+    ms = np.asarray(durees) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "n": int(len(ms)),
+        "min_ms": round(float(ms.min()), 3),
+        "moyenne_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def _revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RACINE,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        modifie = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=RACINE,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ("-modifie" if modifie else "")
+
+
+def ecrire_resultats(nature, configuration, resultats, sortie=None):
+    """Écrit les résultats (avec révision et machine) en JSON et retourne le chemin du fichier"""
+    maintenant = datetime.now()
+    if sortie is None:
+        os.makedirs(REPERTOIRE_RESULTATS, exist_ok=True)
+        sortie = os.path.join(REPERTOIRE_RESULTATS, f"{nature}-{maintenant:%Y%m%d-%H%M%S}.json")
+    document = {
+        "nature": nature,
+        "horodatage": maintenant.isoformat(timespec="seconds"),
+        "revision": _revision(),
+        "machine": {
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "plateforme": platform.platform(),
+            "processeurs": os.cpu_count(),
+        },
+        "configuration": configuration,
+        "resultats": resultats,
+    }
+    with open(sortie, "w") as fichier:
+        json.dump(document, fichier, indent=2, ensure_ascii=False)
+    return sortie
@@ -0,0 +1,76 @@
+"""
+Compare deux fichiers de résultats de même nature et signale les régressions
+
+Code de sortie 1 si une latence augmente (ou un débit baisse) de plus du seuil.
+"""
+import argparse
+import json
+import sys
+
+LATENCES = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def _series(document):
+    """Valeurs comparables {(groupe, mesure, statistique): valeur}"""
+    valeurs = {}
+    if document["nature"] == "micro":
+        for resultat in document["resultats"]:
+            for nom, stats in resultat.get("mesures", {}).items():
+                for cle in LATENCES:
+                    valeurs[(f"taille {resultat['taille']}", nom, cle)] = stats.get(cle)
+            valeurs[(f"taille {resultat['taille']}", "démarrage", "s")] = resultat.get("demarrage_s")
+    elif document["nature"] == "demarrage":
+        resultats = document["resultats"]
+        for cle in ("processus_s", "import_app_s", "premiere_reponse_s"):
+            valeurs[("démarrage", cle, "s")] = resultats.get(cle)
+        for nom, stats in resultats["modules"].items():
+            valeurs[("import", nom, "cumul_ms")] = stats["cumul_ms"]
+    else:
+        resultats = document["resultats"]
+        for route, stats in [("global", resultats["global"]), *resultats["routes"].items()]:
+            for cle in LATENCES + ("debit_rps",):
+                valeurs[("routes", route, cle)] = stats.get(cle)
+        valeurs[("mémoire", "rss_max", "mo")] = resultats["memoire"].get("rss_max_mo")
+    return valeurs
+
+
+def comparer(reference, candidat, seuil):
+    """Lignes (groupe, mesure, statistique, avant, après, écart relatif, régression)"""
+    avant, apres = _series(reference), _series(candidat)
+    lignes = []
+    for cle in avant:
+        a, b = avant[cle], apres.get(cle)
+        if not a or b is None:
+            continue
+        ecart = b / a - 1
+        # Un débit qui baisse est une régression, une latence ou une mémoire qui augmente aussi
+        regression = -ecart > seuil if cle[2] == "debit_rps" else ecart > seuil
+        lignes.append((*cle, a, b, ecart, regression))
+    return lignes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("reference")
+    parser.add_argument("candidat")
+    parser.add_argument("--seuil", type=float, default=0.10, help="écart relatif toléré (0.10 : 10 %%)")
+    args = parser.parse_args()
+
+    with open(args.reference) as fichier:
+        reference = json.load(fichier)
+    with open(args.candidat) as fichier:
+        candidat = json.load(fichier)
+    if reference["nature"] != candidat["nature"]:
+        sys.exit(f"Natures différentes : {reference['nature']} / {candidat['nature']}")
+
+    print(f"{reference['revision']} -> {candidat['revision']}")
+    regressions = 0
+    for groupe, mesure, statistique, a, b, ecart, regression in comparer(reference, candidat, args.seuil):
+        regressions += regression
+        marque = "  RÉGRESSION" if regression else ""
+        print(f"{groupe:<12} {mesure:<38} {statistique:<10} {a:>12.3f} {b:>12.3f} {ecart:>+8.1%}{marque}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
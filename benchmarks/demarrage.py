@@ -0,0 +1,85 @@
+"""
+Rapport de démarrage : temps d'import de l'application (python -X importtime) et durée
+jusqu'à la première réponse, médianes sur plusieurs processus neufs
+
+Le rapport liste les modules les plus coûteux et signale les bibliothèques lourdes
+chargées dès l'import (elles ne devraient l'être qu'à la première utilisation).
+"""
+import argparse
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from benchmarks.commun import RACINE, ecrire_resultats, environnement
+
+# Bibliothèques qui ne doivent pas être importées au démarrage d'un worker
+MODULES_LOURDS = ("pandas", "requests", "yfinance", "scipy", "matplotlib", "urllib3")
+# Démarrage complet d'un worker : import, puis une première requête
+SCRIPT = (
+    "import time; debut = time.perf_counter(); import app; importe = time.perf_counter(); "
+    "app.app.test_client().get('/api/prix/1'); "
+    "print(importe - debut, time.perf_counter() - debut)"
+)
+
+
+def _importtime(sortie_erreur):
+    """{module: (propre_us, cumul_us)} depuis la sortie de -X importtime"""
+    modules = {}
+    for ligne in sortie_erreur.splitlines():
+        if not ligne.startswith("import time:") or "|" not in ligne:
+            continue
+        propre, cumul, nom = ligne[len("import time:"):].split("|")
+        if propre.strip().isdigit():
+            modules[nom.strip()] = (int(propre), int(cumul))
+    return modules
+
+
+def mesurer(repetitions, env):
+    """Une mesure par processus neuf ; retourne les durées et les temps d'import par module"""
+    durees = defaultdict(list)
+    modules = defaultdict(lambda: ([], []))
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        processus = subprocess.run([sys.executable, "-X", "importtime", "-c", SCRIPT], cwd=RACINE, env=env,
+                                   capture_output=True, text=True, check=True)
+        durees["processus_s"].append(time.perf_counter() - debut)
+        importe, premiere = map(float, processus.stdout.split()[-2:])
+        durees["import_app_s"].append(importe)
+        durees["premiere_reponse_s"].append(premiere)
+        for nom, (propre, cumul) in _importtime(processus.stderr).items():
+            modules[nom][0].append(propre)
+            modules[nom][1].append(cumul)
+    return durees, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--modules", type=int, default=25, help="modules listés (les plus coûteux en cumulé)")
+    parser.add_argument("--sortie", help="fichier JSON de résultats (défaut : benchmarks/resultats/demarrage-<date>.json)")
+    args = parser.parse_args()
+
+    durees, modules = mesurer(args.repetitions, environnement(TICK_PLANIFICATEUR=0))
+    medianes = {nom: (float(np.median(p)), float(np.median(c))) for nom, (p, c) in modules.items()}
+    plus_couteux = sorted(medianes.items(), key=lambda m: m[1][1], reverse=True)[:args.modules]
+    resultats = {
+        **{nom: round(float(np.median(valeurs)), 4) for nom, valeurs in durees.items()},
+        "modules_importes": len(medianes),
+        "modules_lourds_charges": sorted(m for m in medianes if m.split(".")[0] in MODULES_LOURDS and "." not in m),
+        "modules": {nom: {"propre_ms": round(p / 1000, 2), "cumul_ms": round(c / 1000, 2)} for nom, (p, c) in plus_couteux},
+    }
+
+    for nom, valeur in durees.items():
+        print(f"{nom:<20} {np.median(valeur) * 1000:>9.1f} ms", file=sys.stderr)
+    for nom, stats in list(resultats["modules"].items())[:10]:
+        print(f"  {nom:<40} {stats['cumul_ms']:>9.2f} ms", file=sys.stderr)
+    if resultats["modules_lourds_charges"]:
+        print(f"Modules lourds chargés à l'import : {', '.join(resultats['modules_lourds_charges'])}", file=sys.stderr)
+    print(ecrire_resultats("demarrage", {"repetitions": args.repetitions}, resultats, args.sortie))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Micro-benchmarks des fonctions de calcul pour plusieurs tailles de catalogue
+
+Chaque taille tourne dans un processus neuf (catalogue complété d'instruments
+synthétiques avant l'import de data_process), pour que le démarrage et la mémoire
+soient mesurés sans interférence entre tailles.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.commun import RACINE, centiles, ecrire_resultats, environnement, etendre_catalogue, memoire
+
+TAILLES = (70, 1000, 10000)
+# Instrument du catalogue d'origine utilisé pour les fonctions par matière
+SYMBOLE = "GC=F"
+
+
+def mesurer(fonction, duree=0.5, repetitions_min=5, repetitions_max=2000):
+    """Appelle `fonction` pendant au moins `duree` secondes (après un appel d'échauffement)"""
+    fonction()
+    durees = []
+    fin = time.perf_counter() + duree
+    while len(durees) < repetitions_min or (time.perf_counter() < fin and len(durees) < repetitions_max):
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+    return centiles(durees)
+
+
+def cas(chemins):
+    """Fonctions mesurées : (nom, appel sans argument)"""
+    import data_process as dp
+    from catalogue import CATALOGUE
+    from predictor import MarketPredictor
+
+    matiere = CATALOGUE.par_symbole(SYMBOLE)
+    matieres = list(CATALOGUE)
+    predicteur = MarketPredictor()
+    return [
+        ("generer_prix_actuel", lambda: dp.generer_prix_actuel(SYMBOLE, matiere['nom'], matiere['categorie'])),
+        ("avancer_univers", dp.avancer_univers),
+        ("get_prix_matiere", lambda: dp.get_prix_matiere(SYMBOLE)),
+        ("get_prix_matieres[univers]", lambda: dp.get_prix_matieres(matieres)),
+        ("get_historique[1mo]", lambda: dp.get_historique(SYMBOLE, '1mo')),
+        ("get_historique[5y,550 points]", lambda: dp.get_historique(SYMBOLE, '5y', points=550)),
+        ("get_historique[max,brut]", lambda: dp.get_historique(SYMBOLE, 'max', brut=True)),
+        ("get_indicateurs", lambda: dp.get_indicateurs(SYMBOLE)),
+        ("get_predictions_detail", lambda: dp.get_predictions_detail(SYMBOLE, '7j', chemins)),
+        ("MarketPredictor.generate_scenarios", lambda: predicteur.generate_scenarios(SYMBOLE, '7j', n_chemins=chemins)),
+        ("simuler_scenarios[univers]", lambda: dp.simuler_scenarios(matieres, '7j', chemins=min(chemins, 1000))),
+    ]
+
+
+def enfant(taille, duree, chemins, filtre, resultat):
+    """Mesures d'une taille de catalogue, dans le processus courant"""
+    debut = time.perf_counter()
+    etendre_catalogue(taille)
+    import data_process  # noqa: F401  (enregistre et préchauffe tout le catalogue)
+    demarrage = time.perf_counter() - debut
+    apres_demarrage = memoire()
+
+    mesures = {}
+    for nom, fonction in cas(chemins):
+        if filtre and not any(f in nom for f in filtre):
+            continue
+        mesures[nom] = mesurer(fonction, duree)
+        print(f"  {taille:>6} {nom:<38} p50 {mesures[nom]['p50_ms']:>10.3f} ms", file=sys.stderr)
+
+    with open(resultat, "w") as fichier:
+        json.dump({
+            "taille": taille,
+            "demarrage_s": round(demarrage, 3),
+            "memoire_demarrage": apres_demarrage,
+            "memoire_fin": memoire(),
+            "mesures": mesures,
+        }, fichier)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tailles", default=",".join(map(str, TAILLES)), help="tailles de catalogue (virgules)")
+    parser.add_argument("--duree", type=float, default=0.5, help="durée minimale de mesure par fonction (s)")
+    parser.add_argument("--chemins", type=int, default=10000, help="chemins Monte Carlo par prédiction")
+    parser.add_argument("--profondeur", type=int, default=1000, help="ticks d'historique par instrument")
+    parser.add_argument("--fonctions", default="", help="ne mesurer que les fonctions contenant ces noms (virgules)")
+    parser.add_argument("--sortie", help="fichier JSON de résultats (défaut : benchmarks/resultats/micro-<date>.json)")
+    parser.add_argument("--enfant", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--resultat", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    filtre = [f for f in args.fonctions.split(",") if f]
+
+    if args.enfant is not None:
+        enfant(args.enfant, args.duree, args.chemins, filtre, args.resultat)
+        return
+
+    tailles = [int(t) for t in args.tailles.split(",")]
+    resultats = []
+    for taille in tailles:
+        with tempfile.NamedTemporaryFile(suffix=".json") as resultat:
+            commande = [sys.executable, "-m", "benchmarks.micro", "--enfant", str(taille), "--resultat", resultat.name,
+                        "--duree", str(args.duree), "--chemins", str(args.chemins), "--fonctions", args.fonctions]
+            processus = subprocess.run(commande, cwd=RACINE, env=environnement(HISTORIQUE_PROFONDEUR=args.profondeur))
+            if processus.returncode != 0:
+                resultats.append({"taille": taille, "erreur": f"code de sortie {processus.returncode}"})
+                continue
+            resultats.append(json.load(resultat))
+
+    configuration = {"tailles": tailles, "duree_s": args.duree, "chemins": args.chemins,
+                     "profondeur": args.profondeur, "symbole": SYMBOLE, "fonctions": filtre}
+    print(ecrire_resultats("micro", configuration, resultats, args.sortie))
+
+
+if __name__ == "__main__":
+    main()
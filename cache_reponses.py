@@ -0,0 +1,120 @@
+"""
+Cache des réponses HTTP des endpoints de lecture
+Clé (endpoint, paramètres, format, encodage, version de l'instantané de prix) ;
+corps stocké déjà compressé ; éviction LRU, durée de vie (TTL) et plafond
+mémoire ; ETag fort et réponses 304.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import make_response, request
+
+from formats_reponse import compresser
+
+CACHE_TTL = float(os.getenv('CACHE_TTL', 30))
+CACHE_MAX_ENTREES = int(os.getenv('CACHE_MAX_ENTREES', 1024))
+CACHE_MAX_OCTETS = int(os.getenv('CACHE_MAX_OCTETS', 32 * 1024 * 1024))
+# Corps plus gros non mis en cache : une seule réponse volumineuse n'évince pas tout le reste
+CACHE_MAX_OCTETS_ENTREE = int(os.getenv('CACHE_MAX_OCTETS_ENTREE', 1024 * 1024))
+
+Entree = namedtuple("Entree", ["corps", "type_contenu", "encodage", "etag", "expiration"])
+
+
+class CacheReponses:
+    """Cache LRU borné en nombre d'entrées et en octets (au total et par entrée), avec expiration"""
+
+    def __init__(self, ttl=CACHE_TTL, max_entrees=CACHE_MAX_ENTREES, max_octets=CACHE_MAX_OCTETS,
+                 max_octets_entree=CACHE_MAX_OCTETS_ENTREE):
+        self.ttl = ttl
+        self.max_entrees = max_entrees
+        self.max_octets = max_octets
+        self.max_octets_entree = min(max_octets_entree, max_octets)
+        self.octets = 0
+        self.succes = 0
+        self.echecs = 0
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def __len__(self):
+        return len(self._entrees)
+
+    def lire(self, cle):
+        """Entrée valide pour la clé (et la marque comme récente), sinon None"""
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None or entree.expiration <= time.monotonic():
+                if entree is not None:
+                    self._retirer(cle)
+                self.echecs += 1
+                return None
+            self._entrees.move_to_end(cle)
+            self.succes += 1
+            return entree
+
+    def ecrire(self, cle, corps, type_contenu, encodage=None):
+        """Stocke un corps de réponse (encodé) et retourne son entrée (non stockée si trop volumineuse)"""
+        entree = Entree(corps, type_contenu, encodage, hashlib.blake2b(corps, digest_size=16).hexdigest(),
+                        time.monotonic() + self.ttl)
+        if len(corps) > self.max_octets_entree:
+            return entree
+        with self._verrou:
+            if cle in self._entrees:
+                self._retirer(cle)
+            self._entrees[cle] = entree
+            self.octets += len(corps)
+            while len(self._entrees) > self.max_entrees or self.octets > self.max_octets:
+                self._retirer(next(iter(self._entrees)))
+        return entree
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+            self.octets = 0
+
+    def _retirer(self, cle):
+        self.octets -= len(self._entrees.pop(cle).corps)
+
+
+def _reponse(entree):
+    """Réponse 304 si le client a déjà cette version, sinon le corps en cache"""
+    # Comparaison faible : ETag envoyé affaibli par une version antérieure ou un proxy
+    if request.if_none_match.contains_weak(entree.etag):
+        reponse = make_response("", 304)
+    else:
+        reponse = make_response(entree.corps)
+        reponse.content_type = entree.type_contenu
+        if entree.encodage:
+            reponse.headers['Content-Encoding'] = entree.encodage
+    reponse.vary.update(('Accept', 'Accept-Encoding'))
+    reponse.set_etag(entree.etag)
+    reponse.headers['Cache-Control'] = 'no-cache'
+    return reponse
+
+
+def mise_en_cache(cache, version):
+    """Décorateur de route : sert les réponses 200 depuis le cache pour une même version des prix
+
+    La variante gzip est mise en cache telle quelle (un succès ne recompresse pas le corps).
+    """
+    def decorateur(vue):
+        @wraps(vue)
+        def enveloppe(*args, **kwargs):
+            gzip_accepte = 'gzip' in request.accept_encodings
+            cle = (request.endpoint, tuple(sorted(kwargs.items())),
+                   tuple(sorted(request.args.items(multi=True))), request.headers.get('Accept', ''),
+                   gzip_accepte, version())
+            entree = cache.lire(cle)
+            if entree is None:
+                reponse = make_response(vue(*args, **kwargs))
+                if reponse.status_code != 200:
+                    return reponse
+                reponse = compresser(reponse)
+                entree = cache.ecrire(cle, reponse.get_data(), reponse.content_type,
+                                      reponse.headers.get('Content-Encoding'))
+            return _reponse(entree)
+        return enveloppe
+    return decorateur
@@ -0,0 +1,192 @@
+"""
+Registre des matières premières
+Chargé depuis un fichier source (JSON ou CSV, CATALOGUE_SOURCE) ; index par id,
+symbole et catégorie et index de recherche construits une seule fois, puis
+enregistrés avec le catalogue dans un fichier compilé (pickle) : les démarrages
+suivants le chargent directement, sans relire la source ni reconstruire les index.
+"""
+import csv
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+
+import numpy as np
+
+from recherche import IndexRecherche, replier
+
+logger = logging.getLogger(__name__)
+
+_REPERTOIRE = os.path.dirname(os.path.abspath(__file__))
+CATALOGUE_SOURCE = os.getenv('CATALOGUE_SOURCE', os.path.join(_REPERTOIRE, 'catalogue.json'))
+CATALOGUE_FICHIER = os.getenv('CATALOGUE_FICHIER', os.path.join(_REPERTOIRE, 'catalogue.pickle'))
+# Format du fichier compilé : à incrémenter quand Catalogue ou IndexRecherche changent
+FORMAT_COMPILE = 4
+
+# Mapping des liens d'actualités
+NEWS_BASES = {
+    'yahoo': 'https://finance.yahoo.com/quote/',
+    'investing': 'https://www.investing.com/commodities/',
+    'google': 'https://news.google.com/search?q='
+}
+
+
+def url_actualites(matiere):
+    """Lien vers les actualités d'une matière"""
+    symb = matiere.get('symbole', '').replace('=F','').replace(' ','-').lower()
+    cat = matiere.get('categorie','').lower()
+    nom = matiere.get('nom','').replace(' ','+').replace("'",'')
+    
+    if matiere['symbole'] and matiere['symbole'].endswith('=F'):
+        return f"{NEWS_BASES['yahoo']}{matiere['symbole']}?p={matiere['symbole']}"
+    
+    if cat in ['énergie','métal','agricole','chimie','industriel']:
+        return f"{NEWS_BASES['investing']}{symb}-news"
+    
+    return f"{NEWS_BASES['google']}{nom}+actualites"
+
+
+class Catalogue:
+    """Registre des instruments avec accès O(1) par id, symbole et catégorie"""
+
+    # Champs du catalogue utilisables comme clé de tri des listes
+    CHAMPS_TRI = ('id', 'nom', 'symbole', 'categorie')
+
+    def __init__(self, matieres):
+        self.matieres = matieres
+        self._positions = {}
+        self._cles_tri = {}
+        self._par_id = {}
+        self._par_symbole = {}
+        self._par_categorie = {}
+        for m in matieres:
+            self._ajouter(m)
+        self._index = IndexRecherche(matieres)
+
+    def ajouter(self, matiere):
+        """Ajoute une matière (id et symbole uniques) au registre"""
+        if matiere['id'] in self._par_id or matiere['symbole'] in self._par_symbole:
+            raise ValueError(f"Matière déjà présente : {matiere['id']} / {matiere['symbole']}")
+        self.matieres.append(matiere)
+        self._ajouter(matiere)
+        # Index de recherche et clés de tri reconstruits à la prochaine utilisation
+        self._index = None
+        self._cles_tri = {}
+
+    def _ajouter(self, matiere):
+        self._positions[matiere['id']] = len(self._positions)
+        self._par_id[matiere['id']] = matiere
+        self._par_symbole[matiere['symbole']] = matiere
+        self._par_categorie.setdefault(matiere['categorie'].lower(), []).append(matiere)
+
+    def __len__(self):
+        return len(self.matieres)
+
+    def __iter__(self):
+        return iter(self.matieres)
+
+    def par_id(self, matiere_id):
+        """Retourne la matière d'id donné ou None"""
+        return self._par_id.get(matiere_id)
+
+    def par_symbole(self, symbole):
+        """Retourne la matière de symbole donné ou None"""
+        return self._par_symbole.get(symbole)
+
+    def par_categorie(self, categorie):
+        """Retourne les matières d'une catégorie (insensible à la casse)"""
+        return self._par_categorie.get(categorie.lower(), [])
+
+    def categories(self):
+        """Liste des catégories connues"""
+        return list(self._par_categorie)
+
+    def positions(self, matieres):
+        """Positions des matières données dans le catalogue (tableau NumPy)"""
+        if matieres is self.matieres:
+            return np.arange(len(self.matieres))
+        return np.fromiter((self._positions[m['id']] for m in matieres), dtype=np.intp, count=len(matieres))
+
+    def cle_tri(self, champ):
+        """Clé de tri numérique de chaque matière (par position) : l'id, ou le rang du texte sans accents ni casse"""
+        cle = self._cles_tri.get(champ)
+        if cle is None:
+            if champ == 'id':
+                cle = np.array([m['id'] for m in self.matieres], dtype=np.float64)
+            else:
+                # Textes égaux : même rang (départagés ensuite par l'id)
+                _, rangs = np.unique([replier(str(m.get(champ, ''))) for m in self.matieres], return_inverse=True)
+                cle = rangs.astype(np.float64)
+            self._cles_tri[champ] = cle
+        return cle
+
+    def rechercher(self, requete, categorie=None, limite=None):
+        """Matières correspondant à la requête (sans accents ni casse), les plus pertinentes d'abord"""
+        index = self._index
+        if index is None or len(index) != len(self.matieres):
+            index = self._index = IndexRecherche(self.matieres)
+        return [self.matieres[k] for k in index.rechercher(requete, categorie, limite)]
+
+
+def lire_source(source=CATALOGUE_SOURCE):
+    """Matières du fichier source : liste JSON d'objets, ou CSV (id, nom, unite, symbole, categorie)"""
+    with open(source, encoding='utf-8', newline='') as fichier:
+        if source.endswith('.csv'):
+            return [dict(ligne, id=int(ligne['id'])) for ligne in csv.DictReader(fichier)]
+        return json.load(fichier)
+
+
+def _empreinte_source(source=CATALOGUE_SOURCE):
+    """Empreinte du fichier source, des versions de Python et NumPy et du format ; None si la source est absente"""
+    try:
+        with open(source, 'rb') as fichier:
+            contenu = fichier.read()
+    except FileNotFoundError:
+        return None
+    return hashlib.blake2b(contenu + f"{sys.version}/{np.__version__}/{FORMAT_COMPILE}".encode(), digest_size=16).hexdigest()
+
+
+def construire(source=CATALOGUE_SOURCE):
+    """Catalogue construit depuis le fichier source, liens d'actualités compris"""
+    return Catalogue([dict(m, news_url=url_actualites(m)) for m in lire_source(source)])
+
+
+def compiler(fichier=CATALOGUE_FICHIER, source=CATALOGUE_SOURCE):
+    """Construit le catalogue depuis le fichier source et l'écrit dans le fichier compilé"""
+    catalogue = construire(source)
+    provisoire = f"{fichier}.{os.getpid()}"
+    with open(provisoire, 'wb') as sortie:
+        # Empreinte d'abord : vérifiée à la lecture avant de désérialiser le catalogue
+        pickle.dump(_empreinte_source(source), sortie, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(catalogue, sortie, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(provisoire, fichier)
+    return catalogue
+
+
+def charger(fichier=CATALOGUE_FICHIER, source=CATALOGUE_SOURCE):
+    """Catalogue du fichier compilé s'il correspond à la source, sinon recompilé"""
+    empreinte = _empreinte_source(source)
+    try:
+        with open(fichier, 'rb') as entree:
+            if empreinte is None or pickle.load(entree) == empreinte:
+                return pickle.load(entree)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        # Fichier absent, corrompu, ou écrit par d'autres versions (classes ou modules introuvables)
+        pass
+    try:
+        return compiler(fichier, source)
+    except OSError as e:
+        # Système de fichiers en lecture seule : catalogue construit en mémoire seulement
+        logger.warning("Catalogue compilé non écrit (%s) : %s", fichier, e)
+        return construire(source)
+
+
+CATALOGUE = charger()
+MATIERES_PREMIERES = CATALOGUE.matieres
+
+if __name__ == "__main__":
+    # Compilé depuis le module importé (et non __main__) pour que le pickle référence catalogue.Catalogue
+    import catalogue
+    print(f"{len(catalogue.compiler())} matières compilées dans {catalogue.CATALOGUE_FICHIER}")
@@ -0,0 +1,135 @@
+"""
+Corrélations et covariances entre instruments
+Estimation exponentielle (EWMA) mise à jour à chaque tick en O(N²), estimation
+sur fenêtre glissante en un produit matriciel, ordre des instruments par clusters.
+"""
+import os
+
+import numpy as np
+
+# Facteur d'oubli de l'estimation exponentielle (0.94 : valeur RiskMetrics)
+LAMBDA_EWMA = float(os.getenv('CORRELATION_LAMBDA', 0.94))
+# Lignes suivies par l'estimation exponentielle (matrice en O(N²) : au-delà, estimation sur fenêtre seulement)
+CORRELATION_LIGNES_MAX = int(os.getenv('CORRELATION_LIGNES_MAX', 256))
+# Instruments au plus par matrice demandée, et au plus pour l'ordre par clusters (lien moyen en O(n³))
+CORRELATION_SELECTION_MAX = int(os.getenv('CORRELATION_SELECTION_MAX', CORRELATION_LIGNES_MAX))
+CORRELATION_CLUSTERS_MAX = int(os.getenv('CORRELATION_CLUSTERS_MAX', 200))
+
+
+class MoteurCovariance:
+    """Covariance exponentielle des rendements des `lignes_max` premières lignes, mise à jour par tick"""
+
+    def __init__(self, capacite=128, allocateur=None, lambda_ewma=LAMBDA_EWMA, lignes_max=CORRELATION_LIGNES_MAX):
+        self.lambda_ewma = lambda_ewma
+        self.lignes_max = lignes_max
+        alloue = allocateur or (lambda champ, forme, dtype: np.zeros(forme, dtype=dtype))
+        for champ, forme, dtype in self.disposition(capacite, lignes_max):
+            setattr(self, champ, alloue(champ, forme, dtype))
+        self.partage = allocateur is not None
+
+    @staticmethod
+    def disposition(capacite, lignes_max=CORRELATION_LIGNES_MAX):
+        """Champs (nom, forme, dtype) de l'état de la covariance"""
+        suivies = min(capacite, lignes_max)
+        return [
+            ("moyenne_ewma", (suivies,), np.float64),
+            ("covariance_ewma", (suivies, suivies), np.float64),
+            # Somme des poids reçus par ligne (1 - lambda^n), pour corriger le biais du démarrage
+            ("poids_ewma", (suivies,), np.float64),
+        ]
+
+    @property
+    def suivies(self):
+        return len(self.poids_ewma)
+
+    def redimensionner(self, capacite):
+        if self.partage:
+            raise RuntimeError("Une covariance en mémoire partagée ne peut pas être agrandie")
+        for champ, forme, dtype in self.disposition(capacite, self.lignes_max):
+            ancien = getattr(self, champ)
+            nouveau = np.zeros(forme, dtype=dtype)
+            nouveau[tuple(slice(0, n) for n in ancien.shape)] = ancien
+            setattr(self, champ, nouveau)
+
+    def initialiser(self, lignes):
+        lignes = [ligne for ligne in lignes if ligne < self.suivies]
+        self.moyenne_ewma[lignes] = 0
+        self.covariance_ewma[lignes, :] = 0
+        self.covariance_ewma[:, lignes] = 0
+        self.poids_ewma[lignes] = 0
+
+    def mettre_a_jour(self, lignes, rendements):
+        """Intègre les rendements d'un tick : une mise à jour de rang 1 du bloc des lignes données"""
+        lam = self.lambda_ewma
+        lignes = np.asarray(lignes, dtype=np.intp)
+        if len(lignes) and lignes.max() >= self.suivies:
+            garder = lignes < self.suivies
+            lignes, rendements = lignes[garder], np.asarray(rendements)[garder]
+        bloc = np.ix_(lignes, lignes)
+        ecart = rendements - self.moyenne_ewma[lignes]
+        self.moyenne_ewma[lignes] += (1 - lam) * ecart
+        self.covariance_ewma[bloc] = lam * (self.covariance_ewma[bloc] + (1 - lam) * np.outer(ecart, ecart))
+        self.poids_ewma[lignes] = lam * self.poids_ewma[lignes] + (1 - lam)
+
+    def lire(self, lignes=slice(None)):
+        """Matrice de covariance des lignes suivies données, corrigée du biais de démarrage"""
+        if isinstance(lignes, slice):
+            covariance = self.covariance_ewma[lignes, lignes]
+        else:
+            covariance = self.covariance_ewma[np.ix_(lignes, lignes)]
+        poids = self.poids_ewma[lignes]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(np.minimum.outer(poids, poids) > 0, covariance / np.minimum.outer(poids, poids), np.nan)
+
+
+def extraire(covariance, lignes):
+    """Sous-matrice des lignes données ; NaN pour les lignes hors de la matrice (non suivies)"""
+    lignes = np.asarray(lignes, dtype=np.intp)
+    suivies = lignes < len(covariance)
+    if suivies.all():
+        return covariance[np.ix_(lignes, lignes)]
+    resultat = np.full((len(lignes), len(lignes)), np.nan)
+    k = np.flatnonzero(suivies)
+    resultat[np.ix_(k, k)] = covariance[np.ix_(lignes[k], lignes[k])]
+    return resultat
+
+
+def covariance_fenetre(rendements):
+    """Covariance (échantillon) des lignes d'une matrice de rendements alignés N x T"""
+    centres = rendements - rendements.mean(axis=1, keepdims=True)
+    return centres @ centres.T / max(rendements.shape[1] - 1, 1)
+
+
+def correlation(covariance):
+    """Matrice de corrélation à partir d'une matrice de covariance"""
+    ecarts = np.sqrt(np.diag(covariance))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        resultat = covariance / np.outer(ecarts, ecarts)
+    np.fill_diagonal(resultat, np.where(ecarts > 0, 1.0, np.nan))
+    return np.clip(resultat, -1, 1)
+
+
+def ordre_clusters(correlations):
+    """Ordre des lignes par classification hiérarchique (lien moyen, distance sqrt(2(1 - rho)))
+
+    Les instruments corrélés se retrouvent côte à côte, ce qui fait apparaître des blocs.
+    """
+    n = len(correlations)
+    if n < 3:
+        return list(range(n))
+    distances = np.sqrt(np.clip(2 * (1 - np.nan_to_num(correlations)), 0, None))
+    np.fill_diagonal(distances, np.inf)
+    membres = {i: [i] for i in range(n)}
+    tailles = np.ones(n)
+    actifs = np.ones(n, dtype=bool)
+    for _ in range(n - 1):
+        masque = np.where(np.outer(actifs, actifs), distances, np.inf)
+        a, b = np.unravel_index(np.argmin(masque), masque.shape)
+        # Lien moyen : distance du cluster fusionné = moyenne pondérée par les tailles
+        fusion = (tailles[a] * distances[a] + tailles[b] * distances[b]) / (tailles[a] + tailles[b])
+        distances[a, :] = distances[:, a] = fusion
+        distances[a, a] = np.inf
+        tailles[a] += tailles[b]
+        actifs[b] = False
+        membres[a] = membres[a] + membres.pop(b)
+    return membres[int(np.flatnonzero(actifs)[0])]
@@ -0,0 +1,158 @@
+"""
+Cotations en direct
+Un sondeur interroge le fournisseur en arrière-plan (jamais dans un thread de requête) :
+limiteur à seau de jetons, plusieurs symboles par appel, et une seule requête en vol
+par symbole quelle que soit le nombre de demandes concurrentes.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+COTATIONS_INTERVALLE = float(os.getenv('COTATIONS_INTERVALLE', 15))
+# Une cotation plus récente que ce délai n'est pas redemandée
+COTATIONS_FRAICHEUR = float(os.getenv('COTATIONS_FRAICHEUR', 5))
+# Attente avant d'envoyer les demandes en attente, pour les regrouper en un seul appel
+COTATIONS_REGROUPEMENT = float(os.getenv('COTATIONS_REGROUPEMENT', 0.05))
+COTATIONS_PARALLELES = int(os.getenv('COTATIONS_PARALLELES', 4))
+
+
+class SeauJetons:
+    """Limiteur de débit : `debit` jetons par seconde, au plus `capacite` en réserve"""
+
+    def __init__(self, debit, capacite=None):
+        self.debit = debit
+        self.capacite = capacite or max(1.0, debit)
+        self._jetons = self.capacite
+        self._instant = time.monotonic()
+        self._verrou = threading.Lock()
+
+    def prendre(self, n=1, attente=None):
+        """Prend n jetons, en attendant au plus `attente` secondes (None : sans limite) ; vrai si obtenus"""
+        limite = None if attente is None else time.monotonic() + attente
+        while True:
+            with self._verrou:
+                maintenant = time.monotonic()
+                self._jetons = min(self.capacite, self._jetons + (maintenant - self._instant) * self.debit)
+                self._instant = maintenant
+                if self._jetons >= n:
+                    self._jetons -= n
+                    return True
+                delai = (n - self._jetons) / self.debit
+            if limite is not None and maintenant + delai > limite:
+                return False
+            time.sleep(delai)
+
+
+class SondeurCotations:
+    """Rafraîchit les cotations des symboles couverts et les transmet à `appliquer`"""
+
+    def __init__(self, fournisseur, symboles, appliquer, actif=None, intervalle=COTATIONS_INTERVALLE,
+                 fraicheur=COTATIONS_FRAICHEUR, regroupement=COTATIONS_REGROUPEMENT,
+                 paralleles=COTATIONS_PARALLELES):
+        self.fournisseur = fournisseur
+        self.symboles = [s for s in symboles if fournisseur.couvre(s)]
+        self.appliquer = appliquer
+        # Sans état partagé tous les processus sondent ; sinon seul l'écrivain (voir data_process)
+        self.actif = actif or (lambda: True)
+        self.intervalle = intervalle
+        self.fraicheur = fraicheur
+        self.regroupement = regroupement
+        self.cotations = {}
+        self.appels = 0
+        self._en_vol = {}
+        self._attente = []
+        self._verrou = threading.Lock()
+        self._signal = threading.Event()
+        self._arret = threading.Event()
+        self._executeur = ThreadPoolExecutor(max_workers=paralleles, thread_name_prefix="cotations")
+        self._thread = None
+
+    def demander(self, symboles):
+        """Demande (sans attendre) la cotation des symboles ; retourne un futur par symbole couvert
+
+        Un symbole déjà en vol réutilise le futur existant ; une cotation fraîche est rendue telle quelle.
+        """
+        futurs = {}
+        maintenant = time.time()
+        with self._verrou:
+            for symbole in symboles:
+                if not self.fournisseur.couvre(symbole):
+                    continue
+                futur = self._en_vol.get(symbole)
+                if futur is None:
+                    futur = Future()
+                    connue = self.cotations.get(symbole)
+                    if connue is not None and maintenant - connue[1] < self.fraicheur:
+                        futur.set_result(connue)
+                    else:
+                        self._en_vol[symbole] = futur
+                        self._attente.append(symbole)
+                futurs[symbole] = futur
+        if self._attente:
+            self._signal.set()
+        return futurs
+
+    def _lot(self, symboles):
+        """Un appel au fournisseur pour un lot de symboles (dans un thread du pool)"""
+        cotations, erreur = {}, None
+        try:
+            # Le débit est limité par le fournisseur, à chaque requête HTTP qu'il envoie
+            self.appels += 1
+            cotations = self.fournisseur.coter(symboles)
+            if cotations:
+                with self._verrou:
+                    self.cotations.update(cotations)
+                self.appliquer(cotations)
+        except Exception as e:
+            erreur = e
+            logger.warning("Cotations %s impossibles : %s", self.fournisseur.nom, e)
+        with self._verrou:
+            futurs = [self._en_vol.pop(s, None) for s in symboles]
+        for symbole, futur in zip(symboles, futurs):
+            if futur is None:
+                continue
+            if erreur is not None:
+                futur.set_exception(erreur)
+            else:
+                futur.set_result(cotations.get(symbole))
+
+    def _envoyer(self):
+        self._signal.clear()
+        with self._verrou:
+            attente, self._attente = self._attente, []
+        taille = self.fournisseur.lot_cotations
+        for i in range(0, len(attente), taille):
+            self._executeur.submit(self._lot, attente[i:i + taille])
+
+    def demarrer(self):
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self._arret.clear()
+        self._thread = threading.Thread(target=self._boucle, name="sondeur-cotations", daemon=True)
+        self._thread.start()
+        return True
+
+    def arreter(self, attente=None):
+        self._arret.set()
+        self._signal.set()
+        if self._thread is not None:
+            self._thread.join(attente)
+
+    def _boucle(self):
+        prochain = time.monotonic()
+        while not self._arret.is_set():
+            if time.monotonic() >= prochain:
+                prochain += self.intervalle
+                if self.actif():
+                    self.demander(self.symboles)
+            self._signal.wait(max(0.0, prochain - time.monotonic()))
+            if self._arret.is_set():
+                break
+            if self._signal.is_set():
+                # Laisse les demandes concurrentes s'accumuler pour les envoyer ensemble
+                time.sleep(self.regroupement)
+                self._envoyer()
@@ -1,13 +1,35 @@
 import os
 from dotenv import load_dotenv
-import pandas as pd
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
+import threading
+import time
+import contextvars
+import logging
+from functools import wraps
+from collections import deque, namedtuple
+from contextlib import contextmanager
 import numpy as np
+from catalogue import CATALOGUE
+from tampon_ticks import TamponTicks, allouer_local
+from indicateurs import FENETRE_MAX, MoteurIndicateurs, calculer_indicateurs
+from metriques import chronometrer, octets
+from correlations import LAMBDA_EWMA, MoteurCovariance, correlation, covariance_fenetre, extraire, ordre_clusters
+from echantillonnage import lttb
+import monte_carlo
+from aleatoire import FluxAleatoires, generateur
+from planificateur import PlanificateurTicks
+from etat_partage import MAGIC, SegmentPartage
+from stockage_barres import REPERTOIRE_HISTORIQUE, AgregateurBarres, StockageBarres
+from fournisseurs import FOURNISSEURS, Remplissage
+from cotations import SondeurCotations
 
 # Chargement configuration
 load_dotenv()
 ALPHA_VANTAGE_API_KEY = os.getenv('ALPHA_VANTAGE_API_KEY', '')
+# Nombre de ticks conservés par instrument (au moins la plus longue fenêtre d'indicateur)
+HISTORIQUE_PROFONDEUR = max(int(os.getenv('HISTORIQUE_PROFONDEUR', 10000)), FENETRE_MAX + 1)
+# Ticks simulés au démarrage pour que les indicateurs soient disponibles immédiatement
+PRECHAUFFAGE_TICKS = int(os.getenv('PRECHAUFFAGE_TICKS', FENETRE_MAX))
 
 # Prix de base réalistes par catégorie
 PRIX_BASE_CATEGORIE = {
@@ -20,268 +42,967 @@ PRIX_BASE_CATEGORIE = {
     "gaz industriel": {"min": 1000, "max": 2000, "vol": 0.03, "choc": 0.15}
 }
 
-# Stockage persistant en mémoire
-_data_store = {}
+# Bornes de la tendance journalière
+TENDANCE_MAX = 0.02
+PROFIL_DEFAUT = {"vol": 0.03, "choc": 0.15}
+# Bornes du bruit appliqué aux variations jour / semaine / mois / année
+FACTEURS_VARIATION_MIN = np.array([0.8, 0.6, 0.4, 0.2])
+FACTEURS_VARIATION_MAX = np.array([1.2, 1.4, 1.6, 2.0])
+
+class MoteurPrix:
+    """Moteur de prix vectorisé : un tableau contigu par champ pour tout l'univers"""
+
+    # cotation : horodatage de la dernière cotation réelle de la ligne (0 : prix simulé)
+    CHAMPS = ("prix_base", "dernier_prix", "tendance", "volatilite", "choc", "cotation")
+
+    def __init__(self, capacite=128, profondeur=HISTORIQUE_PROFONDEUR, allocateur=None):
+        self.index = {}
+        self.symboles = []
+        self.categories = []
+        alloue = allocateur or allouer_local
+        self.partage = allocateur is not None
+        for champ, forme, dtype in self.disposition(capacite, 0)[:len(self.CHAMPS) + 1]:
+            setattr(self, champ, alloue(champ, forme, dtype))
+        self.historique = TamponTicks(profondeur, capacite, allocateur=allocateur)
+        self.indicateurs = MoteurIndicateurs(self.historique, capacite, allocateur=allocateur)
+        self.covariance = MoteurCovariance(capacite, allocateur=allocateur)
+        # Par tick : bruit de prix, bruit de tendance, 4 facteurs de variation, volume
+        self.flux = FluxAleatoires(7, capacite)
+
+    @classmethod
+    def disposition(cls, capacite, profondeur=HISTORIQUE_PROFONDEUR):
+        """Champs (nom, forme, dtype) du moteur et de son historique, pour un segment partagé"""
+        return (
+            [(champ, (capacite,), np.float64) for champ in cls.CHAMPS]
+            + [("facteurs", (capacite, 4), np.float64)]
+            + TamponTicks.disposition(capacite, profondeur)
+            + MoteurIndicateurs.disposition(capacite)
+            + MoteurCovariance.disposition(capacite)
+        )
+
+    def __len__(self):
+        return len(self.symboles)
+
+    def _agrandir(self):
+        """Double la capacité des tableaux (amorti O(1) par instrument)"""
+        if self.partage:
+            raise RuntimeError("Capacité du segment partagé atteinte (voir ETAT_PARTAGE_CAPACITE)")
+        for champ in self.CHAMPS:
+            ancien = getattr(self, champ)
+            nouveau = np.zeros(max(1, len(ancien)) * 2)
+            nouveau[:len(ancien)] = ancien
+            setattr(self, champ, nouveau)
+        facteurs = np.ones((len(self.prix_base), 4))
+        facteurs[:len(self.facteurs)] = self.facteurs
+        self.facteurs = facteurs
+        self.historique.redimensionner(len(self.prix_base))
+        self.indicateurs.redimensionner(len(self.prix_base))
+        self.covariance.redimensionner(len(self.prix_base))
+        self.flux.redimensionner(len(self.prix_base))
+
+    def enregistrer(self, symbole, categorie, initialiser=True):
+        """Ajoute un instrument et retourne sa ligne
+
+        Avec initialiser=False, la ligne est seulement indexée : ses valeurs
+        sont déjà présentes (segment partagé écrit par un autre processus).
+        """
+        ligne = len(self.symboles)
+        if ligne == len(self.prix_base):
+            self._agrandir()
+        self.flux.ajouter(symbole)
+        self.index[symbole] = ligne
+        self.symboles.append(symbole)
+        self.categories.append(categorie)
+        if not initialiser:
+            return ligne
+
+        profile = PRIX_BASE_CATEGORIE.get(categorie, PROFIL_DEFAUT)
+
+        # Prix de base et tendance initiale stables, tirés du flux propre au symbole
+        gen = generateur(symbole, "base")
+        prix = gen.uniform(profile.get("min", 100), profile.get("max", 500))
+        tendance = gen.uniform(-0.002, 0.002)
+
+        self.prix_base[ligne] = prix
+        self.dernier_prix[ligne] = prix
+        self.tendance[ligne] = tendance
+        self.volatilite[ligne] = profile["vol"]
+        self.choc[ligne] = profile["choc"]
+        self.facteurs[ligne] = 1
+        self.cotation[ligne] = 0
+        self.historique.compteurs[ligne] = 0
+        self.indicateurs.initialiser([ligne])
+        self.covariance.initialiser([ligne])
+        return ligne
+
+    def avancer(self, lignes=None):
+        """Fait avancer d'un pas les lignes données (tout l'univers par défaut)"""
+        if lignes is None:
+            lignes = np.arange(len(self.symboles))
+        else:
+            lignes = np.asarray(lignes, dtype=np.intp)
+
+        tirages = self.flux.tirer(lignes)
+        vol = self.volatilite[lignes]
+        variation = self.tendance[lignes] + vol * (2 * tirages[:, 0] - 1)
+        self.dernier_prix[lignes] *= 1 + variation
+        self.tendance[lignes] = np.clip(
+            self.tendance[lignes] + 0.001 * (2 * tirages[:, 1] - 1),
+            -TENDANCE_MAX, TENDANCE_MAX
+        )
+        self.facteurs[lignes] = FACTEURS_VARIATION_MIN + (FACTEURS_VARIATION_MAX - FACTEURS_VARIATION_MIN) * tirages[:, 2:6]
+
+        self.historique.ajouter(lignes, time.time(), self.dernier_prix[lignes], variation)
+        self.indicateurs.mettre_a_jour(lignes, tirages[:, 6])
+        self.covariance.mettre_a_jour(lignes, variation)
+        return self.dernier_prix[lignes]
+
+    def observer(self, lignes, prix, horodatage):
+        """Intègre des prix réels à la place d'un pas simulé pour les lignes données
+
+        À la première cotation d'une ligne, son historique simulé est remis à l'échelle
+        du prix réel (les rendements sont inchangés) et ses indicateurs recalculés.
+        """
+        lignes = np.asarray(lignes, dtype=np.intp)
+        prix = np.asarray(prix, dtype=np.float64)
+        premiere = self.cotation[lignes] == 0
+        if premiere.any():
+            nouvelles = lignes[premiere]
+            echelle = prix[premiere] / self.dernier_prix[nouvelles]
+            self.historique.prix[nouvelles] *= echelle[:, None]
+            self.prix_base[nouvelles] *= echelle
+            self.dernier_prix[nouvelles] = prix[premiere]
+            self.indicateurs.recaler(nouvelles)
+
+        variation = prix / self.dernier_prix[lignes] - 1
+        tirages = self.flux.tirer(lignes)
+        self.dernier_prix[lignes] = prix
+        self.cotation[lignes] = horodatage
+        self.facteurs[lignes] = FACTEURS_VARIATION_MIN + (FACTEURS_VARIATION_MAX - FACTEURS_VARIATION_MIN) * tirages[:, 2:6]
+        self.historique.ajouter(lignes, horodatage, prix, variation)
+        self.indicateurs.mettre_a_jour(lignes, tirages[:, 6])
+        self.covariance.mettre_a_jour(lignes, variation)
+
+Instantane = namedtuple("Instantane", [
+    "version", "horodatage", "index", "categories",
+    "prix", "prix_base", "tendance", "volatilite", "choc", "facteurs", "indicateurs", "covariance"
+])
+
+def _figer(tableau):
+    """Copie en lecture seule d'un tableau du moteur"""
+    copie = tableau.copy()
+    copie.flags.writeable = False
+    return copie
+
+# Stockage persistant en mémoire, ou partagé entre workers (ETAT_PARTAGE=fichier ou shm)
+ETAT_PARTAGE = os.getenv('ETAT_PARTAGE', '')
+_segment = None
+if ETAT_PARTAGE:
+    _capacite = max(len(CATALOGUE), int(os.getenv('ETAT_PARTAGE_CAPACITE', 0)))
+    _segment = SegmentPartage(
+        os.getenv('ETAT_PARTAGE_NOM', 'matieres-premieres'),
+        MoteurPrix.disposition(_capacite),
+        backend=ETAT_PARTAGE
+    )
+    _moteur = MoteurPrix(capacite=_capacite, allocateur=_segment.allocateur)
+else:
+    _moteur = MoteurPrix(capacite=len(CATALOGUE))
+# Un seul écrivain à la fois ; les lecteurs ne lisent que l'instantané publié
+_verrou_moteur = threading.Lock()
+_instantane = None
+_sequence_lue = None
+# Derniers instantanés publiés, pour les réponses différentielles (?since=)
+INSTANTANES_CONSERVES = int(os.getenv('INSTANTANES_CONSERVES', 120))
+_instantanes_recents = deque(maxlen=INSTANTANES_CONSERVES)
+
+def _ecrivain():
+    """Vrai si ce processus peut modifier le moteur (toujours vrai sans état partagé)"""
+    return _segment is None or _segment.tenter_ecriture()
+
+@contextmanager
+def _ecriture():
+    """Encadre une modification du moteur (verrou de séquence et version en mode partagé)"""
+    if _segment is None:
+        yield
+        return
+    with _segment.ecriture():
+        yield
+        _segment.fixer("version", _segment.champ("version") + 1)
+
+def _copier_etat(version):
+    """Instantané immuable de l'état courant du moteur"""
+    n = len(_moteur)
+    return Instantane(
+        version=version,
+        horodatage=time.time(),
+        index=dict(_moteur.index),
+        categories=tuple(_moteur.categories),
+        prix=_figer(_moteur.dernier_prix[:n]),
+        prix_base=_figer(_moteur.prix_base[:n]),
+        tendance=_figer(_moteur.tendance[:n]),
+        volatilite=_figer(_moteur.volatilite[:n]),
+        choc=_figer(_moteur.choc[:n]),
+        facteurs=_figer(_moteur.facteurs[:n]),
+        indicateurs={nom: _figer(valeurs) for nom, valeurs in _moteur.indicateurs.lire(slice(0, n)).items()},
+        covariance=_figer(_moteur.covariance.lire(slice(0, min(n, _moteur.covariance.suivies))))
+    )
+
+def _publier():
+    """Publie un instantané immuable de l'état du moteur (appelé sous _verrou_moteur)"""
+    global _instantane
+    if _segment is not None:
+        version = _segment.champ("version")
+    else:
+        version = 0 if _instantane is None else _instantane.version + 1
+    _instantane = _copier_etat(version)
+    _instantanes_recents.append(_instantane)
+    return _instantane
+
+def _rafraichir():
+    """Côté lecteur : recopie l'état partagé si l'écrivain a publié depuis la dernière lecture"""
+    global _instantane, _sequence_lue
+    if _instantane is not None and _segment.champ("sequence") == _sequence_lue:
+        return _instantane
+    _sequence_lue, _instantane = _segment.lire(lambda: _copier_etat(_segment.champ("version")))
+    _instantanes_recents.append(_instantane)
+    return _instantane
+
+def _dernier_instantane():
+    if _segment is not None and not _segment.ecrivain:
+        return _rafraichir()
+    return _instantane
+
+# Contexte de calcul d'une requête : instantané figé et résultats mémoïsés
+_contexte = contextvars.ContextVar("contexte_calcul", default=None)
+
+@contextmanager
+def contexte_calcul():
+    """Fige l'instantané et mémoïse les calculs le temps d'une requête (gestionnaire ou décorateur)
+
+    Les fonctions composées (analyse, prédictions) lisent alors toutes le même
+    instantané et chaque calcul n'est fait qu'une fois par jeu de paramètres.
+    """
+    if _contexte.get() is not None:
+        yield _contexte.get()
+        return
+    jeton = _contexte.set({"etat": None, "resultats": {}})
+    try:
+        yield _contexte.get()
+    finally:
+        _contexte.reset(jeton)
+
+def _memoise(fonction):
+    """Mémoïse le résultat par paramètres dans le contexte de calcul courant (sans effet hors contexte)"""
+    @wraps(fonction)
+    def enveloppe(*args, **kwargs):
+        contexte = _contexte.get()
+        if contexte is None:
+            return fonction(*args, **kwargs)
+        cle = (fonction.__name__, args, tuple(sorted(kwargs.items())))
+        if cle not in contexte["resultats"]:
+            contexte["resultats"][cle] = fonction(*args, **kwargs)
+        return contexte["resultats"][cle]
+    return enveloppe
+
+def instantane():
+    """Dernier instantané publié des prix de tout l'univers (figé dans un contexte de calcul)"""
+    contexte = _contexte.get()
+    if contexte is None:
+        return _dernier_instantane()
+    if contexte["etat"] is None:
+        contexte["etat"] = _dernier_instantane()
+    return contexte["etat"]
+
+def _lire_moteur(lecture):
+    """Appelle lecture() sur un état cohérent du moteur (verrou d'écriture ou verrou de séquence)"""
+    if _segment is not None and not _segment.ecrivain:
+        return _segment.lire(lecture)[1]
+    with _verrou_moteur:
+        return lecture()
+
+def instantane_version(version):
+    """Instantané récent de la version donnée, ou None s'il n'est plus (ou pas) conservé"""
+    for etat in reversed(_instantanes_recents):
+        if etat.version == version:
+            return etat
+    return None
+
+# Une ligne cotée en direct n'est plus simulée, sauf si sa dernière cotation est plus vieille que ce délai
+COTATIONS_PEREMPTION = float(os.getenv('COTATIONS_PEREMPTION', 300))
+
+@chronometrer
+def avancer_univers():
+    """Fait avancer d'un tick les instruments sans cotation récente et publie le nouvel instantané"""
+    with _verrou_moteur:
+        if not _ecrivain():
+            return _rafraichir()
+        simulees = np.flatnonzero(time.time() - _moteur.cotation[:len(_moteur)] > COTATIONS_PEREMPTION)
+        with _ecriture():
+            if len(simulees):
+                _moteur.avancer(simulees)
+        return _publier()
+
+def appliquer_cotations(cotations):
+    """Intègre des cotations réelles {symbole: (prix, horodatage)} et publie un instantané"""
+    with _verrou_moteur:
+        if not _ecrivain():
+            return None
+        cotations = {s: c for s, c in cotations.items() if s in _moteur.index and c[0] > 0}
+        if not cotations:
+            return None
+        with _ecriture():
+            _moteur.observer([_moteur.index[s] for s in cotations], [c[0] for c in cotations.values()], time.time())
+        return _publier()
+
+_planificateur = PlanificateurTicks(avancer_univers)
+
+# Barres OHLCV persistées sur disque à partir des ticks (écrites par le seul processus écrivain)
+logger = logging.getLogger(__name__)
+_stockage = StockageBarres(os.path.join(REPERTOIRE_HISTORIQUE, 'simulation'))
+_agregateur = AgregateurBarres(_stockage) if os.getenv('BARRES_PERSISTANTES', '1') != '0' else None
+
+def _enregistrer_barres(etat):
+    if _agregateur is None or (_segment is not None and not _segment.ecrivain):
+        return
+    try:
+        _agregateur.ajouter(_moteur.symboles, etat.horodatage, etat.prix, etat.indicateurs["volume"])
+    except OSError:
+        logger.exception("Écriture des barres impossible")
+
+_planificateur.abonner(_enregistrer_barres)
+
+# Barres réelles téléchargées (FOURNISSEUR_DONNEES=yahoo par défaut, vide pour n'utiliser que le simulateur)
+FOURNISSEUR_DONNEES = os.getenv('FOURNISSEUR_DONNEES', 'yahoo')
+_stockage_marche = StockageBarres(os.path.join(REPERTOIRE_HISTORIQUE, FOURNISSEUR_DONNEES or 'aucun'))
+_remplissage = None
+_sondeur = None
+_fournisseur = None
+
+def _fournisseur_donnees():
+    """Instance unique du fournisseur (sa session et son limiteur de débit sont partagés)"""
+    global _fournisseur
+    if _fournisseur is None:
+        _fournisseur = FOURNISSEURS[FOURNISSEUR_DONNEES]()
+    return _fournisseur
+
+def _stockage_pour(symbole, resolution):
+    """Stockage des barres réelles s'il en a pour ce symbole, sinon celui du simulateur"""
+    if FOURNISSEUR_DONNEES and _stockage_marche.taille(symbole, resolution):
+        return _stockage_marche
+    return _stockage
+
+def demarrer_remplissage():
+    """Démarre le téléchargement de l'historique réel en arrière-plan (sans attendre le réseau)"""
+    global _remplissage
+    if not FOURNISSEUR_DONNEES:
+        return False
+    if _remplissage is None:
+        _remplissage = Remplissage(_stockage_marche, _fournisseur_donnees(), [m['symbole'] for m in CATALOGUE])
+    return _remplissage.demarrer()
+
+def demarrer_cotations():
+    """Mode direct : les prix des symboles couverts suivent les cotations du fournisseur"""
+    global _sondeur
+    if not FOURNISSEUR_DONNEES:
+        return False
+    if _sondeur is None:
+        _sondeur = SondeurCotations(
+            _fournisseur_donnees(), [m['symbole'] for m in CATALOGUE], appliquer_cotations,
+            actif=lambda: _segment is None or _segment.ecrivain
+        )
+    return _sondeur.demarrer()
+
+def _demander_cotations(matieres):
+    """Relance sans attendre la cotation des matières demandées (une requête en vol par symbole)"""
+    if _sondeur is not None and _sondeur.actif():
+        _sondeur.demander([m['symbole'] for m in matieres])
+
+def statistiques_stockage():
+    """Taille de l'univers et empreinte mémoire (octets) du moteur, des instantanés et des barres"""
+    n_barres, octets_barres = _stockage.empreinte()
+    n_marche, octets_marche = _stockage_marche.empreinte()
+    instantanes = list(_instantanes_recents)
+    return {
+        "instruments": len(_moteur),
+        "capacite": len(_moteur.prix_base),
+        "octets": {
+            "prix": octets(_moteur),
+            "historique": octets(_moteur.historique),
+            "indicateurs": octets(_moteur.indicateurs),
+            "covariance": octets(_moteur.covariance),
+            "aleatoire": octets(_moteur.flux),
+            "instantanes": sum(
+                sum(v.nbytes for v in etat if isinstance(v, np.ndarray))
+                + sum(v.nbytes for v in etat.indicateurs.values())
+                for etat in instantanes
+            ),
+        },
+        "instantanes": len(instantanes),
+        "fichiers_barres": n_barres + n_marche,
+        "octets_barres": octets_barres + octets_marche,
+    }
+
+def demarrer_planificateur():
+    """Démarre les ticks en arrière-plan ; les requêtes ne font plus que lire l'instantané"""
+    return _planificateur.demarrer()
+
+def abonner_ticks(rappel):
+    """Appelle `rappel(instantane)` après chaque tick du planificateur (dans son thread)"""
+    _planificateur.abonner(rappel)
 
 def get_prix_base(symbole, nom, categorie):
     """Génère un prix de base stable pour une matière"""
-    import hashlib
-    seed = int(hashlib.md5(symbole.encode()).hexdigest()[:8], 16)
-    random.seed(seed)
-    
-    if categorie in PRIX_BASE_CATEGORIE:
-        base = PRIX_BASE_CATEGORIE[categorie]
-        prix = random.uniform(base["min"], base["max"])
-    else:
-        prix = random.uniform(100, 500)
-    
-    if symbole not in _data_store:
-        _data_store[symbole] = {
-            "prix_base": prix,
-            "dernier_prix": prix,
-            "tendance": random.uniform(-0.002, 0.002),
-            "historique": []
-        }
-    
-    return _data_store[symbole]["prix_base"]
+    if symbole in _moteur.index:
+        return _moteur.prix_base[_moteur.index[symbole]]
+
+    with _verrou_moteur:
+        if symbole not in _moteur.index:
+            if not _ecrivain():
+                raise RuntimeError(f"Matière {symbole} absente de l'état partagé")
+            with _ecriture():
+                _moteur.enregistrer(symbole, categorie)
+                if _segment is not None:
+                    _segment.fixer("lignes", len(_moteur))
+            _publier()
+    return _moteur.prix_base[_moteur.index[symbole]]
+
+def _ligne(symbole, nom, categorie):
+    """Ligne du moteur pour un symbole (enregistré à la première utilisation)"""
+    if symbole not in _moteur.index:
+        get_prix_base(symbole, nom, categorie)
+    return _moteur.index[symbole]
 
+@chronometrer
 def generer_prix_actuel(symbole, nom, categorie):
     """Génère un prix actuel réaliste avec tendance"""
-    if symbole not in _data_store:
-        prix_base = get_prix_base(symbole, nom, categorie)
-    
-    store = _data_store[symbole]
-    volatilite = PRIX_BASE_CATEGORIE.get(categorie, {"vol": 0.03})["vol"]
-    
-    variation = store["tendance"] + random.uniform(-volatilite, volatilite)
-    nouveau_prix = store["dernier_prix"] * (1 + variation)
-    
-    store["dernier_prix"] = nouveau_prix
-    store["tendance"] += random.uniform(-0.001, 0.001)
-    store["tendance"] = max(-0.02, min(0.02, store["tendance"]))
-    
-    store["historique"].append({
-        "timestamp": datetime.now(),
-        "prix": nouveau_prix,
-        "variation": variation
-    })
-    
-    if len(store["historique"]) > 100:
-        store["historique"] = store["historique"][-100:]
-    
-    return round(nouveau_prix, 2)
+    ligne = _ligne(symbole, nom, categorie)
+    with _verrou_moteur:
+        if not _ecrivain():
+            raise RuntimeError("Seul le processus écrivain fait avancer les prix")
+        with _ecriture():
+            _moteur.avancer([ligne])
+        _publier()
+    return round(float(_moteur.dernier_prix[ligne]), 2)
+
+def _initialiser_segment():
+    """Initialise le segment partagé s'il est vide ou d'une autre configuration"""
+    attendu = (len(CATALOGUE), len(_moteur.prix_base), _moteur.historique.profondeur)
+    def compatible():
+        return _segment.initialise and (
+            _segment.champ("lignes"), _segment.champ("capacite"), _segment.champ("profondeur")
+        ) == attendu
+
+    if not compatible() and _segment.tenter_ecriture():
+        try:
+            if not compatible():
+                with _segment.ecriture():
+                    _segment.fixer("magic", 0)
+                    for m in CATALOGUE:
+                        _moteur.enregistrer(m['symbole'], m['categorie'])
+                    for _ in range(PRECHAUFFAGE_TICKS):
+                        _moteur.avancer()
+                    for nom, valeur in zip(("lignes", "capacite", "profondeur"), attendu):
+                        _segment.fixer(nom, valeur)
+                    _segment.fixer("magic", MAGIC)
+                return
+        finally:
+            # L'écrivain permanent est élu au premier tick, après un éventuel fork
+            _segment.liberer()
+
+    for m in CATALOGUE:
+        _moteur.enregistrer(m['symbole'], m['categorie'], initialiser=False)
+    limite = time.monotonic() + 10
+    while not compatible() and time.monotonic() < limite:
+        time.sleep(0.05)
+
+def _enregistrer_catalogue():
+    """Enregistre tout le catalogue pour que l'instantané couvre l'univers dès le démarrage"""
+    with _verrou_moteur:
+        if _segment is not None:
+            _initialiser_segment()
+            _rafraichir()
+            return
+        for m in CATALOGUE:
+            if m['symbole'] not in _moteur.index:
+                _moteur.enregistrer(m['symbole'], m['categorie'])
+        for _ in range(PRECHAUFFAGE_TICKS):
+            _moteur.avancer()
+        _publier()
 
+_enregistrer_catalogue()
+
+def _construire_prix(etat, lignes):
+    """Construit les charges utiles de prix pour plusieurs lignes d'un instantané en une passe vectorisée"""
+    prix_actuel = etat.prix[lignes]
+    prix_base = etat.prix_base[lignes]
+    tendance = etat.tendance[lignes]
+    vol = etat.volatilite[lignes]
+    choc = etat.choc[lignes]
+    variation_base = (prix_actuel - prix_base) / prix_base * 100
+
+    variations = np.round(variation_base[:, None] * etat.facteurs[lignes], 2).tolist()
+
+    continuation_1j = np.round(prix_actuel * (1 + tendance), 2).tolist()
+    range_bas = np.round(prix_actuel * (1 - vol), 2).tolist()
+    range_haut = np.round(prix_actuel * (1 + vol), 2).tolist()
+    continuation_7j = np.round(prix_actuel * (1 + tendance * 7), 2).tolist()
+    choc_positif = np.round(prix_actuel * (1 + choc), 2).tolist()
+    choc_negatif = np.round(prix_actuel * (1 - choc), 2).tolist()
+    force = (np.abs(tendance) * 100).tolist()
+    volatilite = (vol * 100).tolist()
+
+    derniere_maj = date_instantane(etat)
+    resultats = []
+    for k, ligne in enumerate(lignes):
+        t = float(tendance[k])
+        resultats.append({
+            "prix_actuel": round(float(prix_actuel[k]), 2),
+            "variation_jour": variations[k][0],
+            "variation_semaine": variations[k][1],
+            "variation_mois": variations[k][2],
+            "variation_annee": variations[k][3],
+            "derniere_maj": derniere_maj,
+            "predictions": {
+                "horizon_1j": {
+                    "continuation": continuation_1j[k],
+                    "range": [range_bas[k], range_haut[k]]
+                },
+                "horizon_7j": {
+                    "continuation": continuation_7j[k],
+                    "choc_positif": choc_positif[k],
+                    "choc_negatif": choc_negatif[k]
+                },
+                "tendance_force": force[k],
+                "tendance_direction": "HAUSSE" if t > 0 else "BAISSE",
+                "volatilite": volatilite[k]
+            },
+            "analyse": {
+                "categorie": etat.categories[ligne],
+                "risque": "ÉLEVÉ" if vol[k] > 0.04 else "MODÉRÉ",
+                "potentiel": "FORT" if abs(t) > 0.001 else "FAIBLE"
+            }
+        })
+    return resultats
+
+def _lignes_instantane(matieres):
+    """Instantané courant et lignes des matières données (enregistrées si besoin)"""
+    etat = instantane()
+    if any(m['symbole'] not in etat.index for m in matieres):
+        for m in matieres:
+            _ligne(m['symbole'], m['nom'], m['categorie'])
+        etat = _dernier_instantane()
+        if _contexte.get() is not None:
+            _contexte.get()["etat"] = etat
+    return etat, [etat.index[m['symbole']] for m in matieres]
+
+@_memoise
 def get_prix_matiere(symbole):
-    """Retourne les données de prix pour une matière + prédictions"""
-    from app import MATIERES_PREMIERES
-    
-    matiere = next((m for m in MATIERES_PREMIERES if m['symbole'] == symbole), None)
+    """Retourne les données de prix pour une matière + prédictions (lecture seule de l'instantané)"""
+    matiere = CATALOGUE.par_symbole(symbole)
     if not matiere:
         return {"error": f"Matière {symbole} non trouvée"}
     
-    nom = matiere['nom']
-    categorie = matiere['categorie']
+    _demander_cotations([matiere])
+    etat, lignes = _lignes_instantane([matiere])
+    return _construire_prix(etat, lignes)[0]
+
+def get_prix_matieres(matieres):
+    """Retourne les prix de toutes les matières données, lus en une passe vectorisée sur l'instantané"""
+    if not matieres:
+        return []
+    _demander_cotations(matieres)
+    etat, lignes = _lignes_instantane(matieres)
+    return _construire_prix(etat, lignes)
+
+# Clés de tri des listes lues dans l'instantané (mêmes valeurs arrondies que les charges utiles)
+CLES_TRI_PRIX = (
+    "prix_actuel", "variation_jour", "variation_semaine", "variation_mois", "variation_annee",
+    "tendance", "tendance_force", "volatilite"
+)
+# (version, clés) du dernier instantané trié : calculées une fois par version, pour toutes les lignes
+_cles_tri = (None, None)
+# Ligne de chaque matière du catalogue (par position) ; une ligne ne change jamais de place,
+# le tableau n'est refait que si le catalogue grandit
+_lignes_catalogue = np.empty(0, dtype=np.intp)
+
+def _cles_tri_instantane(etat):
+    """Clés de tri de chaque ligne de l'instantané, calculées une seule fois par version"""
+    global _cles_tri
+    version, cles = _cles_tri
+    if version == etat.version and len(cles["prix_actuel"]) == len(etat.prix):
+        return cles
+    variation_base = (etat.prix - etat.prix_base) / etat.prix_base * 100
+    variations = np.round(variation_base[:, None] * etat.facteurs, 2)
+    cles = {
+        "prix_actuel": np.round(etat.prix, 2),
+        "variation_jour": variations[:, 0],
+        "variation_semaine": variations[:, 1],
+        "variation_mois": variations[:, 2],
+        "variation_annee": variations[:, 3],
+        "tendance": etat.tendance,
+        "tendance_force": np.abs(etat.tendance) * 100,
+        "volatilite": etat.volatilite * 100,
+    }
+    _cles_tri = (etat.version, cles)
+    return cles
+
+def cles_tri(matieres, tri=None):
+    """Clé de tri numérique de chaque matière donnée (tableau NumPy)
+
+    Sans tri, la position dans la liste ; un champ du catalogue donne son rang
+    précalculé, un champ de prix sa valeur dans l'instantané courant.
+    """
+    if tri is None:
+        return np.arange(len(matieres), dtype=np.float64)
+    if tri in CLES_TRI_PRIX:
+        global _lignes_catalogue
+        if len(_lignes_catalogue) != len(CATALOGUE):
+            _, lignes = _lignes_instantane(CATALOGUE.matieres)
+            _lignes_catalogue = np.asarray(lignes, dtype=np.intp)
+        lignes = _lignes_catalogue[CATALOGUE.positions(matieres)]
+        return _cles_tri_instantane(instantane())[tri][lignes]
+    return CATALOGUE.cle_tri(tri)[CATALOGUE.positions(matieres)]
+
+def date_instantane(etat):
+    """Date de l'instantané, telle que dans le champ derniere_maj des prix"""
+    return datetime.fromtimestamp(etat.horodatage).strftime("%Y-%m-%d %H:%M:%S")
+
+# Champs qui changent à chaque instantané, exclus des différences (renvoyés une fois par réponse)
+CHAMPS_INSTANTANE = ("derniere_maj",)
+
+def _difference(avant, apres, ignores=()):
+    """Champs de `apres` qui diffèrent de `avant` (récursif sur les dictionnaires), hors `ignores`"""
+    modifie = {}
+    for cle, valeur in apres.items():
+        if cle in ignores:
+            continue
+        ancienne = avant.get(cle)
+        if isinstance(valeur, dict) and isinstance(ancienne, dict):
+            sous = _difference(ancienne, valeur)
+            if sous:
+                modifie[cle] = sous
+        elif valeur != ancienne:
+            modifie[cle] = valeur
+    return modifie
+
+def get_modifications_prix(matieres, depuis):
+    """Prix modifiés depuis la version `depuis` : (instantané courant, liste ou None)
+
+    La liste ne contient que les matières et les champs qui ont changé, hors CHAMPS_INSTANTANE
+    (la date de l'instantané est donnée par date_instantane) ; elle vaut None si l'instantané
+    `depuis` n'est plus conservé (le client doit tout recharger).
+    """
+    etat, lignes = _lignes_instantane(matieres)
+    if depuis == etat.version or not lignes:
+        return etat, []
+    ancien = instantane_version(depuis)
+    if ancien is None:
+        return etat, None
     
-    prix_actuel = generer_prix_actuel(symbole, nom, categorie)
-    prix_base = _data_store[symbole]["prix_base"]
-    variation_base = (prix_actuel - prix_base) / prix_base * 100
+    # Lignes enregistrées après l'ancien instantané : tout est nouveau pour elles
+    connues = [i for i, ligne in enumerate(lignes) if ligne < len(ancien.categories)]
+    avant = dict(zip(connues, _construire_prix(ancien, [lignes[i] for i in connues]))) if connues else {}
+    modifications = []
+    for i, (matiere, data) in enumerate(zip(matieres, _construire_prix(etat, lignes))):
+        modifie = _difference(avant.get(i, {}), data, CHAMPS_INSTANTANE)
+        if modifie:
+            modifications.append({"id": matiere['id'], "data": modifie})
+    return etat, modifications
+
+# Fenêtre maximale (ticks) de l'estimation glissante des corrélations
+FENETRE_CORRELATION_MAX = 5000
+
+def _rendements_alignes(lignes, fenetre):
+    """Matrice N x T des `fenetre` derniers rendements des lignes (T réduit à l'historique commun)"""
+    def lecture():
+        historique = _moteur.historique
+        compteurs = historique.compteurs[lignes]
+        t = int(min(fenetre, historique.profondeur, compteurs.min()))
+        positions = (compteurs[:, None] - t + np.arange(t)) % historique.profondeur
+        return historique.rendements[np.asarray(lignes)[:, None], positions]
+    return _lire_moteur(lecture)
+
+@_memoise
+def get_correlations(ids, fenetre=None, mesure='correlation', clusters=False):
+    """Matrice de corrélation (ou de covariance) des rendements des matières données
+
+    Sans fenêtre : estimation exponentielle tenue à jour à chaque tick (lue dans l'instantané),
+    pour les CORRELATION_LIGNES_MAX premières lignes seulement ; au-delà, 'tronque' vaut vrai,
+    'non_suivis' liste les ids concernés (valeurs nulles) et une fenêtre donne la matrice complète.
+    Avec une fenêtre de n ticks : un produit matriciel sur les n derniers rendements alignés.
+    """
+    matieres = [CATALOGUE.par_id(i) for i in ids]
+    matieres = [m for m in matieres if m]
+    if not matieres:
+        return {'error': 'Aucune matière sélectionnée'}
     
-    # CALCUL DES PRÉDICTIONS SIMPLES
-    tendance = _data_store[symbole]["tendance"]
-    profile = PRIX_BASE_CATEGORIE.get(categorie, {"vol": 0.03, "choc": 0.15})
+    etat, lignes = _lignes_instantane(matieres)
+    if fenetre:
+        rendements = _rendements_alignes(lignes, min(int(fenetre), FENETRE_CORRELATION_MAX))
+        covariance = covariance_fenetre(rendements)
+        methode = {'methode': 'fenetre', 'fenetre': int(rendements.shape[1])}
+    else:
+        covariance = extraire(etat.covariance, lignes)
+        non_suivis = [m['id'] for m, ligne in zip(matieres, lignes) if ligne >= len(etat.covariance)]
+        methode = {'methode': 'ewma', 'lambda': LAMBDA_EWMA, 'tronque': bool(non_suivis)}
+        if non_suivis:
+            methode['non_suivis'] = non_suivis
     
-    predictions = {
-        "horizon_1j": {
-            "continuation": round(prix_actuel * (1 + tendance), 2),
-            "range": [
-                round(prix_actuel * (1 - profile["vol"]), 2),
-                round(prix_actuel * (1 + profile["vol"]), 2)
-            ]
-        },
-        "horizon_7j": {
-            "continuation": round(prix_actuel * (1 + tendance * 7), 2),
-            "choc_positif": round(prix_actuel * (1 + profile["choc"]), 2),
-            "choc_negatif": round(prix_actuel * (1 - profile["choc"]), 2)
-        },
-        "tendance_force": abs(tendance) * 100,
-        "tendance_direction": "HAUSSE" if tendance > 0 else "BAISSE",
-        "volatilite": profile["vol"] * 100
-    }
+    correlations = correlation(covariance)
+    ordre = ordre_clusters(correlations) if clusters else list(range(len(matieres)))
+    matrice = (covariance if mesure == 'covariance' else correlations)[np.ix_(ordre, ordre)]
+    decimales = 8 if mesure == 'covariance' else 4
     
     return {
-        "prix_actuel": prix_actuel,
-        "variation_jour": round(variation_base * random.uniform(0.8, 1.2), 2),
-        "variation_semaine": round(variation_base * random.uniform(0.6, 1.4), 2),
-        "variation_mois": round(variation_base * random.uniform(0.4, 1.6), 2),
-        "variation_annee": round(variation_base * random.uniform(0.2, 2.0), 2),
-        "derniere_maj": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "predictions": predictions,
-        "analyse": {
-            "categorie": categorie,
-            "risque": "ÉLEVÉ" if profile["vol"] > 0.04 else "MODÉRÉ",
-            "potentiel": "FORT" if abs(tendance) > 0.001 else "FAIBLE"
-        }
+        'version': etat.version,
+        **methode,
+        'mesure': 'covariance' if mesure == 'covariance' else 'correlation',
+        'ids': [matieres[i]['id'] for i in ordre],
+        'symboles': [matieres[i]['symbole'] for i in ordre],
+        'noms': [matieres[i]['nom'] for i in ordre],
+        'matrice': [[None if np.isnan(v) else v for v in ligne] for ligne in np.round(matrice, decimales).tolist()]
     }
 
-def get_historique(symbole, periode):
-    """Retourne l'historique des prix simulé"""
-    from app import MATIERES_PREMIERES
-    
-    matiere = next((m for m in MATIERES_PREMIERES if m['symbole'] == symbole), None)
+# Périodes d'historique (jours) et résolutions (secondes)
+PERIODES_HISTORIQUE = {'1d': 1, '7d': 7, '1mo': 30, '1y': 365, '5y': 5 * 365, 'max': 20 * 365}
+RESOLUTIONS_HISTORIQUE = {'minute': 60, 'heure': 3600, 'jour': 86400}
+RESOLUTION_DEFAUT = {'1d': 'heure'}
+# Au-delà, seuls les points les plus récents sont générés
+POINTS_HISTORIQUE_MAX = 1_000_000
+# Points renvoyés au plus par get_historique : au-delà, sous-échantillonnage LTTB systématique
+POINTS_GRAPHE_MAX = int(os.getenv('POINTS_GRAPHE_MAX', 5000))
+
+def _format_labels(duree_jours, resolution):
+    """Format des labels selon l'étendue affichée"""
+    if duree_jours <= 1:
+        return '%H:%M'
+    if resolution != 'jour' and duree_jours <= 7:
+        return '%d/%m %H:%M'
+    if duree_jours <= 365:
+        return '%d/%m'
+    return '%d/%m/%Y'
+
+def generer_trajectoire(symbole, prix_final, volatilite, n_points, pas, graine):
+    """Trajectoire simulée de n_points se terminant au prix final (une seule passe vectorisée)
+
+    La volatilité est journalière ; elle est ramenée au pas par sqrt(pas en jours).
+    """
+    gen = generateur(symbole, graine)
+    amplitude = volatilite * np.sqrt(pas / 86400)
+    variations = gen.uniform(-amplitude, amplitude, n_points - 1)
+    # prix[i] = prix_final / produit des (1 + variation) suivants
+    facteurs = np.cumprod((1 + variations)[::-1])[::-1]
+    prix = np.empty(n_points)
+    prix[:-1] = prix_final / facteurs
+    prix[-1] = prix_final
+    return prix
+
+@_memoise
+@chronometrer
+def get_historique(symbole, periode, resolution=None, points=None, brut=False):
+    """Retourne l'historique des prix simulé, sous-échantillonné par LTTB à `points` points
+    (POINTS_GRAPHE_MAX au plus, même si `points` n'est pas donné)
+
+    Avec brut=True, horodatages (secondes) et prix sont des tableaux NumPy, sans labels formatés.
+    """
+    matiere = CATALOGUE.par_symbole(symbole)
     if not matiere:
         return {'labels': [], 'prix': []}
     
-    if symbole not in _data_store:
-        get_prix_matiere(symbole)
+    periode = periode if periode in PERIODES_HISTORIQUE else '1mo'
+    resolution = resolution if resolution in RESOLUTIONS_HISTORIQUE else RESOLUTION_DEFAUT.get(periode, 'jour')
     
-    store = _data_store[symbole]
-    prix_courant = store["dernier_prix"]
+    etat, lignes = _lignes_instantane([matiere])
+    prix_courant = float(etat.prix[lignes[0]])
     volatilite = PRIX_BASE_CATEGORIE.get(matiere['categorie'], {"vol": 0.03})["vol"]
     
-    now = datetime.now()
-    
-    if periode == '1d':
-        labels = [(now - timedelta(hours=23-i)).strftime('%H:%M') for i in range(24)]
-        prix = []
-        prix_temp = prix_courant
-        for i in range(24):
-            variation = random.uniform(-volatilite/2, volatilite/2)
-            prix_temp = prix_temp * (1 + variation)
-            prix.append(round(prix_temp, 2))
-    
-    elif periode == '7d':
-        labels = [(now - timedelta(days=6-i)).strftime('%d/%m') for i in range(7)]
-        prix = []
-        prix_temp = prix_courant
-        for i in range(7):
-            variation = random.uniform(-volatilite, volatilite)
-            prix_temp = prix_temp * (1 + variation)
-            prix.append(round(prix_temp, 2))
+    pas = RESOLUTIONS_HISTORIQUE[resolution]
+    n_points = max(2, min(PERIODES_HISTORIQUE[periode] * 86400 // pas, POINTS_HISTORIQUE_MAX))
+    fin = int(time.time()) // pas * pas
+    horodatages = fin - pas * np.arange(n_points - 1, -1, -1, dtype=np.int64)
     
+    # Même trajectoire pour toute la journée (et pour tous les workers), à prix courant près
+    jour = fin // 86400
+    # Barres stockées sur la période (vue memmap, réelles si disponibles) ; la partie plus ancienne reste simulée
+    barres = _stockage_pour(symbole, resolution).lire(symbole, resolution, horodatages[0], fin + pas)
+    if len(barres) >= 2:
+        n_simules = int(np.searchsorted(horodatages, barres["t"][0]))
+        anterieur = generer_trajectoire(
+            symbole, float(barres["cloture"][0]), volatilite, n_simules + 1, pas, f"historique:{periode}:{resolution}:{jour}"
+        )[:-1]
+        horodatages = np.concatenate((horodatages[:n_simules], barres["t"]))
+        prix = np.concatenate((anterieur, barres["cloture"]))
+        n_points = len(prix)
     else:
-        labels = [(now - timedelta(days=29-i)).strftime('%d/%m') for i in range(30)]
-        prix = []
-        prix_temp = prix_courant
-        for i in range(30):
-            variation = random.uniform(-volatilite*1.5, volatilite*1.5)
-            prix_temp = prix_temp * (1 + variation)
-            prix.append(round(prix_temp, 2))
-    
-    return {'labels': labels, 'prix': prix}
-
-def get_indicateurs(symbole, periode='1mo'):
-    """Retourne les indicateurs techniques simulés"""
-    from app import MATIERES_PREMIERES
-    
-    matiere = next((m for m in MATIERES_PREMIERES if m['symbole'] == symbole), None)
-    if not matiere:
-        return {'error': 'Matière non trouvée'}
-    
-    hist_data = get_historique(symbole, periode)
-    if not hist_data['prix']:
-        return {'error': 'Pas de données historiques'}
+        prix = generer_trajectoire(symbole, prix_courant, volatilite, n_points, pas, f"historique:{periode}:{resolution}:{jour}")
     
-    prix = np.array(hist_data['prix'])
+    points = min(points or POINTS_GRAPHE_MAX, POINTS_GRAPHE_MAX)
+    if points < n_points:
+        indices = lttb(horodatages, prix, points)
+        horodatages, prix = horodatages[indices], prix[indices]
     
-    ma7 = round(np.mean(prix[-7:]), 2) if len(prix) >= 7 else None
-    ma30 = round(np.mean(prix[-30:]), 2) if len(prix) >= 30 else None
-    ma90 = round(np.mean(prix[-90:]), 2) if len(prix) >= 90 else None
-    
-    mediane30 = round(np.median(prix[-30:]), 2) if len(prix) >= 30 else None
-    
-    if len(prix) > 1:
-        returns = np.diff(prix) / prix[:-1]
-        vol7 = round(np.std(returns[-7:]), 4) if len(returns) >= 7 else None
-        vol30 = round(np.std(returns[-30:]), 4) if len(returns) >= 30 else None
-        vol90 = round(np.std(returns[-90:]), 4) if len(returns) >= 90 else None
-    else:
-        vol7 = vol30 = vol90 = None
-    
-    if len(prix) >= 10:
-        x = np.arange(len(prix))
-        slope, _ = np.polyfit(x, prix, 1)
-        volatility = np.std(prix)
-        if volatility > 0:
-            score = int(np.clip((slope / volatility) * 100 + 50, 0, 100))
-        else:
-            score = 50
-    else:
-        score = 50
+    if brut:
+        return {
+            'horodatages': horodatages,
+            'prix': np.round(prix, 2),
+            'resolution': resolution,
+            'points_total': int(n_points)
+        }
     
-    prix_moyen = np.mean(prix) if len(prix) > 0 else 100
-    volume = int(random.uniform(1000, 10000) * (prix_moyen / 100))
+    fmt = _format_labels(PERIODES_HISTORIQUE[periode], resolution)
+    labels = [datetime.fromtimestamp(t).strftime(fmt) for t in horodatages.tolist()]
     
     return {
-        'ma7': ma7,
-        'ma30': ma30,
-        'ma90': ma90,
-        'mediane30': mediane30,
-        'vol7': vol7,
-        'vol30': vol30,
-        'vol90': vol90,
-        'score_tendance': score,
-        'volume': volume
+        'labels': labels,
+        'prix': np.round(prix, 2).tolist(),
+        'resolution': resolution,
+        'points_total': int(n_points)
     }
 
-def get_predictions_detail(symbole, horizon='7j'):
-    """Retourne des prédictions détaillées"""
-    from app import MATIERES_PREMIERES
+def _arrondir_indicateurs(valeurs):
+    """Indicateurs arrondis pour l'API (None tant que l'historique est trop court)"""
+    def arrondi(nom, decimales):
+        return None if np.isnan(valeurs[nom]) else round(float(valeurs[nom]), decimales)
     
-    matiere = next((m for m in MATIERES_PREMIERES if m['symbole'] == symbole), None)
+    return {
+        'ma7': arrondi('ma7', 2),
+        'ma30': arrondi('ma30', 2),
+        'ma90': arrondi('ma90', 2),
+        'mediane30': arrondi('mediane30', 2),
+        'vol7': arrondi('vol7', 4),
+        'vol30': arrondi('vol30', 4),
+        'vol90': arrondi('vol90', 4),
+        'score_tendance': int(valeurs['score_tendance']),
+        'volume': int(valeurs['volume'])
+    }
+
+def _construire_indicateurs(etat, ligne):
+    """Indicateurs d'une ligne d'un instantané"""
+    return _arrondir_indicateurs({nom: tableau[ligne] for nom, tableau in etat.indicateurs.items()})
+
+@_memoise
+@chronometrer
+def get_indicateurs(symbole, periode='1mo', resolution=None):
+    """Retourne les indicateurs techniques, précalculés à chaque tick sur l'historique de ticks
+
+    `periode` est conservé pour compatibilité : les fenêtres sont de 7, 30 et 90 ticks.
+    Avec une résolution (minute, heure, jour), les fenêtres portent sur les dernières barres
+    stockées, lues sans copie.
+    """
+    matiere = CATALOGUE.par_symbole(symbole)
     if not matiere:
-        return {"error": "Matière non trouvée"}
-    
-    prix_data = get_prix_matiere(symbole)
-    if "error" in prix_data:
-        return prix_data
-    
-    categorie = matiere['categorie']
-    profile = PRIX_BASE_CATEGORIE.get(categorie, {"vol": 0.03, "choc": 0.15})
-    prix_actuel = prix_data["prix_actuel"]
-    tendance = prix_data["predictions"]["tendance_force"] / 100
+        return {'error': 'Matière non trouvée'}
     
-    if horizon == '1j':
-        jours = 1
-    elif horizon == '30j':
-        jours = 30
-    else:
-        jours = 7
+    if resolution:
+        barres = _stockage_pour(symbole, resolution).derniers(symbole, resolution, FENETRE_MAX + 1)
+        if len(barres) == 0:
+            return {'error': f'Aucune barre stockée en résolution {resolution}'}
+        return _arrondir_indicateurs(calculer_indicateurs(barres["cloture"], barres["volume"]))
     
-    scenarios = [
+    etat, lignes = _lignes_instantane([matiere])
+    return _construire_indicateurs(etat, lignes[0])
+
+def get_prix_instantane(etat, matieres, indicateurs=False):
+    """Prix (et indicateurs) des matières données pour un instantané précis, sans le faire avancer
+
+    Les matières absentes de l'instantané sont ignorées.
+    """
+    matieres = [m for m in matieres if m['symbole'] in etat.index]
+    lignes = [etat.index[m['symbole']] for m in matieres]
+    if not lignes:
+        return []
+    resultats = _construire_prix(etat, lignes)
+    for matiere, ligne, data in zip(matieres, lignes, resultats):
+        data['id'] = matiere['id']
+        if indicateurs:
+            data['indicateurs'] = _construire_indicateurs(etat, ligne)
+    return resultats
+
+HORIZONS_JOURS = {'1j': 1, '7j': 7, '30j': 30}
+
+def _scenarios(prix_actuel, stats, k, categorie, choc):
+    """Scénarios d'une matière à partir des statistiques Monte Carlo (ligne k)"""
+    q = np.round(stats["quantiles"][k], 2).tolist()
+    p_pos = float(stats["p_choc_positif"][k])
+    p_neg = float(stats["p_choc_negatif"][k])
+    choc_pos = prix_actuel * (1 + choc)
+    choc_neg = prix_actuel * (1 - choc)
+    return [
         {
             "nom": "Continuité",
-            "probabilité": 60,
-            "prix_final": round(prix_actuel * (1 + tendance * jours), 2),
-            "fourchette": [
-                round(prix_actuel * (1 + tendance * jours - profile["vol"]), 2),
-                round(prix_actuel * (1 + tendance * jours + profile["vol"]), 2)
-            ],
-            "description": f"Tendance actuelle se poursuit",
+            "probabilité": round((1 - p_pos - p_neg) * 100, 1),
+            "prix_final": q[2],
+            "fourchette": [q[1], q[3]],
+            "description": "Tendance actuelle se poursuit",
             "declencheurs": ["Marché stable", "Pas de choc majeur"]
         },
         {
             "nom": "Choc positif",
-            "probabilité": 20,
-            "prix_final": round(prix_actuel * (1 + profile["choc"]), 2),
-            "fourchette": [
-                round(prix_actuel * (0.95 + profile["choc"]), 2),
-                round(prix_actuel * (1.10 + profile["choc"]), 2)
-            ],
+            "probabilité": round(p_pos * 100, 1),
+            "prix_final": round(float(stats["moyenne_choc_positif"][k]), 2),
+            "fourchette": [round(choc_pos, 2), round(max(q[4], choc_pos), 2)],
             "description": f"Événement favorable au {categorie}",
             "declencheurs": ["Nouvelles régulations", "Pénurie", "Accord géopolitique"]
         },
         {
             "nom": "Choc négatif",
-            "probabilité": 20,
-            "prix_final": round(prix_actuel * (1 - profile["choc"]), 2),
-            "fourchette": [
-                round(prix_actuel * (0.90 - profile["choc"]), 2),
-                round(prix_actuel * (1.05 - profile["choc"]), 2)
-            ],
+            "probabilité": round(p_neg * 100, 1),
+            "prix_final": round(float(stats["moyenne_choc_negatif"][k]), 2),
+            "fourchette": [round(min(q[0], choc_neg), 2), round(choc_neg, 2)],
             "description": f"Événement défavorable au {categorie}",
             "declencheurs": ["Récession", "Surproduction", "Conflit"]
         }
     ]
+
+def simuler_scenarios(matieres, horizon='7j', chemins=None, modele="sauts"):
+    """Scénarios Monte Carlo de plusieurs matières, simulés ensemble sur l'instantané courant"""
+    if not matieres:
+        return []
+    etat, lignes = _lignes_instantane(matieres)
+    jours = HORIZONS_JOURS.get(horizon, 7)
+    prix = etat.prix[lignes]
+    choc = etat.choc[lignes]
+    stats = monte_carlo.simuler(
+        [m['symbole'] for m in matieres], prix, etat.tendance[lignes], etat.volatilite[lignes], choc,
+        jours, chemins or monte_carlo.CHEMINS_DEFAUT, modele, graine=etat.version
+    )
+    return [
+        {
+            "scenarios": _scenarios(float(prix[k]), stats, k, m['categorie'], float(choc[k])),
+            "quantiles": dict(zip(
+                (f"p{q}" for q in monte_carlo.QUANTILES), np.round(stats["quantiles"][k], 2).tolist()
+            )),
+            "probabilites_choc": {
+                "positif": round(float(stats["p_choc_positif"][k]) * 100, 1),
+                "negatif": round(float(stats["p_choc_negatif"][k]) * 100, 1)
+            },
+            "simulation": {
+                "modele": modele,
+                "chemins": min(chemins or monte_carlo.CHEMINS_DEFAUT, monte_carlo.CHEMINS_MAX),
+                "jours": jours
+            }
+        }
+        for k, m in enumerate(matieres)
+    ]
+
+@_memoise
+@chronometrer
+def get_predictions_detail(symbole, horizon='7j', chemins=None):
+    """Retourne des prédictions détaillées (scénarios et probabilités issus d'une simulation Monte Carlo)"""
+    matiere = CATALOGUE.par_symbole(symbole)
+    if not matiere:
+        return {"error": "Matière non trouvée"}
+    
+    prix_data = get_prix_matiere(symbole)
+    if "error" in prix_data:
+        return prix_data
+    
+    categorie = matiere['categorie']
+    profile = PRIX_BASE_CATEGORIE.get(categorie, {"vol": 0.03, "choc": 0.15})
+    prix_actuel = prix_data["prix_actuel"]
+    tendance = prix_data["predictions"]["tendance_force"] / 100
+    
+    simulation = simuler_scenarios([matiere], horizon, chemins)[0]
     
     # Recommandation
     if tendance > 0.001 and profile["choc"] > 0.15:
@@ -314,7 +1035,10 @@ def get_predictions_detail(symbole, horizon='7j'):
             "force": prix_data["predictions"]["tendance_force"],
             "volatilite": prix_data["predictions"]["volatilite"]
         },
-        "scenarios": scenarios,
+        "scenarios": simulation["scenarios"],
+        "quantiles": simulation["quantiles"],
+        "probabilites_choc": simulation["probabilites_choc"],
+        "simulation": simulation["simulation"],
         "recommandation": recommandation,
         "timestamp": datetime.now().isoformat()
     }
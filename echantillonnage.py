@@ -0,0 +1,38 @@
+"""
+Sous-échantillonnage de séries pour l'affichage
+Largest-Triangle-Three-Buckets (Steinarsson, 2013) : conserve la forme visuelle
+d'une courbe avec un nombre de points borné.
+"""
+import numpy as np
+
+
+def lttb(x, y, n_points):
+    """Indices des points retenus par LTTB (toujours le premier et le dernier)"""
+    taille = len(y)
+    if n_points >= taille:
+        return np.arange(taille)
+    if n_points < 3:
+        return np.array([0, taille - 1])
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bornes des n_points - 2 seaux intermédiaires (le premier et le dernier point sont à part)
+    bornes = np.floor(np.linspace(1, taille - 1, n_points - 1)).astype(np.intp)
+
+    indices = np.empty(n_points, dtype=np.intp)
+    indices[0] = 0
+    indices[-1] = taille - 1
+    a = 0
+    for i in range(n_points - 2):
+        debut, fin = bornes[i], bornes[i + 1]
+        # Moyenne du seau suivant (le dernier point pour le dernier seau)
+        if i + 2 < len(bornes):
+            suivant = slice(bornes[i + 1], bornes[i + 2])
+            cx, cy = x[suivant].mean(), y[suivant].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        # Double de l'aire du triangle (a, point candidat, moyenne suivante)
+        aires = np.abs((x[a] - cx) * (y[debut:fin] - y[a]) - (x[a] - x[debut:fin]) * (cy - y[a]))
+        a = debut + int(np.argmax(aires))
+        indices[i + 1] = a
+    return indices
@@ -0,0 +1,150 @@
+"""
+État de marché partagé entre workers gunicorn
+Les tableaux de prix et d'historique vivent dans un segment mémoire
+(multiprocessing.shared_memory ou fichier mappé en mémoire) : un seul
+processus écrit, tous les autres lisent sans copie.
+"""
+import mmap
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+MAGIC = 0x4D50455441543031
+# Entête (int64) : magic, séquence (verrou de séquence), version, lignes, capacité, profondeur
+ENTETE = ("magic", "sequence", "version", "lignes", "capacite", "profondeur")
+
+
+def _dossier_partage():
+    """tmpfs si disponible (/dev/shm), sinon le dossier temporaire du système"""
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+class SegmentPartage:
+    """Segment mémoire découpé en tableaux NumPy nommés, avec un seul écrivain"""
+
+    def __init__(self, nom, disposition, backend="fichier"):
+        self.nom = nom
+        self.backend = backend
+        self.disposition = [("entete", (len(ENTETE),), np.int64)] + list(disposition)
+
+        self._decalages = {}
+        taille = 0
+        for champ, forme, dtype in self.disposition:
+            self._decalages[champ] = taille
+            taille += -(-int(np.prod(forme)) * np.dtype(dtype).itemsize // 8) * 8
+        self.taille = taille
+
+        if backend == "shm":
+            self._buffer = self._ouvrir_shm()
+            self.chemin_verrou = os.path.join(tempfile.gettempdir(), f"{nom}.verrou")
+        elif backend == "fichier":
+            chemin = nom if os.path.isabs(nom) else os.path.join(_dossier_partage(), nom)
+            self._buffer = self._ouvrir_fichier(chemin)
+            self.chemin_verrou = f"{chemin}.verrou"
+        else:
+            raise ValueError(f"Backend d'état partagé inconnu : {backend}")
+
+        self.tableaux = {
+            champ: np.ndarray(forme, dtype=dtype, buffer=self._buffer, offset=self._decalages[champ])
+            for champ, forme, dtype in self.disposition
+        }
+        self.entete = self.tableaux["entete"]
+        self._verrou_fd = None
+        self._ecrivain_pid = None
+
+    def _ouvrir_shm(self):
+        from multiprocessing import shared_memory, resource_tracker
+        try:
+            self._shm = shared_memory.SharedMemory(name=self.nom, create=True, size=self.taille)
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=self.nom)
+        # Le segment survit aux workers : le resource_tracker ne doit pas le supprimer à leur sortie
+        try:
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        except Exception:
+            pass
+        if self._shm.size < self.taille:
+            raise RuntimeError(f"Segment partagé {self.nom} trop petit pour la configuration actuelle")
+        return self._shm.buf
+
+    def _ouvrir_fichier(self, chemin):
+        fd = os.open(chemin, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < self.taille:
+                os.ftruncate(fd, self.taille)
+            return mmap.mmap(fd, self.taille)
+        finally:
+            os.close(fd)
+
+    def allocateur(self, champ, forme, dtype=np.float64):
+        """Retourne le tableau partagé correspondant à un champ de la disposition"""
+        tableau = self.tableaux[champ]
+        if tableau.shape != tuple(forme) or tableau.dtype != np.dtype(dtype):
+            raise ValueError(f"Champ {champ} incompatible avec le segment partagé")
+        return tableau
+
+    def champ(self, nom):
+        return int(self.entete[ENTETE.index(nom)])
+
+    def fixer(self, nom, valeur):
+        self.entete[ENTETE.index(nom)] = valeur
+
+    @property
+    def initialise(self):
+        return self.champ("magic") == MAGIC
+
+    @property
+    def ecrivain(self):
+        return self._ecrivain_pid == os.getpid()
+
+    def tenter_ecriture(self):
+        """Tente de devenir l'unique écrivain (verrou exclusif non bloquant sur un fichier)"""
+        if self.ecrivain:
+            return True
+        import fcntl
+        # Après un fork, le descripteur hérité ne doit pas compter comme verrou de ce processus
+        fd = os.open(self.chemin_verrou, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._verrou_fd = fd
+        self._ecrivain_pid = os.getpid()
+        # Un écrivain précédent a pu s'arrêter au milieu d'une écriture
+        if self.champ("sequence") % 2:
+            self.fixer("sequence", self.champ("sequence") + 1)
+        return True
+
+    def liberer(self):
+        """Rend le rôle d'écrivain"""
+        if self._verrou_fd is not None:
+            import fcntl
+            fcntl.flock(self._verrou_fd, fcntl.LOCK_UN)
+            os.close(self._verrou_fd)
+        self._verrou_fd = None
+        self._ecrivain_pid = None
+
+    @contextmanager
+    def ecriture(self):
+        """Encadre une écriture : séquence impaire pendant la mise à jour, paire après"""
+        self.entete[1] += 1
+        try:
+            yield
+        finally:
+            self.entete[1] += 1
+
+    def lire(self, copie, essais=1000):
+        """Appelle copie() jusqu'à obtenir une lecture cohérente ; retourne (séquence, résultat)"""
+        for _ in range(essais):
+            avant = int(self.entete[1])
+            if avant % 2:
+                time.sleep(0)
+                continue
+            resultat = copie()
+            if int(self.entete[1]) == avant:
+                return avant, resultat
+        raise RuntimeError("Impossible d'obtenir une lecture cohérente de l'état partagé")
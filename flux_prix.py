@@ -0,0 +1,100 @@
+"""
+Diffusion des ticks de prix en Server-Sent Events
+Chaque abonné garde au plus un instantané en attente : un client lent saute les
+ticks intermédiaires et reçoit toujours le dernier état, la mémoire reste bornée.
+"""
+import json
+import os
+import threading
+
+# Un flux occupe un thread du worker gthread pendant toute la connexion : par défaut, au plus
+# GUNICORN_THREADS - FLUX_THREADS_RESERVES flux par worker, les autres threads servent l'API
+FLUX_THREADS_RESERVES = int(os.getenv('FLUX_THREADS_RESERVES', 8))
+FLUX_MAX_ABONNES = int(os.getenv(
+    'FLUX_MAX_ABONNES', max(1, int(os.getenv('GUNICORN_THREADS', 32)) - FLUX_THREADS_RESERVES)
+))
+# Commentaire SSE envoyé sans tick pendant ce délai (garde la connexion ouverte, détecte les départs)
+FLUX_PING = float(os.getenv('FLUX_PING', 15))
+
+
+class Abonnement:
+    """File d'une seule place : le dernier instantané remplace celui qui n'a pas été lu"""
+
+    def __init__(self):
+        self.ticks_sautes = 0
+        self._etat = None
+        self._verrou = threading.Lock()
+        self._evenement = threading.Event()
+
+    def pousser(self, etat):
+        with self._verrou:
+            if self._etat is not None:
+                self.ticks_sautes += 1
+            self._etat = etat
+            self._evenement.set()
+
+    def attendre(self, delai):
+        """Prochain instantané, ou None si rien n'est arrivé pendant `delai` secondes"""
+        if not self._evenement.wait(delai):
+            return None
+        with self._verrou:
+            etat, self._etat = self._etat, None
+            self._evenement.clear()
+        return etat
+
+
+class DiffuseurPrix:
+    """Distribue chaque instantané aux abonnés ; un message n'est sérialisé qu'une fois par tick et par filtre"""
+
+    def __init__(self, max_abonnes=FLUX_MAX_ABONNES):
+        self.max_abonnes = max_abonnes
+        self._abonnes = set()
+        self._messages = {}
+        self._version_messages = None
+        self._version_publiee = None
+        self._verrou = threading.Lock()
+
+    def __len__(self):
+        return len(self._abonnes)
+
+    def abonner(self):
+        """Nouvel abonnement, ou None si le nombre maximal d'abonnés est atteint"""
+        with self._verrou:
+            if len(self._abonnes) >= self.max_abonnes:
+                return None
+            abonnement = Abonnement()
+            self._abonnes.add(abonnement)
+            return abonnement
+
+    def desabonner(self, abonnement):
+        with self._verrou:
+            self._abonnes.discard(abonnement)
+
+    def publier(self, etat):
+        """Rappel de tick : pousse l'instantané à tous les abonnés sans jamais bloquer
+
+        Un worker lecteur relit l'état partagé à chaque tick, même si l'écrivain n'a rien publié :
+        une version déjà poussée n'est pas renvoyée (pas d'événement SSE en double).
+        """
+        with self._verrou:
+            if etat.version == self._version_publiee:
+                return
+            self._version_publiee = etat.version
+            abonnes = list(self._abonnes)
+        for abonnement in abonnes:
+            abonnement.pousser(etat)
+
+    def message(self, etat, cle, construire):
+        """Événement SSE `prix` pour un instantané et un filtre (`cle`), construit une seule fois"""
+        with self._verrou:
+            if self._version_messages != etat.version:
+                self._messages = {}
+                self._version_messages = etat.version
+            message = self._messages.get(cle)
+        if message is None:
+            donnees = json.dumps({"version": etat.version, "prix": construire()}, separators=(",", ":"))
+            message = f"id: {etat.version}\nevent: prix\ndata: {donnees}\n\n"
+            with self._verrou:
+                if self._version_messages == etat.version:
+                    self._messages[cle] = message
+        return message
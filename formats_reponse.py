@@ -0,0 +1,102 @@
+"""
+Formats de réponse négociés et compression
+JSON (par défaut), JSON en colonnes (tableaux parallèles, clés écrites une fois)
+et binaire NumPy .npz ; gzip pour les corps volumineux.
+"""
+import gzip
+import io
+import os
+
+import numpy as np
+from flask import Response, jsonify, request
+
+FORMATS = {
+    'json': 'application/json',
+    'colonnes': 'application/vnd.matieres.colonnes+json',
+    'npz': 'application/x-npz',
+}
+# Corps compressés au-delà de GZIP_SEUIL octets
+GZIP_SEUIL = int(os.getenv('GZIP_SEUIL', 1024))
+GZIP_NIVEAU = int(os.getenv('GZIP_NIVEAU', 5))
+
+
+def format_demande():
+    """Format demandé par ?format= ou, à défaut, par l'en-tête Accept"""
+    demande = request.args.get('format')
+    if demande in FORMATS:
+        return demande
+    type_choisi = request.accept_mimetypes.best_match(list(FORMATS.values()), default=FORMATS['json'])
+    return next(nom for nom, type_mime in FORMATS.items() if type_mime == type_choisi)
+
+
+def _aplatir(donnees, prefixe=""):
+    """Dictionnaire imbriqué vers clés pointées : {"a": {"b": 1}} -> {"a.b": 1}"""
+    plat = {}
+    for cle, valeur in donnees.items():
+        if isinstance(valeur, dict):
+            plat.update(_aplatir(valeur, f"{prefixe}{cle}."))
+        else:
+            plat[f"{prefixe}{cle}"] = valeur
+    return plat
+
+
+def en_colonnes(donnees):
+    """Liste d'objets vers tableaux parallèles ; un objet est déjà en colonnes (aplati seulement)"""
+    if isinstance(donnees, dict):
+        return _aplatir(donnees)
+    lignes = [_aplatir(ligne) for ligne in donnees]
+    cles = list(dict.fromkeys(cle for ligne in lignes for cle in ligne))
+    return {cle: [ligne.get(cle) for ligne in lignes] for cle in cles}
+
+
+def _tableau(valeurs):
+    """Colonne vers tableau NumPy sans objets Python (None -> NaN, texte -> octets UTF-8)"""
+    tableau = np.asarray(valeurs)
+    if tableau.dtype == object:
+        try:
+            tableau = np.asarray([np.nan if v is None else v for v in np.ravel(valeurs)], dtype=np.float64)
+        except (TypeError, ValueError):
+            tableau = np.asarray(["" if v is None else str(v) for v in np.ravel(valeurs)])
+    if tableau.dtype.kind == 'U':
+        # 1 octet par caractère ASCII au lieu de 4 ; décoder avec np.char.decode(tableau, 'utf-8')
+        tableau = np.char.encode(tableau, 'utf-8')
+    return tableau
+
+
+def en_npz(donnees):
+    """Colonnes sérialisées en archive .npz (lisible par np.load sans allow_pickle)"""
+    tampon = io.BytesIO()
+    np.savez(tampon, **{cle: _tableau(valeurs) for cle, valeurs in en_colonnes(donnees).items()})
+    return tampon.getvalue()
+
+
+def repondre(donnees):
+    """Réponse dans le format négocié"""
+    format_choisi = format_demande()
+    if format_choisi == 'npz':
+        reponse = Response(en_npz(donnees), mimetype=FORMATS['npz'])
+    elif format_choisi == 'colonnes':
+        reponse = jsonify(en_colonnes(donnees))
+        reponse.mimetype = FORMATS['colonnes']
+    else:
+        reponse = jsonify(donnees)
+    reponse.vary.add('Accept')
+    return reponse
+
+
+def compresser(reponse):
+    """Compresse en gzip les corps volumineux si le client l'accepte (à brancher sur after_request)"""
+    if (reponse.status_code != 200 or reponse.direct_passthrough or reponse.is_streamed
+            or 'Content-Encoding' in reponse.headers or 'gzip' not in request.accept_encodings):
+        return reponse
+    corps = reponse.get_data()
+    if len(corps) < GZIP_SEUIL:
+        return reponse
+    reponse.set_data(gzip.compress(corps, compresslevel=GZIP_NIVEAU, mtime=0))
+    reponse.headers['Content-Encoding'] = 'gzip'
+    reponse.vary.add('Accept-Encoding')
+    # Même contenu, autre encodage : l'ETag devient faible
+    etag, faible = reponse.get_etag()
+    if etag and not faible:
+        reponse.set_etag(etag, weak=True)
+    return reponse
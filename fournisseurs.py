@@ -0,0 +1,225 @@
+"""
+Fournisseurs de données de marché et remplissage de l'historique
+Le remplissage tourne en arrière-plan : il télécharge par lots les barres plus
+récentes que la dernière stockée, sans jamais bloquer le démarrage. Les symboles
+sans flux restent servis par le simulateur.
+"""
+import fcntl
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from cotations import SeauJetons
+from stockage_barres import BARRE, RESOLUTIONS
+
+logger = logging.getLogger(__name__)
+
+# Base de l'API chart de Yahoo Finance (celle qu'interroge yfinance) ; remplaçable par un serveur local
+YAHOO_URL_BASE = os.getenv('YAHOO_URL_BASE', 'https://query1.finance.yahoo.com')
+REMPLISSAGE_LOT = int(os.getenv('REMPLISSAGE_LOT', 8))
+REMPLISSAGE_INTERVALLE = float(os.getenv('REMPLISSAGE_INTERVALLE', 900))
+REMPLISSAGE_TIMEOUT = float(os.getenv('REMPLISSAGE_TIMEOUT', 10))
+# Débit autorisé vers Yahoo (requêtes par seconde), partagé par le remplissage et les cotations
+YAHOO_REQUETES_PAR_SECONDE = float(os.getenv('YAHOO_REQUETES_PAR_SECONDE', 2))
+
+
+class FournisseurDonnees:
+    """Interface d'un fournisseur : symboles couverts et téléchargement de barres"""
+
+    nom = "aucun"
+    # Profondeur maximale disponible par résolution (secondes)
+    profondeur = {}
+    # Symboles par appel de coter()
+    lot_cotations = 1
+    # Limiteur de débit, à prendre avant chaque requête envoyée
+    limiteur = SeauJetons(1e9)
+
+    def couvre(self, symbole):
+        return False
+
+    def telecharger(self, symboles, resolution, depuis):
+        """Barres (tableaux BARRE) par symbole, à partir de depuis[symbole] (secondes epoch)"""
+        return {}
+
+    def coter(self, symboles):
+        """Dernières cotations {symbole: (prix, horodatage)} en un appel"""
+        return {}
+
+
+class FournisseurYahoo(FournisseurDonnees):
+    """Contrats à terme (=F) via l'API chart de Yahoo Finance, un appel par symbole et par lot en parallèle"""
+
+    nom = "yahoo"
+    lot_cotations = 50
+    INTERVALLES = {'minute': '1m', 'heure': '60m', 'jour': '1d'}
+    # Limites de l'API : 7 jours par requête en 1m, 730 jours en 60m
+    profondeur = {'minute': 7 * 86400, 'heure': 729 * 86400, 'jour': 20 * 365 * 86400}
+
+    def __init__(self, url_base=YAHOO_URL_BASE, taille_lot=REMPLISSAGE_LOT, timeout=REMPLISSAGE_TIMEOUT):
+        # requests n'est chargé qu'à la création d'un fournisseur réseau (pas au démarrage des workers)
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.url_base = url_base.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = 'Mozilla/5.0 (matieres-premieres-analyse)'
+        # Connexions réutilisées entre appels (keep-alive), une par thread au plus
+        self.session.mount(self.url_base, HTTPAdapter(pool_connections=1, pool_maxsize=max(taille_lot, 10)))
+        self.limiteur = SeauJetons(YAHOO_REQUETES_PAR_SECONDE, capacite=max(1, taille_lot))
+        self._executeur = ThreadPoolExecutor(max_workers=taille_lot, thread_name_prefix="yahoo")
+
+    def couvre(self, symbole):
+        return symbole.endswith('=F')
+
+    def _barres(self, symbole, resolution, depuis):
+        self.limiteur.prendre()
+        reponse = self.session.get(
+            f"{self.url_base}/v8/finance/chart/{symbole}",
+            params={
+                'period1': int(depuis),
+                'period2': int(time.time()),
+                'interval': self.INTERVALLES[resolution],
+                'includePrePost': 'false',
+            },
+            timeout=self.timeout,
+        )
+        reponse.raise_for_status()
+        resultat = (reponse.json().get('chart', {}).get('result') or [None])[0]
+        if not resultat or not resultat.get('timestamp'):
+            return np.empty(0, dtype=BARRE)
+        cotations = resultat['indicators']['quote'][0]
+        barres = np.empty(len(resultat['timestamp']), dtype=BARRE)
+        barres['t'] = resultat['timestamp']
+        for champ, cle in (('ouverture', 'open'), ('haut', 'high'), ('bas', 'low'), ('cloture', 'close'), ('volume', 'volume')):
+            barres[champ] = np.array(cotations.get(cle) or [None] * len(barres), dtype=np.float64)
+        # Début de barre aligné sur la résolution ; barres sans clôture (séance vide) ignorées
+        pas = RESOLUTIONS[resolution]
+        barres['t'] = barres['t'] // pas * pas
+        barres = barres[~np.isnan(barres['cloture'])]
+        return barres[barres['t'] >= depuis]
+
+    def telecharger(self, symboles, resolution, depuis):
+        import requests
+
+        futurs = {s: self._executeur.submit(self._barres, s, resolution, depuis[s]) for s in symboles}
+        resultats = {}
+        for symbole, futur in futurs.items():
+            try:
+                resultats[symbole] = futur.result()
+            except (requests.RequestException, ValueError, KeyError, IndexError) as e:
+                logger.warning("Téléchargement %s (%s) impossible : %s", symbole, resolution, e)
+        return resultats
+
+    def _cotation(self, symbole):
+        self.limiteur.prendre()
+        reponse = self.session.get(
+            f"{self.url_base}/v8/finance/chart/{symbole}",
+            params={'range': '1d', 'interval': '1d'},
+            timeout=self.timeout,
+        )
+        reponse.raise_for_status()
+        resultat = (reponse.json().get('chart', {}).get('result') or [{}])[0] or {}
+        meta = resultat.get('meta') or {}
+        prix = meta.get('regularMarketPrice')
+        return (float(prix), float(meta.get('regularMarketTime') or time.time())) if prix else None
+
+    def coter(self, symboles):
+        """Dernières cotations lues dans les métadonnées de l'API chart, un appel par symbole en parallèle
+
+        /v7/finance/quote regrouperait les symboles mais exige un cookie et un jeton (crumb).
+        Lève la première erreur si aucun symbole n'a pu être coté.
+        """
+        import requests
+
+        futurs = {s: self._executeur.submit(self._cotation, s) for s in symboles}
+        cotations, erreur = {}, None
+        for symbole, futur in futurs.items():
+            try:
+                cotation = futur.result()
+            except (requests.RequestException, ValueError, KeyError, IndexError) as e:
+                erreur = erreur or e
+                continue
+            if cotation is not None:
+                cotations[symbole] = cotation
+        if erreur is not None and not cotations:
+            raise erreur
+        return cotations
+
+
+FOURNISSEURS = {'yahoo': FournisseurYahoo}
+
+
+class Remplissage:
+    """Tâche de fond : complète le stockage de barres par lots, de façon incrémentale"""
+
+    def __init__(self, stockage, fournisseur, symboles, resolutions=tuple(RESOLUTIONS),
+                 taille_lot=REMPLISSAGE_LOT, intervalle=REMPLISSAGE_INTERVALLE):
+        self.stockage = stockage
+        self.fournisseur = fournisseur
+        self.symboles = [s for s in symboles if fournisseur.couvre(s)]
+        self.resolutions = resolutions
+        self.taille_lot = taille_lot
+        self.intervalle = intervalle
+        self.derniere_passe = None
+        self._arret = threading.Event()
+        self._thread = None
+
+    def depuis(self, symbole, resolution):
+        """Début du téléchargement : la dernière barre stockée (qui peut être une période alors
+        en cours, à compléter), borné par la profondeur du fournisseur"""
+        plus_ancien = int(time.time()) - self.fournisseur.profondeur.get(resolution, 0)
+        dernier = self.stockage.dernier_horodatage(symbole, resolution)
+        return plus_ancien if dernier is None else max(dernier, plus_ancien)
+
+    def passe(self):
+        """Une passe complète sur tous les symboles couverts ; retourne le nombre de barres ajoutées"""
+        ajoutees = 0
+        for resolution in self.resolutions:
+            for i in range(0, len(self.symboles), self.taille_lot):
+                if self._arret.is_set():
+                    return ajoutees
+                lot = self.symboles[i:i + self.taille_lot]
+                depuis = {s: self.depuis(s, resolution) for s in lot}
+                for symbole, barres in self.fournisseur.telecharger(lot, resolution, depuis).items():
+                    ajoutees += self.stockage.ajouter(symbole, resolution, barres)
+        self.derniere_passe = time.time()
+        return ajoutees
+
+    def demarrer(self):
+        """Lance la tâche dans un thread démon (le démarrage de l'application n'attend pas le réseau)"""
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self._arret.clear()
+        self._thread = threading.Thread(target=self._boucle, name="remplissage", daemon=True)
+        self._thread.start()
+        return True
+
+    def arreter(self, attente=None):
+        self._arret.set()
+        if self._thread is not None:
+            self._thread.join(attente)
+
+    def _boucle(self):
+        os.makedirs(self.stockage.racine, exist_ok=True)
+        with open(os.path.join(self.stockage.racine, ".remplissage.lock"), "w") as verrou:
+            while not self._arret.is_set():
+                # Un seul processus remplit à la fois ; les autres retentent au tour suivant
+                try:
+                    fcntl.flock(verrou, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    self._arret.wait(self.intervalle)
+                    continue
+                try:
+                    debut = time.monotonic()
+                    ajoutees = self.passe()
+                    logger.info("Remplissage %s : %d barres en %.1f s", self.fournisseur.nom, ajoutees, time.monotonic() - debut)
+                except Exception:
+                    logger.exception("Erreur pendant le remplissage")
+                finally:
+                    fcntl.flock(verrou, fcntl.LOCK_UN)
+                self._arret.wait(self.intervalle)
@@ -0,0 +1,39 @@
+"""
+Configuration gunicorn (lue automatiquement depuis le répertoire de lancement)
+L'application est chargée et préchauffée une seule fois dans le maître (preload) ;
+les workers forkés partagent cet état en copie sur écriture et ne démarrent que
+leurs threads de fond. Nombre de workers : WEB_CONCURRENCY ; port : PORT.
+"""
+import gc
+import os
+
+# gthread : un flux /api/stream (SSE) garde un thread pendant toute la connexion. Avec
+# `threads` threads par worker, flux_prix n'accepte par défaut que threads - FLUX_THREADS_RESERVES
+# flux par worker (503 au-delà) pour que les autres requêtes restent servies ; plus de
+# clients SSE demandent plus de threads ou de workers (WEB_CONCURRENCY).
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+if preload_app:
+    # Les threads de fond ne survivent pas au fork : app.py les laisse à post_worker_init
+    os.environ['DEMARRAGE_DIFFERE'] = '1'
+
+
+def when_ready(server):
+    """Dans le maître, après le chargement de l'application et avant le premier fork"""
+    if not preload_app:
+        return
+    from app import prechauffer
+    prechauffer()
+    # Objets du maître sortis du ramasse-miettes : ses passages dans les workers
+    # ne réécrivent plus leurs en-têtes, les pages restent partagées
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    """Dans chaque worker (après post_fork : gunicorn y réinitialise les signaux)"""
+    if not preload_app:
+        return
+    from app import demarrer_taches_de_fond
+    demarrer_taches_de_fond()
@@ -0,0 +1,234 @@
+"""
+Indicateurs techniques incrémentaux
+Mis à jour à chaque tick pour toutes les lignes en une passe vectorisée :
+sommes glissantes (moyennes mobiles), variance glissante façon Welford
+(volatilités), fenêtre triée (médiane) et sommes de régression (score de tendance).
+"""
+import numpy as np
+
+FENETRES_MOYENNE = (7, 30, 90)
+FENETRES_VOLATILITE = (7, 30, 90)
+FENETRE_MEDIANE = 30
+# Fenêtre de la régression du score de tendance (et minimum de points pour le calculer)
+FENETRE_SCORE = 30
+POINTS_MIN_SCORE = 10
+# Les sommes glissantes sont recalculées exactement tous les N ticks d'une ligne (dérive flottante)
+PERIODE_RECALAGE = 1024
+FENETRE_MAX = max(FENETRES_MOYENNE + FENETRES_VOLATILITE + (FENETRE_MEDIANE, FENETRE_SCORE))
+
+
+def _welford_glissant(moyenne, m2, n, entree, sortie, pleine):
+    """Ajoute `entree` (et retire `sortie` si la fenêtre est pleine) ; modifie moyenne et m2"""
+    ancienne = moyenne.copy()
+    ajout = entree - ancienne
+    moyenne_ajout = ancienne + ajout / np.maximum(n, 1)
+    moyenne_glisse = ancienne + (entree - sortie) / np.maximum(n, 1)
+    nouvelle = np.where(pleine, moyenne_glisse, moyenne_ajout)
+    m2 += np.where(
+        pleine,
+        (entree - sortie) * (entree - nouvelle + sortie - ancienne),
+        ajout * (entree - nouvelle)
+    )
+    np.maximum(m2, 0, out=m2)
+    moyenne[:] = nouvelle
+
+
+class MoteurIndicateurs:
+    """État des indicateurs par ligne, alimenté par le tampon de ticks du moteur de prix"""
+
+    def __init__(self, historique, capacite=128, allocateur=None):
+        if historique.profondeur <= FENETRE_MAX:
+            raise ValueError(f"L'historique doit conserver plus de {FENETRE_MAX} ticks")
+        self.historique = historique
+        alloue = allocateur or (lambda champ, forme, dtype: np.zeros(forme, dtype=dtype))
+        for champ, forme, dtype in self.disposition(capacite):
+            setattr(self, champ, alloue(champ, forme, dtype))
+        self.partage = allocateur is not None
+
+    @staticmethod
+    def disposition(capacite):
+        """Champs (nom, forme, dtype) de l'état des indicateurs"""
+        champs = [(f"somme_prix_{w}", (capacite,), np.float64) for w in FENETRES_MOYENNE]
+        for w in FENETRES_VOLATILITE:
+            champs += [(f"moyenne_rend_{w}", (capacite,), np.float64), (f"m2_rend_{w}", (capacite,), np.float64)]
+        champs += [
+            ("moyenne_prix_score", (capacite,), np.float64),
+            ("m2_prix_score", (capacite,), np.float64),
+            ("sxy_score", (capacite,), np.float64),
+            # Fenêtre triée des derniers prix, complétée par +inf tant qu'elle n'est pas pleine
+            ("fenetre_triee", (capacite, FENETRE_MEDIANE), np.float64),
+            ("volume", (capacite,), np.float64),
+        ]
+        return champs
+
+    def redimensionner(self, capacite):
+        """Agrandit le nombre de lignes en conservant l'état existant"""
+        if self.partage:
+            raise RuntimeError("Des indicateurs en mémoire partagée ne peuvent pas être agrandis")
+        for champ, forme, dtype in self.disposition(capacite):
+            ancien = getattr(self, champ)
+            nouveau = np.zeros(forme, dtype=dtype)
+            nouveau[:len(ancien)] = ancien
+            setattr(self, champ, nouveau)
+
+    def initialiser(self, lignes):
+        """Remet à zéro l'état de nouvelles lignes"""
+        for champ, _, _ in self.disposition(0):
+            getattr(self, champ)[lignes] = 0
+        self.fenetre_triee[lignes] = np.inf
+
+    def _passe(self, champ, lignes, recul):
+        """Valeur `recul` ticks avant le dernier, pour chaque ligne (après l'ajout du tick courant)"""
+        positions = (self.historique.compteurs[lignes] - 1 - recul) % self.historique.profondeur
+        return getattr(self.historique, champ)[lignes, positions]
+
+    def mettre_a_jour(self, lignes, tirages_volume):
+        """Intègre le dernier tick du tampon pour les lignes données, en O(1) amorti par ligne"""
+        n_ticks = self.historique.compteurs[lignes]
+        prix = self._passe("prix", lignes, 0)
+        rendement = self._passe("rendements", lignes, 0)
+
+        for w in FENETRES_MOYENNE:
+            somme = getattr(self, f"somme_prix_{w}")
+            sortie = np.where(n_ticks > w, self._passe("prix", lignes, w), 0.0)
+            somme[lignes] += prix - sortie
+
+        for w in FENETRES_VOLATILITE:
+            moyenne = getattr(self, f"moyenne_rend_{w}")[lignes]
+            m2 = getattr(self, f"m2_rend_{w}")[lignes]
+            pleine = n_ticks > w
+            sortie = np.where(pleine, self._passe("rendements", lignes, w), 0.0)
+            _welford_glissant(moyenne, m2, np.minimum(n_ticks, w), rendement, sortie, pleine)
+            getattr(self, f"moyenne_rend_{w}")[lignes] = moyenne
+            getattr(self, f"m2_rend_{w}")[lignes] = m2
+
+        # Régression sur la fenêtre du score : x = 0..n-1 dans la fenêtre
+        w = FENETRE_SCORE
+        pleine = n_ticks > w
+        n = np.minimum(n_ticks, w)
+        sortie = np.where(pleine, self._passe("prix", lignes, w), 0.0)
+        moyenne = self.moyenne_prix_score[lignes]
+        m2 = self.m2_prix_score[lignes]
+        somme_avant = moyenne * np.minimum(n_ticks - 1, w)
+        _welford_glissant(moyenne, m2, n, prix, sortie, pleine)
+        self.moyenne_prix_score[lignes] = moyenne
+        self.m2_prix_score[lignes] = m2
+        self.sxy_score[lignes] = np.where(
+            pleine,
+            self.sxy_score[lignes] + w * prix - (somme_avant - sortie + prix),
+            self.sxy_score[lignes] + (n - 1) * prix
+        )
+
+        self._inserer_median(lignes, prix, np.where(n_ticks > FENETRE_MEDIANE, self._passe("prix", lignes, FENETRE_MEDIANE), np.inf))
+
+        self.volume[lignes] = 1000 + 9000 * tirages_volume
+
+        a_recaler = np.asarray(lignes)[n_ticks % PERIODE_RECALAGE == 0]
+        if len(a_recaler):
+            self.recaler(a_recaler)
+
+    def _inserer_median(self, lignes, entree, sortie):
+        """Retire `sortie` et insère `entree` dans la fenêtre triée, O(W) vectorisé par ligne"""
+        w = FENETRE_MEDIANE
+        triee = self.fenetre_triee[lignes]
+        idx = np.arange(w - 1)
+        k_sortie = (triee < sortie[:, None]).sum(axis=1)
+        sans = np.take_along_axis(triee, idx + (idx >= k_sortie[:, None]), axis=1)
+        k_entree = (sans < entree[:, None]).sum(axis=1)
+        idx = np.arange(w)
+        source = np.clip(idx - (idx > k_entree[:, None]), 0, w - 2)
+        self.fenetre_triee[lignes] = np.where(
+            idx == k_entree[:, None], entree[:, None], np.take_along_axis(sans, source, axis=1)
+        )
+
+    def recaler(self, lignes):
+        """Recalcule exactement l'état des lignes données depuis le tampon de ticks"""
+        lignes = np.asarray(lignes)
+        n_ticks = self.historique.compteurs[lignes]
+        # Fenêtre des FENETRE_MAX derniers ticks, du plus récent au plus ancien ; NaN hors historique
+        reculs = np.arange(FENETRE_MAX)
+        positions = (n_ticks[:, None] - 1 - reculs) % self.historique.profondeur
+        valide = reculs < n_ticks[:, None]
+        prix = np.where(valide, self.historique.prix[lignes[:, None], positions], np.nan)
+        rendements = np.where(valide, self.historique.rendements[lignes[:, None], positions], np.nan)
+
+        with np.errstate(invalid="ignore"):
+            for w in FENETRES_MOYENNE:
+                getattr(self, f"somme_prix_{w}")[lignes] = np.nansum(prix[:, :w], axis=1)
+            for w in FENETRES_VOLATILITE:
+                n = np.minimum(n_ticks, w)
+                fenetre = rendements[:, :w]
+                moyenne = np.where(n > 0, np.nansum(fenetre, axis=1) / np.maximum(n, 1), 0.0)
+                getattr(self, f"moyenne_rend_{w}")[lignes] = moyenne
+                getattr(self, f"m2_rend_{w}")[lignes] = np.nansum((fenetre - moyenne[:, None]) ** 2, axis=1)
+
+            w = FENETRE_SCORE
+            n = np.minimum(n_ticks, w)
+            fenetre = prix[:, :w]
+            moyenne = np.where(n > 0, np.nansum(fenetre, axis=1) / np.maximum(n, 1), 0.0)
+            self.moyenne_prix_score[lignes] = moyenne
+            self.m2_prix_score[lignes] = np.nansum((fenetre - moyenne[:, None]) ** 2, axis=1)
+            # Le tick le plus récent a l'abscisse n-1, le plus ancien de la fenêtre l'abscisse 0
+            x = n[:, None] - 1 - reculs[:w]
+            self.sxy_score[lignes] = np.nansum(np.where(x >= 0, x, 0) * fenetre, axis=1)
+
+        triee = np.sort(np.where(valide[:, :FENETRE_MEDIANE], prix[:, :FENETRE_MEDIANE], np.inf), axis=1)
+        self.fenetre_triee[lignes] = triee
+
+    def lire(self, lignes=slice(None)):
+        """Valeurs des indicateurs (tableaux, NaN quand l'historique est trop court)"""
+        n_ticks = self.historique.compteurs[lignes]
+        valeurs = {}
+        for w in FENETRES_MOYENNE:
+            valeurs[f"ma{w}"] = np.where(n_ticks >= w, getattr(self, f"somme_prix_{w}")[lignes] / w, np.nan)
+
+        valeurs["mediane30"] = np.where(
+            n_ticks >= FENETRE_MEDIANE,
+            self.fenetre_triee[lignes, (FENETRE_MEDIANE - 1) // 2] / 2 + self.fenetre_triee[lignes, FENETRE_MEDIANE // 2] / 2,
+            np.nan
+        )
+
+        for w in FENETRES_VOLATILITE:
+            # Écart-type de population, comme np.std
+            valeurs[f"vol{w}"] = np.where(
+                n_ticks >= w, np.sqrt(getattr(self, f"m2_rend_{w}")[lignes] / w), np.nan
+            )
+
+        n = np.minimum(n_ticks, FENETRE_SCORE).astype(np.float64)
+        sx = n * (n - 1) / 2
+        sxx = (n - 1) * n * (2 * n - 1) / 6
+        sy = self.moyenne_prix_score[lignes] * n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pente = (n * self.sxy_score[lignes] - sx * sy) / (n * sxx - sx ** 2)
+            ecart = np.sqrt(self.m2_prix_score[lignes] / n)
+            score = np.clip((pente / ecart) * 100 + 50, 0, 100)
+        valeurs["score_tendance"] = np.where((n >= POINTS_MIN_SCORE) & (ecart > 0), np.floor(score), 50)
+
+        valeurs["volume"] = np.floor(self.volume[lignes] * self.moyenne_prix_score[lignes] / 100)
+        return valeurs
+
+
+def calculer_indicateurs(prix, volumes):
+    """Mêmes indicateurs calculés directement sur une série (barres stockées, ordre chronologique)
+
+    Les rendements sont les variations relatives entre prix successifs ; le volume est celui
+    de la dernière barre.
+    """
+    prix = np.asarray(prix, dtype=np.float64)
+    rendements = np.diff(prix) / prix[:-1]
+    valeurs = {}
+    for w in FENETRES_MOYENNE:
+        valeurs[f"ma{w}"] = prix[-w:].mean() if len(prix) >= w else np.nan
+    valeurs["mediane30"] = np.median(prix[-FENETRE_MEDIANE:]) if len(prix) >= FENETRE_MEDIANE else np.nan
+    for w in FENETRES_VOLATILITE:
+        valeurs[f"vol{w}"] = rendements[-w:].std() if len(rendements) >= w else np.nan
+
+    fenetre = prix[-FENETRE_SCORE:]
+    ecart = fenetre.std() if len(fenetre) else 0.0
+    if len(fenetre) >= POINTS_MIN_SCORE and ecart > 0:
+        pente = np.polyfit(np.arange(len(fenetre)), fenetre, 1)[0]
+        valeurs["score_tendance"] = np.floor(np.clip(pente / ecart * 100 + 50, 0, 100))
+    else:
+        valeurs["score_tendance"] = 50
+    valeurs["volume"] = np.floor(volumes[-1]) if len(volumes) else 0
+    return valeurs
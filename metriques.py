@@ -0,0 +1,180 @@
+"""
+Métriques au format d'exposition Prometheus (texte 0.0.4)
+Compteurs et histogrammes à seaux fixes, jauges lues à la collecte ; une
+observation coûte une recherche dichotomique et deux additions sous verrou,
+assez peu pour rester active en production. Les valeurs sont propres au
+processus (un worker gunicorn par collecte).
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+import numpy as np
+
+TYPE_CONTENU = 'text/plain; version=0.0.4; charset=utf-8'
+# Seaux (secondes) des durées de requête et de calcul
+SEAUX_DUREE = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _etiquettes(noms, valeurs):
+    if not noms:
+        return ""
+    echappees = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for v in valeurs)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(noms, echappees)) + "}"
+
+
+def _nombre(valeur):
+    if valeur == float('inf'):
+        return "+Inf"
+    return repr(float(valeur)) if isinstance(valeur, float) else str(valeur)
+
+
+class Compteur:
+    """Compteur croissant, une série par combinaison d'étiquettes"""
+
+    type_metrique = "counter"
+
+    def __init__(self, nom, aide, etiquettes=()):
+        self.nom, self.aide, self.etiquettes = nom, aide, tuple(etiquettes)
+        self._valeurs = {}
+        self._verrou = threading.Lock()
+
+    def inc(self, *valeurs, n=1):
+        with self._verrou:
+            self._valeurs[valeurs] = self._valeurs.get(valeurs, 0) + n
+
+    def lignes(self):
+        with self._verrou:
+            valeurs = list(self._valeurs.items())
+        return [f"{self.nom}{_etiquettes(self.etiquettes, cle)} {_nombre(v)}" for cle, v in sorted(valeurs)]
+
+
+class Histogramme:
+    """Histogramme à seaux fixes (comptes cumulés à l'exposition), somme et nombre d'observations"""
+
+    type_metrique = "histogram"
+
+    def __init__(self, nom, aide, etiquettes=(), seaux=SEAUX_DUREE):
+        self.nom, self.aide, self.etiquettes = nom, aide, tuple(etiquettes)
+        self.seaux = tuple(seaux)
+        self._series = {}
+        self._verrou = threading.Lock()
+
+    def observer(self, valeur, *valeurs):
+        i = bisect_left(self.seaux, valeur)
+        with self._verrou:
+            serie = self._series.get(valeurs)
+            if serie is None:
+                # comptes par seau (le dernier : au-delà du plus grand), somme
+                serie = self._series[valeurs] = [[0] * (len(self.seaux) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valeur
+
+    def lignes(self):
+        with self._verrou:
+            series = [(cle, list(comptes), somme) for cle, (comptes, somme) in self._series.items()]
+        lignes = []
+        for cle, comptes, somme in sorted(series):
+            cumul = np.cumsum(comptes).tolist()
+            for borne, n in zip(self.seaux + (float('inf'),), cumul):
+                etiquettes = _etiquettes(self.etiquettes + ("le",), cle + (_nombre(borne),))
+                lignes.append(f"{self.nom}_bucket{etiquettes} {n}")
+            lignes.append(f"{self.nom}_sum{_etiquettes(self.etiquettes, cle)} {_nombre(somme)}")
+            lignes.append(f"{self.nom}_count{_etiquettes(self.etiquettes, cle)} {cumul[-1]}")
+        return lignes
+
+
+class Jauge:
+    """Valeurs lues à la collecte : `lire()` retourne un nombre ou {valeurs d'étiquettes: nombre}"""
+
+    type_metrique = "gauge"
+
+    def __init__(self, nom, aide, lire, etiquettes=(), type_metrique="gauge"):
+        self.nom, self.aide, self.etiquettes = nom, aide, tuple(etiquettes)
+        self.lire = lire
+        self.type_metrique = type_metrique
+
+    def lignes(self):
+        valeurs = self.lire()
+        if not isinstance(valeurs, dict):
+            valeurs = {(): valeurs}
+        return [
+            f"{self.nom}{_etiquettes(self.etiquettes, cle if isinstance(cle, tuple) else (cle,))} {_nombre(v)}"
+            for cle, v in valeurs.items() if v is not None
+        ]
+
+
+class Registre:
+    """Ensemble de métriques exposées ensemble"""
+
+    def __init__(self):
+        self._metriques = {}
+        self._verrou = threading.Lock()
+
+    def _ajouter(self, metrique):
+        with self._verrou:
+            return self._metriques.setdefault(metrique.nom, metrique)
+
+    def compteur(self, nom, aide, etiquettes=()):
+        return self._ajouter(Compteur(nom, aide, etiquettes))
+
+    def histogramme(self, nom, aide, etiquettes=(), seaux=SEAUX_DUREE):
+        return self._ajouter(Histogramme(nom, aide, etiquettes, seaux))
+
+    def jauge(self, nom, aide, lire, etiquettes=(), type_metrique="gauge"):
+        """Jauge lue à la collecte (type_metrique="counter" pour un total tenu ailleurs)"""
+        return self._ajouter(Jauge(nom, aide, lire, etiquettes, type_metrique))
+
+    def exposer(self):
+        """Texte d'exposition de toutes les métriques"""
+        with self._verrou:
+            metriques = list(self._metriques.values())
+        lignes = []
+        for metrique in metriques:
+            lignes.append(f"# HELP {metrique.nom} {metrique.aide}")
+            lignes.append(f"# TYPE {metrique.nom} {metrique.type_metrique}")
+            lignes.extend(metrique.lignes())
+        return "\n".join(lignes) + "\n"
+
+
+REGISTRE = Registre()
+
+_durees_fonctions = REGISTRE.histogramme(
+    "matieres_fonction_duree_secondes", "Durée des fonctions de calcul instrumentées", ("fonction",)
+)
+
+
+def chronometrer(fonction):
+    """Décorateur : durée de chaque appel dans matieres_fonction_duree_secondes{fonction=...}"""
+    nom = fonction.__qualname__
+
+    @wraps(fonction)
+    def enveloppe(*args, **kwargs):
+        debut = time.perf_counter()
+        try:
+            return fonction(*args, **kwargs)
+        finally:
+            _durees_fonctions.observer(time.perf_counter() - debut, nom)
+    return enveloppe
+
+
+def octets(objet):
+    """Taille des tableaux NumPy portés par un objet (attributs directs et composants)"""
+    total = 0
+    for valeur in vars(objet).values():
+        if isinstance(valeur, np.ndarray):
+            total += valeur.nbytes
+        elif isinstance(valeur, dict):
+            total += sum(v.nbytes for v in valeur.values() if isinstance(v, np.ndarray))
+    return total
+
+
+def memoire_processus():
+    """RSS du processus courant (octets), lue dans /proc ; None ailleurs que sous Linux"""
+    try:
+        with open("/proc/self/statm") as fichier:
+            return int(fichier.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
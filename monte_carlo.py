@@ -0,0 +1,102 @@
+"""
+Moteur de scénarios Monte Carlo
+Simule N trajectoires (mouvement brownien géométrique, avec sauts de Merton en option)
+pour plusieurs instruments à la fois et en déduit quantiles et probabilités de choc.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from aleatoire import graine_symbole
+
+CHEMINS_DEFAUT = int(os.getenv('MONTE_CARLO_CHEMINS', 10000))
+CHEMINS_MAX = 200_000
+QUANTILES = (5, 25, 50, 75, 95)
+# Sauts : intensité (sauts par jour) ; l'écart-type d'un saut est une fraction du seuil de choc
+INTENSITE_SAUTS = 1 / 60
+TAILLE_SAUT_RELATIVE = 0.5
+# Nombre de valeurs simulées par bloc (borne la mémoire : ~16 Mo en float32 par tableau)
+TAILLE_BLOC = 4_000_000
+# Au-delà de instruments x chemins, la simulation est répartie sur un pool de processus
+SEUIL_PROCESSUS = int(os.getenv('MONTE_CARLO_SEUIL_PROCESSUS', 20_000_000))
+PROCESSUS = int(os.getenv('MONTE_CARLO_PROCESSUS', os.cpu_count() or 1))
+
+_pool = None
+
+
+def _simuler_bloc(prix, tendance, volatilite, choc, jours, graines, n_chemins, modele):
+    """Simule un bloc d'instruments : une ligne de chemins par instrument, calculs en une passe"""
+    n = len(prix)
+    z = np.empty((n, n_chemins), dtype=np.float32)
+    generateurs = [np.random.Generator(np.random.PCG64(g)) for g in graines]
+    for i, gen in enumerate(generateurs):
+        gen.standard_normal(n_chemins, dtype=np.float32, out=z[i])
+
+    derive = ((tendance - 0.5 * volatilite ** 2) * jours).astype(np.float32)
+    log_r = derive[:, None] + (volatilite * np.sqrt(jours)).astype(np.float32)[:, None] * z
+
+    if modele == "sauts":
+        # Merton : N ~ Poisson(lambda.T) sauts, somme des sauts ~ N(0, N.sigma_saut^2)
+        for i, gen in enumerate(generateurs):
+            n_sauts = gen.poisson(INTENSITE_SAUTS * jours, n_chemins)
+            gen.standard_normal(n_chemins, dtype=np.float32, out=z[i])
+            z[i] *= np.sqrt(n_sauts, dtype=np.float32)
+        # Sans seuil de choc (infini), pas de sauts
+        taille_saut = np.where(np.isfinite(choc), choc * TAILLE_SAUT_RELATIVE, 0)
+        log_r += taille_saut.astype(np.float32)[:, None] * z
+
+    rendement = np.expm1(log_r, out=log_r)
+    positif = rendement > choc[:, None]
+    negatif = rendement < -choc[:, None]
+    n_pos = positif.sum(axis=1)
+    n_neg = negatif.sum(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        moyenne_pos = np.where(positif, rendement, 0).sum(axis=1) / n_pos
+        moyenne_neg = np.where(negatif, rendement, 0).sum(axis=1) / n_neg
+
+    quantiles = np.percentile(rendement, QUANTILES, axis=1).T
+    return {
+        "quantiles": prix[:, None] * (1 + quantiles),
+        "p_choc_positif": n_pos / n_chemins,
+        "p_choc_negatif": n_neg / n_chemins,
+        "moyenne_choc_positif": np.where(n_pos > 0, prix * (1 + moyenne_pos), prix * (1 + choc)),
+        "moyenne_choc_negatif": np.where(n_neg > 0, prix * (1 + moyenne_neg), prix * (1 - choc)),
+    }
+
+
+def _executeur():
+    global _pool
+    if _pool is None:
+        # spawn : pas de fork d'un worker web multi-threadé
+        _pool = ProcessPoolExecutor(max_workers=PROCESSUS, mp_context=get_context("spawn"))
+    return _pool
+
+
+def simuler(symboles, prix, tendance, volatilite, choc, jours, n_chemins=CHEMINS_DEFAUT, modele="sauts", graine=""):
+    """Statistiques des prix simulés à `jours` jours pour chaque instrument
+
+    Les tirages de chaque instrument viennent de son propre flux (symbole, graine),
+    donc le résultat d'un instrument ne dépend ni des autres ni du découpage en blocs.
+    """
+    n_chemins = max(1, min(int(n_chemins), CHEMINS_MAX))
+    prix, tendance, volatilite, choc = (np.asarray(v, dtype=np.float64) for v in (prix, tendance, volatilite, choc))
+    graines = [graine_symbole(s, f"monte_carlo:{jours}:{graine}") for s in symboles]
+
+    par_bloc = max(1, TAILLE_BLOC // n_chemins)
+    blocs = [slice(i, i + par_bloc) for i in range(0, len(symboles), par_bloc)]
+    arguments = [
+        (prix[b], tendance[b], volatilite[b], choc[b], jours, graines[b], n_chemins, modele)
+        for b in blocs
+    ]
+
+    if len(blocs) > 1 and PROCESSUS > 1 and len(symboles) * n_chemins > SEUIL_PROCESSUS:
+        resultats = list(_executeur().map(_simuler_bloc, *zip(*arguments)))
+    else:
+        resultats = [_simuler_bloc(*args) for args in arguments]
+
+    if not resultats:
+        return {}
+    return {cle: np.concatenate([r[cle] for r in resultats]) for cle in resultats[0]}
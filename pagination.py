@@ -0,0 +1,155 @@
+"""
+Pagination par curseur, projection de champs et tri côté serveur des listes
+Paramètres : sort=[-]clé, limit=n, cursor=<curseur opaque>, fields=id,nom,data.prix_actuel.
+Le curseur encode le tri et la clé (valeur, id) de la dernière ligne renvoyée : la
+page suivante reprend juste après, sans décalage. Seules les lignes de la page sont
+triées, construites et sérialisées.
+"""
+import base64
+import binascii
+import json
+import os
+from collections import namedtuple
+from urllib.parse import urlencode
+
+import numpy as np
+from flask import request
+
+# Taille de page sans paramètre limit (0 : liste complète) et taille maximale
+PAGINATION_LIMITE_DEFAUT = int(os.getenv('PAGINATION_LIMITE_DEFAUT', 0))
+PAGINATION_LIMITE_MAX = int(os.getenv('PAGINATION_LIMITE_MAX', 1000))
+
+Liste = namedtuple("Liste", ["tri", "decroissant", "limite", "apres", "champs"])
+
+
+def encoder_curseur(tri, decroissant, valeur, dernier_id):
+    donnees = json.dumps([tri, decroissant, valeur, dernier_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(donnees).decode().rstrip('=')
+
+
+def decoder_curseur(curseur):
+    """(tri, décroissant, (valeur, id)) d'un curseur ; ValueError s'il est invalide"""
+    try:
+        tri, decroissant, valeur, dernier_id = json.loads(base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, TypeError, ValueError):
+        raise ValueError("Paramètre cursor invalide") from None
+    if not isinstance(valeur, (int, float, type(None))) or not isinstance(dernier_id, (int, float)):
+        raise ValueError("Paramètre cursor invalide")
+    return tri, bool(decroissant), (valeur, dernier_id)
+
+
+def lire_parametres(tris):
+    """Paramètres sort, limit, cursor et fields de la requête ; ValueError si l'un est invalide"""
+    tri = request.args.get('sort') or None
+    decroissant = tri is not None and tri.startswith('-')
+    if tri is not None:
+        tri = tri.lstrip('-+')
+        if tri not in tris:
+            raise ValueError(f"Paramètre sort invalide (clés : {', '.join(tris)})")
+
+    apres = None
+    if request.args.get('cursor'):
+        tri_curseur, decroissant_curseur, apres = decoder_curseur(request.args['cursor'])
+        if request.args.get('sort') and (tri_curseur, decroissant_curseur) != (tri, decroissant):
+            raise ValueError("Le curseur a été obtenu avec un autre tri")
+        if tri_curseur is not None and tri_curseur not in tris:
+            raise ValueError("Paramètre cursor invalide")
+        tri, decroissant = tri_curseur, decroissant_curseur
+
+    limite = request.args.get('limit', type=int, default=PAGINATION_LIMITE_DEFAUT)
+    if 'limit' in request.args and not 1 <= limite <= PAGINATION_LIMITE_MAX:
+        raise ValueError(f"Paramètre limit invalide (1 à {PAGINATION_LIMITE_MAX})")
+
+    champs = [c.strip() for c in request.args.get('fields', '').split(',') if c.strip()] or None
+    return Liste(tri, decroissant, limite or None, apres, champs)
+
+
+def ordonner(cles, ids, decroissant=False, apres=None, limite=None):
+    """Positions de la page triée par (clé, id) qui suit `apres` = (clé, id), et (clé, id) de sa
+    dernière ligne s'il reste des lignes ensuite
+
+    Sélection partielle en O(n) puis tri des seules lignes de la page ; clés NaN en dernier.
+    """
+    cles = np.asarray(cles, dtype=np.float64)
+    ids = np.asarray(ids)
+    k = -cles if decroissant else cles
+    k = np.where(np.isnan(k), np.inf, k)
+    positions = np.arange(len(k))
+    if apres is not None:
+        valeur, dernier_id = apres
+        valeur = np.inf if valeur is None else (-valeur if decroissant else valeur)
+        positions = np.flatnonzero((k > valeur) | ((k == valeur) & (ids > dernier_id)))
+
+    suite = limite is not None and len(positions) > limite
+    if suite:
+        # Lignes jusqu'à la limite-ième clé, ex æquo compris (départagés par l'id)
+        seuil = np.partition(k[positions], limite - 1)[limite - 1]
+        positions = positions[k[positions] <= seuil]
+    page = positions[np.lexsort((ids[positions], k[positions]))][:limite]
+
+    if not suite:
+        return page, None
+    derniere = page[-1]
+    valeur = None if np.isnan(cles[derniere]) else float(cles[derniere])
+    return page, (valeur, int(ids[derniere]))
+
+
+def _arbre(champs):
+    """["id", "data.prix_actuel"] -> {"id": None, "data": {"prix_actuel": None}} (None : champ entier)"""
+    arbre = {}
+    for champ in champs:
+        noeud = arbre
+        *parents, feuille = champ.split('.')
+        for parent in parents:
+            noeud = noeud.setdefault(parent, {})
+            if noeud is None:
+                break
+        else:
+            noeud[feuille] = None
+    return arbre
+
+
+def _projeter(objet, arbre):
+    projete = {}
+    for cle, sous_arbre in arbre.items():
+        if cle in objet:
+            valeur = objet[cle]
+            projete[cle] = _projeter(valeur, sous_arbre) if sous_arbre and isinstance(valeur, dict) else valeur
+    return projete
+
+
+def projeter(lignes, champs):
+    """Lignes réduites aux champs (chemins pointés) demandés ; toutes les colonnes sans champs"""
+    if not champs:
+        return lignes
+    arbre = _arbre(champs)
+    return [_projeter(ligne, arbre) for ligne in lignes]
+
+
+def demande_champ(champs, champ):
+    """Vrai si la projection garde tout ou partie du champ"""
+    return not champs or any(c == champ or c.startswith(champ + '.') or champ.startswith(c + '.') for c in champs)
+
+
+def paginer(matieres, liste, cles_tri, ids):
+    """Matières de la page demandée et curseur de la page suivante (ou None)
+
+    `cles_tri(matieres, tri)` et `ids(matieres)` donnent les tableaux de clés ; sans tri
+    ni limite ni curseur, la liste est renvoyée telle quelle.
+    """
+    if liste.tri is None and liste.limite is None and liste.apres is None:
+        return matieres, None
+    page, derniere = ordonner(cles_tri(matieres, liste.tri), ids(matieres), liste.decroissant, liste.apres, liste.limite)
+    curseur = encoder_curseur(liste.tri, liste.decroissant, *derniere) if derniere else None
+    return [matieres[p] for p in page], curseur
+
+
+def entetes_page(reponse, curseur, total):
+    """Nombre total de lignes et, s'il y a une page suivante, son curseur et son lien (Link rel=next)"""
+    reponse.headers['X-Total-Count'] = str(total)
+    if curseur:
+        parametres = request.args.to_dict(flat=False)
+        parametres['cursor'] = [curseur]
+        reponse.headers['X-Next-Cursor'] = curseur
+        reponse.headers['Link'] = f'<{request.base_url}?{urlencode(parametres, doseq=True)}>; rel="next"'
+    return reponse
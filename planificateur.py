@@ -0,0 +1,65 @@
+"""
+Planificateur de ticks en arrière-plan
+Fait avancer tout l'univers à intervalle fixe, indépendamment du trafic HTTP
+"""
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Intervalle entre deux ticks (secondes)
+TICK_INTERVALLE = float(os.getenv('TICK_INTERVALLE', 5))
+
+
+class PlanificateurTicks:
+    """Appelle une fonction de tick à intervalle régulier dans un thread démon"""
+
+    def __init__(self, tick, intervalle=TICK_INTERVALLE):
+        self.tick = tick
+        self.intervalle = intervalle
+        self.abonnes = []
+        self._arret = threading.Event()
+        self._thread = None
+        self._verrou = threading.Lock()
+
+    @property
+    def actif(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def abonner(self, rappel):
+        """Enregistre un rappel appelé avec chaque nouvel instantané"""
+        self.abonnes.append(rappel)
+
+    def demarrer(self):
+        """Démarre le thread (sans effet s'il tourne déjà dans ce processus)"""
+        with self._verrou:
+            if self.actif:
+                return False
+            self._arret.clear()
+            self._thread = threading.Thread(target=self._boucle, name="planificateur-ticks", daemon=True)
+            self._thread.start()
+            return True
+
+    def arreter(self, attente=None):
+        self._arret.set()
+        if self._thread is not None:
+            self._thread.join(attente)
+
+    def _boucle(self):
+        prochain = time.monotonic()
+        while not self._arret.is_set():
+            prochain += self.intervalle
+            try:
+                etat = self.tick()
+                for rappel in self.abonnes:
+                    rappel(etat)
+            except Exception:
+                logger.exception("Erreur pendant le tick")
+            # Cadencé sur l'horloge : un tick lent ne décale pas les suivants
+            attente = prochain - time.monotonic()
+            if attente < 0:
+                prochain = time.monotonic()
+                attente = 0
+            self._arret.wait(attente)
@@ -2,17 +2,18 @@
 PREDICTOR V1 - Système de prévision probabiliste
 Combine : Tendances historiques + Aléatoire intelligent
 """
-import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import random
 import json
-import os
+from catalogue import CATALOGUE
+from aleatoire import generateur
+import monte_carlo
+from metriques import chronometrer
+from stockage_barres import REPERTOIRE_HISTORIQUE
 
 class MarketPredictor:
     def __init__(self):
-        self.data_dir = "historical_data"
-        os.makedirs(self.data_dir, exist_ok=True)
+        self.data_dir = REPERTOIRE_HISTORIQUE
         
         # Configuration des marchés
         self.market_profiles = {
@@ -41,13 +42,9 @@ class MarketPredictor:
         # Pour V1 : données simulées intelligentes
         # Plus tard : intégration Alpha Vantage
         
-        # Génère une tendance basée sur le hash du symbole
-        import hashlib
-        seed = int(hashlib.md5(symbol.encode()).hexdigest()[:8], 16) % 100
-        random.seed(seed)
-        
+        # Génère une tendance basée sur le hash du symbole (flux propre au symbole)
         # Tendance aléatoire mais persistante
-        trend_strength = random.uniform(-0.002, 0.002)  # -0.2% à +0.2%/jour
+        trend_strength = generateur(symbol, "tendance").uniform(-0.002, 0.002)  # -0.2% à +0.2%/jour
         
         # Volatilité selon catégorie
         category = self._get_category(symbol)
@@ -60,8 +57,9 @@ class MarketPredictor:
             "direction": "HAUSSE" if trend_strength > 0 else "BAISSE"
         }
     
-    def generate_scenarios(self, symbol, horizon="7j", n_scenarios=3):
-        """Génère plusieurs scénarios plausibles"""
+    @chronometrer
+    def generate_scenarios(self, symbol, horizon="7j", n_scenarios=3, n_chemins=None):
+        """Génère plusieurs scénarios plausibles (probabilités issues d'une simulation Monte Carlo)"""
         
         # 1. Analyse historique
         hist = self.get_historical_trend(symbol)
@@ -73,50 +71,54 @@ class MarketPredictor:
         # 3. Prix actuel simulé (pour V1)
         current_price = self._get_current_price(symbol)
         
-        # 4. Génère les scénarios
+        # 4. Simule les trajectoires (sans seuil de choc, tout est continuité)
+        choc = profile.get("choc_seuil") or np.inf
+        stats = monte_carlo.simuler(
+            [symbol], [current_price], [hist["tendance_journalière"]], [hist["volatilité"]], [choc],
+            self._horizon_days(horizon), n_chemins or monte_carlo.CHEMINS_DEFAUT
+        )
+        q = np.round(stats["quantiles"][0], 2).tolist()
+        p_pos = float(stats["p_choc_positif"][0])
+        p_neg = float(stats["p_choc_negatif"][0])
+        
+        # 5. Génère les scénarios
         scenarios = []
         
-        # SCÉNARIO 1 : NORMAL (60% proba)
-        normal_price = current_price * (1 + hist["tendance_journalière"] * self._horizon_days(horizon))
-        normal_vol = random.uniform(0.8, 1.2) * hist["volatilité"]
-        
+        # SCÉNARIO 1 : NORMAL (médiane et intervalle interquartile)
         scenarios.append({
             "nom": "Continuité",
-            "probabilité": 60,
-            "prix_final": round(normal_price, 2),
-            "fourchette": [
-                round(normal_price * (1 - normal_vol), 2),
-                round(normal_price * (1 + normal_vol), 2)
-            ],
+            "probabilité": round((1 - p_pos - p_neg) * 100, 1),
+            "prix_final": q[2],
+            "fourchette": [q[1], q[3]],
             "description": f"Tendance {hist['direction'].lower()} continue",
             "declencheurs": ["Pas de choc majeur", "Marché stable"]
         })
         
-        # SCÉNARIO 2 : CHOC POSITIF (20% proba)
+        # SCÉNARIO 2 : CHOC POSITIF (trajectoires au-delà du seuil de choc)
         if profile.get("choc_seuil"):
             choc_pos = current_price * (1 + profile["choc_seuil"])
             scenarios.append({
                 "nom": "Choc positif",
-                "probabilité": 20,
-                "prix_final": round(choc_pos, 2),
+                "probabilité": round(p_pos * 100, 1),
+                "prix_final": round(float(stats["moyenne_choc_positif"][0]), 2),
                 "fourchette": [
-                    round(choc_pos * 0.95, 2),
-                    round(choc_pos * 1.10, 2)
+                    round(choc_pos, 2),
+                    round(max(q[4], choc_pos), 2)
                 ],
                 "description": f"Événement favorable au {category}",
                 "declencheurs": ["Nouvelles régulations", "Pénurie", "Accord géopolitique"]
             })
         
-        # SCÉNARIO 3 : CHOC NÉGATIF (20% proba)
+        # SCÉNARIO 3 : CHOC NÉGATIF
         if profile.get("choc_seuil"):
             choc_neg = current_price * (1 - profile["choc_seuil"])
             scenarios.append({
                 "nom": "Choc négatif",
-                "probabilité": 20,
-                "prix_final": round(choc_neg, 2),
+                "probabilité": round(p_neg * 100, 1),
+                "prix_final": round(float(stats["moyenne_choc_negatif"][0]), 2),
                 "fourchette": [
-                    round(choc_neg * 0.90, 2),
-                    round(choc_neg * 1.05, 2)
+                    round(min(q[0], choc_neg), 2),
+                    round(choc_neg, 2)
                 ],
                 "description": f"Événement défavorable au {category}",
                 "declencheurs": ["Récession", "Surproduction", "Guerre commerciale"]
@@ -129,22 +131,18 @@ class MarketPredictor:
             "horizon": horizon,
             "tendance_actuelle": hist,
             "scénarios": scenarios,
+            "quantiles": dict(zip((f"p{x}" for x in monte_carlo.QUANTILES), q)),
             "recommandation": self._generate_recommendation(scenarios)
         }
     
     def _get_category(self, symbol):
         """Détermine la catégorie d'une matière"""
-        from app import MATIERES_PREMIERES
-        matiere = next((m for m in MATIERES_PREMIERES if m['symbole'] == symbol), None)
+        matiere = CATALOGUE.par_symbole(symbol)
         return matiere['categorie'] if matiere else "énergie"
     
     def _get_current_price(self, symbol):
         """Prix actuel simulé (cohérent avec data_process.py)"""
-        # Utilise la même logique que ton système actuel
-        import hashlib
-        seed = int(hashlib.md5(symbol.encode()).hexdigest()[:8], 16)
-        random.seed(seed)
-        
+        # Même flux que le prix de base de data_process.py
         categories_ranges = {
             "énergie": (50, 120),
             "métal": (1500, 2500),
@@ -155,7 +153,7 @@ class MarketPredictor:
         categorie = self._get_category(symbol)
         min_p, max_p = categories_ranges.get(categorie, (100, 500))
         
-        return round(random.uniform(min_p, max_p), 2)
+        return round(generateur(symbol, "base").uniform(min_p, max_p), 2)
     
     def _horizon_days(self, horizon):
         """Convertit l'horizon en jours"""
@@ -188,11 +186,14 @@ class MarketPredictor:
                 "raison": "Continuité probable du marché"
             }
 
-# Interface simple
-predictor = MarketPredictor()
+# Interface simple (prédicteur créé au premier appel, pas à l'import)
+predictor = None
 
 def get_prediction(symbol, horizon="7j"):
     """Fonction principale pour l'API"""
+    global predictor
+    if predictor is None:
+        predictor = MarketPredictor()
     return predictor.generate_scenarios(symbol, horizon)
 
 if __name__ == "__main__":
@@ -0,0 +1,229 @@
+"""
+Profilage à la demande d'un worker en production
+Un échantillonneur relève les piles de tous les threads (sys._current_frames) à
+intervalle fixe et les agrège en piles repliées (format « collapsed » de
+flamegraph.pl / speedscope) ; les requêtes concernées sont en plus profilées par
+cProfile. Deux modes : tout le processus pendant N secondes, ou les K prochaines
+requêtes d'une route (seuls leurs threads sont alors échantillonnés).
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+PROFIL_INTERVALLE = float(os.getenv('PROFIL_INTERVALLE', 0.005))
+PROFIL_DUREE_MAX = float(os.getenv('PROFIL_DUREE_MAX', 60))
+# Signal qui lance un profilage de PROFIL_DUREE_SIGNAL secondes écrit dans PROFIL_REPERTOIRE (vide : aucun)
+PROFIL_SIGNAL = os.getenv('PROFIL_SIGNAL', '')
+PROFIL_DUREE_SIGNAL = float(os.getenv('PROFIL_DUREE_SIGNAL', 10))
+PROFIL_REPERTOIRE = os.getenv('PROFIL_REPERTOIRE', tempfile.gettempdir())
+
+
+def _etiquette(code):
+    nom = getattr(code, "co_qualname", code.co_name)
+    return f"{nom} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _pile(frame):
+    """Pile d'appels de la racine à la frame, en étiquettes"""
+    etiquettes = []
+    while frame is not None:
+        etiquettes.append(_etiquette(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(etiquettes))
+
+
+class SessionProfil:
+    """Une séance de profilage : durée fixe, ou `requetes` requêtes de la route donnée"""
+
+    def __init__(self, duree=None, route=None, requetes=None, intervalle=PROFIL_INTERVALLE):
+        self.duree = duree
+        self.route = route
+        self.restantes = requetes if route else None
+        self.intervalle = intervalle
+        self.echantillons = 0
+        self.requetes_profilees = 0
+        self._piles = Counter()
+        self._stats = None
+        self._threads_suivis = set()
+        self._verrou = threading.Lock()
+        self._fin = threading.Event()
+        self._thread = None
+        self.debut = self.arret = None
+
+    def demarrer(self):
+        self.debut = time.monotonic()
+        self._thread = threading.Thread(target=self._echantillonner, name="profileur", daemon=True)
+        self._thread.start()
+        return self
+
+    def _echantillonner(self):
+        propre = threading.get_ident()
+        limite = None if self.duree is None else self.debut + self.duree
+        while not self._fin.wait(self.intervalle):
+            if limite is not None and time.monotonic() >= limite:
+                break
+            with self._verrou:
+                suivis = set(self._threads_suivis) if self.route else None
+            for ident, frame in sys._current_frames().items():
+                if ident == propre or (suivis is not None and ident not in suivis):
+                    continue
+                self._piles[_pile(frame)] += 1
+            self.echantillons += 1
+        self._fin.set()
+        self.arret = time.monotonic()
+
+    @property
+    def terminee(self):
+        return self._fin.is_set()
+
+    def attendre(self, delai=None):
+        """Attend la fin de la séance ; vrai si elle est terminée"""
+        return self._fin.wait(delai)
+
+    def arreter(self):
+        self._fin.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def debut_requete(self, route, endpoint):
+        """cProfile démarré pour la requête si elle est concernée (None sinon)"""
+        if self.terminee:
+            return None
+        with self._verrou:
+            if self.route is not None:
+                if self.route not in (route, endpoint) or self.restantes <= 0:
+                    return None
+                self.restantes -= 1
+                self._threads_suivis.add(threading.get_ident())
+        profil = cProfile.Profile()
+        try:
+            profil.enable()
+        except ValueError:
+            # Un autre profileur est déjà actif dans ce thread
+            with self._verrou:
+                self._threads_suivis.discard(threading.get_ident())
+            return None
+        return profil
+
+    def fin_requete(self, profil):
+        profil.disable()
+        with self._verrou:
+            self._threads_suivis.discard(threading.get_ident())
+            if self._stats is None:
+                self._stats = pstats.Stats(profil)
+            else:
+                self._stats.add(profil)
+            self.requetes_profilees += 1
+            if self.route is not None and self.restantes <= 0 and not self._threads_suivis:
+                self._fin.set()
+
+    def piles_repliees(self):
+        """Une ligne « pile;d'appels nombre » par pile, triées par fréquence"""
+        return "".join(f"{pile} {n}\n" for pile, n in self._piles.most_common())
+
+    def statistiques(self, lignes=40, tri="cumulative"):
+        """Statistiques cProfile en texte (vide si aucune requête n'a été profilée)"""
+        with self._verrou:
+            if self._stats is None:
+                return ""
+            tampon = io.StringIO()
+            self._stats.stream = tampon
+            self._stats.sort_stats(tri).print_stats(lignes)
+        return tampon.getvalue()
+
+    def pstats_binaire(self):
+        """Statistiques cProfile au format de pstats.dump_stats (snakeviz, pstats.Stats)"""
+        with self._verrou:
+            if self._stats is None:
+                return b""
+            with tempfile.NamedTemporaryFile(suffix=".pstats") as fichier:
+                self._stats.dump_stats(fichier.name)
+                return fichier.read()
+
+    def resume(self):
+        return {
+            "mode": "route" if self.route else "duree",
+            "route": self.route,
+            "duree_s": round((self.arret or time.monotonic()) - self.debut, 3),
+            "intervalle_s": self.intervalle,
+            "echantillons": self.echantillons,
+            "requetes_profilees": self.requetes_profilees,
+        }
+
+
+class Profileur:
+    """Au plus une séance à la fois dans le processus ; crochets de requête pour Flask"""
+
+    def __init__(self):
+        self.session = None
+        self._verrou = threading.Lock()
+
+    def lancer(self, **parametres):
+        """Démarre une séance ; None si une autre est en cours"""
+        with self._verrou:
+            if self.session is not None and not self.session.terminee:
+                return None
+            self.session = SessionProfil(**parametres).demarrer()
+            return self.session
+
+    def debut_requete(self, route, endpoint):
+        session = self.session
+        if session is None or session.terminee:
+            return None
+        profil = session.debut_requete(route, endpoint)
+        return None if profil is None else (session, profil)
+
+    @staticmethod
+    def fin_requete(jeton):
+        session, profil = jeton
+        session.fin_requete(profil)
+
+    def ecrire(self, session, repertoire=PROFIL_REPERTOIRE):
+        """Écrit les piles repliées et les statistiques cProfile ; retourne les chemins"""
+        base = os.path.join(repertoire, f"profil-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}")
+        with open(base + ".collapsed", "w") as fichier:
+            fichier.write(session.piles_repliees())
+        chemins = [base + ".collapsed"]
+        binaire = session.pstats_binaire()
+        if binaire:
+            with open(base + ".pstats", "wb") as fichier:
+                fichier.write(binaire)
+            chemins.append(base + ".pstats")
+        return chemins
+
+    def installer_signal(self, nom=PROFIL_SIGNAL, duree=PROFIL_DUREE_SIGNAL):
+        """À la réception du signal, profile le processus `duree` secondes et écrit les fichiers
+
+        À appeler dans le thread principal du worker (après le fork sous gunicorn). Faux si
+        aucun signal n'est configuré.
+        """
+        if not nom:
+            return False
+        if threading.current_thread() is not threading.main_thread():
+            logger.warning("Signal de profilage %s non installé hors du thread principal", nom)
+            return False
+
+        def tache():
+            session = self.lancer(duree=duree)
+            if session is None:
+                logger.warning("Profilage déjà en cours, signal ignoré")
+                return
+            session.attendre()
+            logger.warning("Profil du processus %d écrit : %s", os.getpid(), ", ".join(self.ecrire(session)))
+
+        # Le gestionnaire ne fait que lancer un thread : rien de bloquant dans le contexte du signal
+        signal.signal(getattr(signal, nom), lambda *_: threading.Thread(target=tache, daemon=True).start())
+        return True
+
+
+PROFILEUR = Profileur()
@@ -0,0 +1,157 @@
+"""
+Index de recherche des instruments
+Index inversé des préfixes et des trigrammes des mots du nom, du symbole et de la
+catégorie, sans accents ni casse (« petrole » trouve « Pétrole »). Les listes de
+documents sont stockées à plat (CSR) : l'index se charge vite depuis un pickle et
+une recherche ne fait que des intersections NumPy, en O(taille des listes).
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from functools import reduce
+
+import numpy as np
+
+# Champs indexés et leur poids dans le score
+POIDS_CHAMPS = {'symbole': 3.0, 'nom': 2.0, 'categorie': 1.0}
+# Préfixes indexés jusqu'à cette longueur ; au-delà, vérification sur les mots
+PREFIXE_MAX = 12
+# Score d'un terme trouvé au milieu d'un mot (toujours sous un préfixe)
+SCORE_INTERIEUR = 0.5
+
+_LIGATURES = str.maketrans({'œ': 'oe', 'Œ': 'OE', 'æ': 'ae', 'Æ': 'AE', 'ß': 'ss'})
+_MOT = re.compile(r"[^\W_]+")
+_VIDE = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+
+
+def replier(texte):
+    """Texte sans accents ni ligatures, en minuscules : « Bœuf Éthanol » -> « boeuf ethanol »"""
+    decompose = unicodedata.normalize('NFKD', texte.translate(_LIGATURES))
+    return ''.join(c for c in decompose if not unicodedata.combining(c)).casefold()
+
+
+def mots(texte):
+    return _MOT.findall(replier(texte))
+
+
+def _aplatir(listes, valeurs=None):
+    """{clé: {doc: valeur}} vers (clé -> rang, débuts, documents triés[, valeurs])"""
+    cles = {cle: k for k, cle in enumerate(listes)}
+    debuts = np.zeros(len(listes) + 1, dtype=np.int64)
+    debuts[1:] = np.cumsum([len(docs) for docs in listes.values()])
+    documents = np.empty(debuts[-1], dtype=np.int32)
+    scores = np.empty(debuts[-1], dtype=np.float32) if valeurs else None
+    for k, docs in enumerate(listes.values()):
+        ordre = sorted(docs)
+        documents[debuts[k]:debuts[k + 1]] = ordre
+        if valeurs:
+            scores[debuts[k]:debuts[k + 1]] = [docs[d] for d in ordre]
+    return cles, debuts, documents, scores
+
+
+class IndexRecherche:
+    """Index de recherche d'une liste de matières (positions dans la liste)"""
+
+    def __init__(self, matieres):
+        prefixes = defaultdict(dict)
+        trigrammes = defaultdict(set)
+        self._textes = []
+        for doc, matiere in enumerate(matieres):
+            texte = []
+            for champ, poids in POIDS_CHAMPS.items():
+                for mot in mots(str(matiere.get(champ, ''))):
+                    texte.append(mot)
+                    for n in range(1, min(len(mot), PREFIXE_MAX) + 1):
+                        # Mot entier : score double ; on garde le meilleur champ
+                        score = poids * (2 if n == len(mot) else 1)
+                        if prefixes[mot[:n]].get(doc, 0) < score:
+                            prefixes[mot[:n]][doc] = score
+                    for i in range(len(mot) - 2):
+                        trigrammes[mot[i:i + 3]].add(doc)
+            self._textes.append(" ".join(texte))
+
+        self._prefixes, self._debuts_prefixes, self._docs_prefixes, self._scores_prefixes = _aplatir(prefixes, True)
+        self._trigrammes, self._debuts_trigrammes, self._docs_trigrammes, _ = _aplatir(trigrammes)
+        self._longueurs = np.array([len(m['nom']) for m in matieres], dtype=np.int32)
+        self._codes_categories = {}
+        self._categories = np.array(
+            [self._codes_categories.setdefault(m['categorie'].lower(), len(self._codes_categories)) for m in matieres],
+            dtype=np.int32
+        )
+
+    def __len__(self):
+        return len(self._textes)
+
+    def _prefixe(self, terme):
+        k = self._prefixes.get(terme[:PREFIXE_MAX])
+        if k is None:
+            return _VIDE
+        debut, fin = self._debuts_prefixes[k], self._debuts_prefixes[k + 1]
+        docs, scores = self._docs_prefixes[debut:fin], self._scores_prefixes[debut:fin]
+        if len(terme) > PREFIXE_MAX:
+            garder = [any(m.startswith(terme) for m in self._textes[d].split()) for d in docs]
+            docs, scores = docs[garder], scores[garder]
+        return docs, scores
+
+    def _interieur(self, terme):
+        """Documents dont un mot contient le terme (au moins 3 caractères) ailleurs qu'au début"""
+        listes = []
+        for i in range(len(terme) - 2):
+            k = self._trigrammes.get(terme[i:i + 3])
+            if k is None:
+                return _VIDE[0]
+            listes.append(self._docs_trigrammes[self._debuts_trigrammes[k]:self._debuts_trigrammes[k + 1]])
+        candidats = reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), sorted(listes, key=len))
+        if len(terme) > 3:
+            # Les trigrammes sont tous présents, pas forcément à la suite
+            candidats = candidats[[terme in self._textes[d] for d in candidats]]
+        return candidats
+
+    def _terme(self, terme, suffisant=None):
+        """Documents (triés) contenant le terme et leur score
+
+        Les mots contenant le terme ailleurs qu'au début ne sont pas cherchés si les
+        préfixes donnent déjà `suffisant` documents (ils seraient classés après).
+        """
+        docs, scores = self._prefixe(terme)
+        if len(terme) < 3 or (suffisant is not None and len(docs) >= suffisant):
+            return docs, scores
+        interieurs = np.setdiff1d(self._interieur(terme), docs, assume_unique=True)
+        if len(interieurs) == 0:
+            return docs, scores
+        docs = np.concatenate([docs, interieurs])
+        scores = np.concatenate([scores, np.full(len(interieurs), SCORE_INTERIEUR, dtype=np.float32)])
+        ordre = np.argsort(docs, kind='stable')
+        return docs[ordre], scores[ordre]
+
+    def rechercher(self, requete, categorie=None, limite=None):
+        """Positions des matières contenant tous les termes, de la plus pertinente à la moins pertinente
+
+        Sans terme, toutes les matières (de la catégorie) dans l'ordre du catalogue.
+        """
+        termes = mots(requete or '')
+        if termes:
+            # Un seul terme sans filtre : les préfixes suffisent s'ils remplissent la limite
+            suffisant = limite if len(termes) == 1 and not categorie else None
+            docs, scores = self._terme(termes[0], suffisant)
+            for terme in termes[1:]:
+                if len(docs) == 0:
+                    break
+                autres, autres_scores = self._terme(terme)
+                docs, i, j = np.intersect1d(docs, autres, assume_unique=True, return_indices=True)
+                scores = scores[i] + autres_scores[j]
+        else:
+            docs, scores = np.arange(len(self), dtype=np.int32), np.zeros(len(self), dtype=np.float32)
+
+        if categorie:
+            code = self._codes_categories.get(categorie.lower())
+            if code is None:
+                return []
+            garder = self._categories[docs] == code
+            docs, scores = docs[garder], scores[garder]
+
+        if termes:
+            # Meilleur score, puis nom le plus court, puis ordre du catalogue
+            ordre = np.lexsort((docs, self._longueurs[docs], -scores))
+            docs = docs[ordre]
+        return docs[:limite].tolist()
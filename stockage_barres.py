@@ -0,0 +1,196 @@
+"""
+Stockage local des barres historiques (OHLCV)
+Un fichier en ajout seul par instrument et par résolution, enregistrements de taille
+fixe lus par numpy.memmap, et un index annexe (jour -> première barre) pour les
+requêtes par plage de dates sans parcourir ni charger le fichier.
+"""
+import fcntl
+import os
+import re
+import threading
+
+import numpy as np
+
+REPERTOIRE_HISTORIQUE = os.getenv('HISTORIQUE_REPERTOIRE', 'historical_data')
+RESOLUTIONS = {'minute': 60, 'heure': 3600, 'jour': 86400}
+
+BARRE = np.dtype([
+    ("t", "<i8"),  # début de la barre (secondes epoch, aligné sur la résolution)
+    ("ouverture", "<f8"),
+    ("haut", "<f8"),
+    ("bas", "<f8"),
+    ("cloture", "<f8"),
+    ("volume", "<f8"),
+])
+ENTREE_INDEX = np.dtype([("jour", "<i8"), ("debut", "<i8")])
+
+
+def _nom_fichier(symbole):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", symbole)
+
+
+class StockageBarres:
+    """Barres persistées sous `racine`/<symbole>/<resolution>.barres (+ .index)"""
+
+    def __init__(self, racine=REPERTOIRE_HISTORIQUE):
+        self.racine = racine
+        self._vues = {}
+        self._verrou = threading.Lock()
+
+    def _chemins(self, symbole, resolution):
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Résolution inconnue : {resolution}")
+        base = os.path.join(self.racine, _nom_fichier(symbole), resolution)
+        return base + ".barres", base + ".index"
+
+    def _carte(self, chemin, dtype):
+        """memmap en lecture du fichier (rouvert seulement si le fichier a grandi) ; None s'il est vide"""
+        try:
+            taille = os.stat(chemin).st_size // dtype.itemsize
+        except FileNotFoundError:
+            return None
+        if taille == 0:
+            return None
+        with self._verrou:
+            vue = self._vues.get(chemin)
+            if vue is None or len(vue) != taille:
+                # Un enregistrement incomplet en fin de fichier (écriture interrompue) est ignoré
+                vue = np.memmap(chemin, dtype=dtype, mode="r", shape=(taille,))
+                self._vues[chemin] = vue
+        return vue
+
+    def empreinte(self):
+        """Fichiers ouverts en memmap et octets projetés (pages chargées seulement à la lecture)"""
+        with self._verrou:
+            vues = list(self._vues.values())
+        return len(vues), sum(vue.nbytes for vue in vues)
+
+    def taille(self, symbole, resolution):
+        barres = self._carte(self._chemins(symbole, resolution)[0], BARRE)
+        return 0 if barres is None else len(barres)
+
+    def dernier_horodatage(self, symbole, resolution):
+        """Début de la dernière barre stockée, ou None"""
+        barres = self._carte(self._chemins(symbole, resolution)[0], BARRE)
+        return None if barres is None else int(barres["t"][-1])
+
+    def premier_horodatage(self, symbole, resolution):
+        barres = self._carte(self._chemins(symbole, resolution)[0], BARRE)
+        return None if barres is None else int(barres["t"][0])
+
+    def ajouter(self, symbole, resolution, barres):
+        """Ajoute des barres en fin de fichier ; celles qui précèdent la dernière sont ignorées
+
+        Une barre de même début que la dernière la remplace : la dernière barre d'un
+        fournisseur est souvent la période en cours, complétée au remplissage suivant.
+        Retourne le nombre de barres écrites.
+        """
+        barres = np.asarray(barres, dtype=BARRE)
+        chemin, chemin_index = self._chemins(symbole, resolution)
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        # Lecture-écriture (pas "ab" : la dernière barre peut être réécrite en place)
+        with open(os.open(chemin, os.O_RDWR | os.O_CREAT, 0o644), "r+b") as fichier:
+            # Plusieurs processus peuvent écrire : un seul ajout à la fois par fichier
+            fcntl.flock(fichier, fcntl.LOCK_EX)
+            try:
+                existantes = self._carte(chemin, BARRE)
+                n = 0 if existantes is None else len(existantes)
+                if n:
+                    barres = barres[barres["t"] >= existantes["t"][-1]]
+                if len(barres) == 0:
+                    return 0
+                if np.any(np.diff(barres["t"]) <= 0):
+                    barres = barres[np.unique(barres["t"], return_index=True)[1]]
+                # Repart de la fin du dernier enregistrement complet, ou de la dernière barre si elle est remplacée
+                debut = n - 1 if n and barres["t"][0] == existantes["t"][-1] else n
+                fichier.truncate(n * BARRE.itemsize)
+                fichier.seek(debut * BARRE.itemsize)
+                fichier.write(barres.tobytes())
+                fichier.flush()
+                self._indexer(chemin_index, barres["t"], debut, None if n == 0 else int(existantes["t"][-1]))
+            finally:
+                fcntl.flock(fichier, fcntl.LOCK_UN)
+        return len(barres)
+
+    def _indexer(self, chemin_index, horodatages, decalage, dernier_existant):
+        """Ajoute à l'index les jours qui commencent dans les barres écrites"""
+        jours = horodatages // 86400
+        nouveaux = np.flatnonzero(np.r_[True, jours[1:] != jours[:-1]])
+        if dernier_existant is not None and jours[0] == dernier_existant // 86400:
+            nouveaux = nouveaux[1:]
+        if len(nouveaux) == 0:
+            return
+        entrees = np.empty(len(nouveaux), dtype=ENTREE_INDEX)
+        entrees["jour"] = jours[nouveaux]
+        entrees["debut"] = decalage + nouveaux
+        with open(chemin_index, "ab") as fichier:
+            fichier.write(entrees.tobytes())
+
+    def _bornes(self, barres, index, t, cote):
+        """Position de t dans les barres : l'index réduit la recherche aux barres d'un jour"""
+        debut, fin = 0, len(barres)
+        if index is not None:
+            k = int(np.searchsorted(index["jour"], t // 86400, side="right")) - 1
+            if k >= 0:
+                debut = int(index["debut"][k])
+            if k + 1 < len(index):
+                fin = int(index["debut"][k + 1])
+            debut, fin = min(debut, len(barres)), min(fin, len(barres))
+        return debut + int(np.searchsorted(barres["t"][debut:fin], t, side=cote))
+
+    def lire(self, symbole, resolution, debut=None, fin=None):
+        """Barres de [debut, fin) en vue memmap sans copie (tableau vide si rien n'est stocké)"""
+        chemin, chemin_index = self._chemins(symbole, resolution)
+        barres = self._carte(chemin, BARRE)
+        if barres is None:
+            return np.empty(0, dtype=BARRE)
+        index = self._carte(chemin_index, ENTREE_INDEX)
+        i = 0 if debut is None else self._bornes(barres, index, int(debut), "left")
+        j = len(barres) if fin is None else self._bornes(barres, index, int(fin), "left")
+        return barres[i:max(i, j)]
+
+    def derniers(self, symbole, resolution, n):
+        """Les n dernières barres (vue sans copie)"""
+        barres = self._carte(self._chemins(symbole, resolution)[0], BARRE)
+        if barres is None:
+            return np.empty(0, dtype=BARRE)
+        return barres[max(0, len(barres) - n):]
+
+
+class AgregateurBarres:
+    """Agrège les ticks de tout l'univers en barres et écrit les barres terminées"""
+
+    def __init__(self, stockage, resolutions=tuple(RESOLUTIONS)):
+        self.stockage = stockage
+        self.resolutions = resolutions
+        self._en_cours = {}
+
+    def ajouter(self, symboles, horodatage, prix, volumes):
+        """Intègre un tick (un prix et un volume par symbole) ; retourne le nombre de barres écrites"""
+        ecrites = 0
+        for resolution in self.resolutions:
+            pas = RESOLUTIONS[resolution]
+            debut = int(horodatage) // pas * pas
+            barre = self._en_cours.get(resolution)
+            if barre is not None and (barre["t"] != debut or len(barre["cloture"]) != len(prix)):
+                ecrites += self._ecrire(symboles[:len(barre["cloture"])], resolution, barre)
+                barre = None
+            if barre is None:
+                self._en_cours[resolution] = {
+                    "t": debut, "ouverture": prix.copy(), "haut": prix.copy(),
+                    "bas": prix.copy(), "cloture": prix.copy(), "volume": volumes.copy()
+                }
+                continue
+            np.maximum(barre["haut"], prix, out=barre["haut"])
+            np.minimum(barre["bas"], prix, out=barre["bas"])
+            barre["cloture"][:] = prix
+            barre["volume"] += volumes
+        return ecrites
+
+    def _ecrire(self, symboles, resolution, barre):
+        ecrites = 0
+        for k, symbole in enumerate(symboles):
+            enregistrement = np.array([(barre["t"], barre["ouverture"][k], barre["haut"][k], barre["bas"][k],
+                                        barre["cloture"][k], barre["volume"][k])], dtype=BARRE)
+            ecrites += self.stockage.ajouter(symbole, resolution, enregistrement)
+        return ecrites
@@ -0,0 +1,90 @@
+"""
+Historique de ticks en tampon circulaire
+Tableaux préalloués (horodatage, prix, rendement) : 24 octets par tick et par instrument
+"""
+import numpy as np
+
+CHAMPS = ("horodatages", "prix", "rendements")
+
+
+def allouer_local(champ, forme, dtype=np.float64):
+    """Allocateur par défaut : tableau privé au processus"""
+    return np.zeros(forme, dtype=dtype)
+
+
+class TamponTicks:
+    """Tampon circulaire de ticks, une ligne par instrument"""
+
+    def __init__(self, profondeur, capacite=128, allocateur=None):
+        if profondeur < 1:
+            raise ValueError("La profondeur de l'historique doit être positive")
+        alloue = allocateur or allouer_local
+        self.profondeur = profondeur
+        self.partage = allocateur is not None
+        for champ, forme, dtype in self.disposition(capacite, profondeur):
+            setattr(self, champ, alloue(champ, forme, dtype))
+
+    @staticmethod
+    def disposition(capacite, profondeur):
+        """Champs (nom, forme, dtype) du tampon, pour l'allouer dans un segment partagé"""
+        return [
+            ("horodatages", (capacite, profondeur), np.float64),
+            ("prix", (capacite, profondeur), np.float64),
+            ("rendements", (capacite, profondeur), np.float64),
+            # Nombre total de ticks écrits par ligne (la position d'écriture est compteur % profondeur)
+            ("compteurs", (capacite,), np.int64),
+        ]
+
+    @property
+    def capacite(self):
+        return len(self.compteurs)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, champ).nbytes for champ in CHAMPS) + self.compteurs.nbytes
+
+    def redimensionner(self, capacite):
+        """Agrandit le nombre de lignes en conservant les ticks existants"""
+        if self.partage:
+            raise RuntimeError("Un tampon en mémoire partagée ne peut pas être agrandi")
+        for champ in CHAMPS:
+            ancien = getattr(self, champ)
+            nouveau = np.zeros((capacite, self.profondeur))
+            nouveau[:len(ancien)] = ancien
+            setattr(self, champ, nouveau)
+        compteurs = np.zeros(capacite, dtype=np.int64)
+        compteurs[:len(self.compteurs)] = self.compteurs
+        self.compteurs = compteurs
+
+    def ajouter(self, lignes, horodatage, prix, rendements):
+        """Écrit un tick pour chaque ligne donnée, en O(1) par ligne"""
+        positions = self.compteurs[lignes] % self.profondeur
+        self.horodatages[lignes, positions] = horodatage
+        self.prix[lignes, positions] = prix
+        self.rendements[lignes, positions] = rendements
+        self.compteurs[lignes] += 1
+
+    def taille(self, ligne):
+        """Nombre de ticks disponibles pour une ligne"""
+        return int(min(self.compteurs[ligne], self.profondeur))
+
+    def segments(self, ligne, champ="prix"):
+        """Retourne (plus anciens, plus récents) : deux vues sans copie, dans l'ordre chronologique"""
+        donnees = getattr(self, champ)[ligne]
+        compteur = int(self.compteurs[ligne])
+        if compteur <= self.profondeur:
+            return donnees[:0], donnees[:compteur]
+        debut = compteur % self.profondeur
+        return donnees[debut:], donnees[:debut]
+
+    def derniers(self, ligne, n=None, champ="prix"):
+        """Les n derniers ticks dans l'ordre chronologique
+
+        Vue sans copie tant que la fenêtre ne chevauche pas le bord du tampon,
+        copie de la fenêtre seulement sinon.
+        """
+        anciens, recents = self.segments(ligne, champ)
+        n = len(anciens) + len(recents) if n is None else min(n, len(anciens) + len(recents))
+        if n <= len(recents):
+            return recents[len(recents) - n:]
+        return np.concatenate((anciens[len(anciens) - (n - len(recents)):], recents))
@@ -0,0 +1,107 @@
+"""
+Configuration des tests : environnement sans réseau ni tâches de fond (fixé avant tout
+import de l'application) et faux serveur Yahoo local (http.server de la bibliothèque standard)
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+REPERTOIRE_TESTS = tempfile.mkdtemp(prefix="tests-matieres-")
+ENVIRONNEMENT = {
+    "TICK_PLANIFICATEUR": "0",
+    "REMPLISSAGE_DONNEES": "0",
+    "COTATIONS_EN_DIRECT": "0",
+    "BARRES_PERSISTANTES": "0",
+    "HISTORIQUE_REPERTOIRE": os.path.join(REPERTOIRE_TESTS, "historique"),
+    "CATALOGUE_FICHIER": os.path.join(REPERTOIRE_TESTS, "catalogue.pickle"),
+    # Tout appel qui échapperait au faux serveur échoue aussitôt
+    "YAHOO_URL_BASE": "http://127.0.0.1:9",
+}
+os.environ.update(ENVIRONNEMENT)
+
+PAS_YAHOO = {'1m': 60, '60m': 3600, '1d': 86400}
+
+
+class ServeurYahoo:
+    """Faux Yahoo Finance : API chart v8, une barre par pas jusqu'à `fin` (dernière barre en cours)
+
+    Les requêtes reçues sont enregistrées ; `en_erreur` répond 500, `delai` retarde chaque réponse.
+    """
+
+    def __init__(self):
+        self.fin = int(time.time())
+        self.cloture_en_cours = {}
+        self.en_erreur = set()
+        self.delai = 0.0
+        self.requetes = []
+        self._verrou = threading.Lock()
+        serveur = self
+
+        class Gestionnaire(BaseHTTPRequestHandler):
+            def do_GET(self):
+                adresse = urlparse(self.path)
+                parametres = {cle: valeurs[0] for cle, valeurs in parse_qs(adresse.query).items()}
+                symbole = adresse.path.rsplit('/', 1)[-1]
+                with serveur._verrou:
+                    serveur.requetes.append((adresse.path, parametres))
+                time.sleep(serveur.delai)
+                if not adresse.path.startswith('/v8/finance/chart/') or symbole in serveur.en_erreur:
+                    self.send_response(500 if symbole in serveur.en_erreur else 404)
+                    self.end_headers()
+                    return
+                corps = json.dumps(serveur.graphique(symbole, parametres)).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(corps)))
+                self.end_headers()
+                self.wfile.write(corps)
+
+            def log_message(self, *args):
+                pass
+
+        self._http = ThreadingHTTPServer(('127.0.0.1', 0), Gestionnaire)
+        self.url = f"http://127.0.0.1:{self._http.server_address[1]}"
+        threading.Thread(target=self._http.serve_forever, daemon=True).start()
+
+    def prix(self, symbole):
+        return self.cloture_en_cours.get(symbole, 100.0)
+
+    def graphique(self, symbole, parametres):
+        pas = PAS_YAHOO[parametres.get('interval', '1d')]
+        debut = int(parametres.get('period1', self.fin - pas))
+        horodatages = list(range(-(-debut // pas) * pas, self.fin + 1, pas))
+        # Clôtures définitives 50, 51, ... ; la dernière barre (période en cours) au prix courant
+        clotures = [50.0 + t // pas % 1000 for t in horodatages]
+        if horodatages and horodatages[-1] // pas == self.fin // pas:
+            clotures[-1] = self.prix(symbole)
+        return {"chart": {"result": [{
+            "meta": {"symbol": symbole, "regularMarketPrice": self.prix(symbole), "regularMarketTime": self.fin},
+            "timestamp": horodatages,
+            "indicators": {"quote": [{"open": clotures, "high": clotures, "low": clotures,
+                                      "close": clotures, "volume": [1.0] * len(clotures)}]},
+        }], "error": None}}
+
+    def requetes_vers(self, prefixe):
+        with self._verrou:
+            return [(chemin, parametres) for chemin, parametres in self.requetes if chemin.startswith(prefixe)]
+
+    def arreter(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+
+@pytest.fixture
+def yahoo():
+    serveur = ServeurYahoo()
+    yield serveur
+    serveur.arreter()
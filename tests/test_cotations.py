@@ -0,0 +1,66 @@
+"""
+Cotations en direct contre le faux serveur Yahoo : débit limité et une seule requête en vol par symbole
+"""
+import threading
+import time
+
+from cotations import SeauJetons, SondeurCotations
+from fournisseurs import FournisseurYahoo
+
+
+def _fournisseur(yahoo, debit=100.0):
+    fournisseur = FournisseurYahoo(url_base=yahoo.url, taille_lot=8, timeout=5)
+    fournisseur.limiteur = SeauJetons(debit, capacite=1)
+    return fournisseur
+
+
+def test_coter_lit_le_prix_du_graphique(yahoo):
+    yahoo.cloture_en_cours.update({'GC=F': 2400.5, 'SI=F': 31.2})
+    yahoo.en_erreur.add('HG=F')
+
+    cotations = _fournisseur(yahoo).coter(['GC=F', 'SI=F', 'HG=F'])
+
+    assert {s: prix for s, (prix, _) in cotations.items()} == {'GC=F': 2400.5, 'SI=F': 31.2}
+    assert cotations['GC=F'][1] == yahoo.fin
+    assert not yahoo.requetes_vers('/v7/')
+
+
+def test_seau_de_jetons_espace_les_requetes(yahoo):
+    symboles = [f'S{k}=F' for k in range(6)]
+    fournisseur = _fournisseur(yahoo, debit=20.0)
+
+    debut = time.monotonic()
+    assert len(fournisseur.coter(symboles)) == len(symboles)
+
+    # 1 jeton en réserve puis 20 par seconde : 5 attentes de 50 ms, même avec 8 threads
+    assert time.monotonic() - debut >= 5 / 20 * 0.9
+    assert len(yahoo.requetes_vers('/v8/finance/chart/')) == len(symboles)
+
+
+def test_demandes_concurrentes_regroupees(yahoo):
+    yahoo.delai = 0.3
+    appliquees = []
+    sondeur = SondeurCotations(_fournisseur(yahoo), ['GC=F', 'SI=F'], appliquees.append,
+                               intervalle=3600, fraicheur=0)
+    sondeur.demarrer()
+    try:
+        futurs, barriere = [], threading.Barrier(20)
+
+        def demander():
+            barriere.wait()
+            futurs.append(sondeur.demander(['GC=F'])['GC=F'])
+
+        threads = [threading.Thread(target=demander) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        resultats = {futur.result(timeout=5) for futur in futurs}
+    finally:
+        sondeur.arreter(5)
+
+    # 20 demandes concurrentes (plus le premier sondage) : un seul appel au fournisseur pour GC=F
+    appels = [chemin for chemin, _ in yahoo.requetes_vers('/v8/finance/chart/') if chemin.endswith('/GC=F')]
+    assert len(appels) == 1
+    assert resultats == {(yahoo.prix('GC=F'), float(yahoo.fin))}
+    assert appliquees and 'GC=F' in appliquees[0]
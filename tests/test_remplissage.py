@@ -0,0 +1,92 @@
+"""
+Remplissage de l'historique contre le faux serveur Yahoo
+"""
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ENVIRONNEMENT, RACINE
+from fournisseurs import FournisseurYahoo, Remplissage
+from stockage_barres import StockageBarres
+
+JOUR = 86400
+
+
+def _remplissage(yahoo, stockage, symboles):
+    fournisseur = FournisseurYahoo(url_base=yahoo.url, taille_lot=2, timeout=5)
+    return Remplissage(stockage, fournisseur, symboles, resolutions=('jour',))
+
+
+def test_remplissage_incremental_et_barre_en_cours(yahoo, tmp_path):
+    stockage = StockageBarres(str(tmp_path))
+    remplissage = _remplissage(yahoo, stockage, ['GC=F', 'SI=F'])
+    yahoo.cloture_en_cours['GC=F'] = 1000.0
+
+    assert remplissage.passe() > 0
+    n = stockage.taille('GC=F', 'jour')
+    dernier = stockage.dernier_horodatage('GC=F', 'jour')
+    assert dernier == yahoo.fin // JOUR * JOUR
+    assert stockage.lire('GC=F', 'jour')['cloture'][-1] == 1000.0
+
+    # Le jour se termine à un autre prix, un nouveau jour commence
+    yahoo.requetes.clear()
+    yahoo.fin += JOUR
+    yahoo.cloture_en_cours['GC=F'] = 1010.0
+    remplissage.passe()
+
+    # La passe suivante repart de la dernière barre stockée, pas du début de l'historique
+    depuis = {chemin.rsplit('/', 1)[-1]: int(p['period1']) for chemin, p in yahoo.requetes_vers('/v8/finance/chart/')}
+    assert depuis['GC=F'] == dernier
+    barres = stockage.lire('GC=F', 'jour')
+    assert len(barres) == n + 1
+    assert (barres['t'][1:] > barres['t'][:-1]).all()
+    # L'ancienne barre en cours est corrigée avec sa clôture définitive
+    assert barres['cloture'][-2] == 50.0 + dernier // JOUR % 1000
+    assert barres['cloture'][-1] == 1010.0
+
+
+def test_symbole_en_erreur_reste_simule(yahoo):
+    import data_process as dp
+
+    yahoo.en_erreur.add('HG=F')
+    remplissage = _remplissage(yahoo, dp._stockage_marche, ['GC=F', 'HG=F'])
+    remplissage.passe()
+
+    assert dp._stockage_marche.taille('GC=F', 'jour') > 0
+    assert dp._stockage_marche.taille('HG=F', 'jour') == 0
+    assert dp._stockage_pour('HG=F', 'jour') is dp._stockage
+
+    # Le symbole en erreur garde sa trajectoire simulée, l'autre sert les barres téléchargées
+    simule = dp.get_historique('HG=F', '1mo', 'jour', brut=True)
+    assert len(simule['prix']) == simule['points_total'] == 30
+    reel = dp.get_historique('GC=F', '1mo', 'jour', brut=True)
+    assert reel['prix'][-1] == yahoo.prix('GC=F')
+
+
+# Import de l'application avec les tâches de fond actives, le réseau pointé sur le faux serveur
+# (qui répond en 2 s) : l'import ne doit ni l'attendre ni ouvrir de connexion dans le thread principal
+SCRIPT_IMPORT = """
+import json, socket, sys, threading, time
+connexions = []
+connecter = socket.socket.connect
+def espion(self, adresse):
+    connexions.append(threading.current_thread().name)
+    return connecter(self, adresse)
+socket.socket.connect = espion
+debut = time.perf_counter()
+import app
+print(json.dumps({"duree": time.perf_counter() - debut, "principal": connexions.count("MainThread")}))
+"""
+
+
+def test_import_sans_reseau(yahoo, tmp_path):
+    yahoo.delai = 2.0
+    env = dict(os.environ, **ENVIRONNEMENT)
+    env.update(YAHOO_URL_BASE=yahoo.url, REMPLISSAGE_DONNEES="1", COTATIONS_EN_DIRECT="1",
+               HISTORIQUE_REPERTOIRE=str(tmp_path))
+    sortie = subprocess.run([sys.executable, "-c", SCRIPT_IMPORT], cwd=RACINE, env=env,
+                            capture_output=True, text=True, timeout=60, check=True)
+    resultat = json.loads(sortie.stdout.strip().splitlines()[-1])
+    assert resultat["principal"] == 0
+    assert resultat["duree"] < yahoo.delai